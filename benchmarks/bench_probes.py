@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+Benchmark the undercloud probes and the node to role resolution.
+
+The input is a synthetic cloud with <scale> nodes and servers and one endpoint
+for every 20 nodes, at least those of the real services.  The CLI output for
+each probe query is generated before timing so only the ospsurvey code is
+measured:
+
+  json.<probe>         json.loads of the CLI output
+  decode_dict.<probe>  json.loads with the decode_dict object hook
+  loads.<probe>        ospsurvey.deunicode.loads, which the probes use
+  records.<probe>      the probe function: decoding and record construction
+  stream.<probe>       iter_servers and iter_nodes reading the output in
+                       chunks and dropping each record.  The peak memory
+                       stays flat as the scale grows.
+  namedtuple.<probe>   the same with a new namedtuple class per query and no
+                       shared values, as the probes used to build records.
+                       Compare the retained memory with records.<probe>
+  node_role            the role of every node from the stack hints
+  node_role.patterns   the same matching every hint regex against each node,
+                       as server-role did before the RoleMatcher
+  *.roles40            the role cases for a cloud with 40 composable roles
+  invert_roles         the role -> server names map from bin/server-role
+  inventory            indexing the nodes and servers for the join
+  orphans              the untagged and undeployed nodes and the servers with
+                       no node, from a cloud with 5% of the nodes untagged and
+                       5% undeployed
+
+  python benchmarks/bench_probes.py --scale 1000,10000 --save baseline.json
+  python benchmarks/bench_probes.py --scale 1000,10000 --compare baseline.json
+"""
+from collections import namedtuple
+import json
+import re
+import sys
+
+import harness
+
+from ospsurvey.deunicode import decode_dict, loads
+import ospsurvey.inventory
+import ospsurvey.probes.endpoints
+import ospsurvey.probes.nodes
+import ospsurvey.probes.servers
+import ospsurvey.probes.services
+import ospsurvey.probes.stack
+from ospsurvey.jsonstream import chunk_size
+from ospsurvey.sources.synthetic import SyntheticCloud
+
+server_role = harness.bin_script('server-role')
+
+# probe name -> the query it makes and a function to call it with a source_fn
+probes = {
+  'services': ("openstack service list --long --format json",
+               lambda s: ospsurvey.probes.services.list_services(source_fn=s)),
+  'endpoints': ("openstack endpoint list --format json",
+                lambda s: ospsurvey.probes.endpoints.list_endpoints(source_fn=s)),
+  'servers': ("openstack server list --long --format json",
+              lambda s: ospsurvey.probes.servers.list_servers(source_fn=s)),
+  'nodes': ("openstack baremetal node list --long --format json",
+            lambda s: ospsurvey.probes.nodes.list_nodes(source_fn=s)),
+  'environment': ("openstack stack environment show --format json overcloud",
+                  lambda s: ospsurvey.probes.stack.get_environment('overcloud', source_fn=s))
+}
+
+def namedtuple_records(output, rename=lambda k: k.replace(' ', '_')):
+  """
+  Build records the way the list probes did before ospsurvey.records
+  """
+  records = json.loads(output, object_hook=decode_dict)
+  RecordClass = namedtuple("RecordClass", [rename(k) for k in records[0].keys()])
+  return [RecordClass._make(r.values()) for r in records]
+
+def namedtuple_nodes(output):
+  nodes = namedtuple_records(output, lambda k: k.replace(' ', '_').lower())
+  for n in nodes:
+    n.properties['capabilities'] = ospsurvey.probes.nodes.node_capabilities(n)
+  return nodes
+
+def pattern_role(node, node_patterns):
+  """
+  Find the role of a node the way server-role did before the RoleMatcher
+  """
+  tag = node.properties['capabilities']['node']
+  for p in node_patterns:
+    if re.match(p, tag):
+      return node_patterns[p]
+  return None
+
+def record_count(value):
+  return len(value) if isinstance(value, list) else 1
+
+def probe_cases(name, output):
+  """
+  The decoding and record construction cases for one probe
+  """
+  (_, probe_fn) = probes[name]
+  count = record_count(json.loads(output))
+  source_fn = lambda command: output
+
+  return [
+    harness.Case('json.' + name, lambda: (lambda: json.loads(output), count)),
+    harness.Case('decode_dict.' + name,
+                 lambda: (lambda: json.loads(output, object_hook=decode_dict), count)),
+    harness.Case('loads.' + name, lambda: (lambda: loads(output), count)),
+    harness.Case('records.' + name, lambda: (lambda: probe_fn(source_fn), count))
+  ]
+
+def stream_cases(outputs):
+  def chunks(output):
+    data = output.encode('utf-8') if not isinstance(output, bytes) else output
+    return lambda command: (data[i:i + chunk_size]
+                            for i in range(0, len(data), chunk_size))
+
+  def consume(records):
+    count = 0
+    for _ in records:
+      count += 1
+    return count
+
+  servers = outputs[probes['servers'][0]]
+  nodes = outputs[probes['nodes'][0]]
+
+  def setup(iter_fn, output):
+    stream_fn = chunks(output)
+    return (lambda: consume(iter_fn(stream_fn)), record_count(json.loads(output)))
+
+  return [
+    harness.Case('stream.servers',
+                 lambda: setup(ospsurvey.probes.servers.iter_servers, servers)),
+    harness.Case('stream.nodes',
+                 lambda: setup(ospsurvey.probes.nodes.iter_nodes, nodes))
+  ]
+
+def namedtuple_cases(outputs):
+  servers = outputs[probes['servers'][0]]
+  nodes = outputs[probes['nodes'][0]]
+  count = lambda output: record_count(json.loads(output))
+  return [
+    harness.Case('namedtuple.servers',
+                 lambda: (lambda: namedtuple_records(servers), count(servers))),
+    harness.Case('namedtuple.nodes', lambda: (lambda: namedtuple_nodes(nodes), count(nodes)))
+  ]
+
+def role_cases(outputs, suffix=''):
+  """
+  The node to role resolution cases.  The records are built in the setup
+  """
+  source_fn = lambda command: outputs[" ".join(command)]
+
+  def inputs():
+    environment = probes['environment'][1](source_fn)
+    nodes = probes['nodes'][1](source_fn)
+    servers = probes['servers'][1](source_fn)
+    hints = ospsurvey.probes.stack.role_hints(environment)
+    matcher = ospsurvey.probes.stack.role_matcher(environment)
+    return (environment, hints, matcher, nodes, servers)
+
+  def node_role():
+    (environment, hints, matcher, nodes, servers) = inputs()
+    return (lambda: {n.name:server_role.node_role(n, matcher) for n in nodes},
+            len(nodes))
+
+  def node_role_patterns():
+    (environment, hints, matcher, nodes, servers) = inputs()
+    patterns = ospsurvey.probes.stack.hint_map(environment)
+    return (lambda: {n.name:pattern_role(n, patterns) for n in nodes},
+            len(nodes))
+
+  def invert_roles():
+    (environment, hints, matcher, nodes, servers) = inputs()
+    node_roles = {n.name:server_role.node_role(n, matcher) for n in nodes}
+    inventory = ospsurvey.inventory.Inventory(nodes, servers)
+    return (lambda: server_role.invert_roles(hints, node_roles, inventory),
+            len(nodes))
+
+  return [harness.Case('node_role' + suffix, node_role),
+          harness.Case('node_role.patterns' + suffix, node_role_patterns),
+          harness.Case('invert_roles' + suffix, invert_roles)]
+
+# Many small composable roles with the same share of the nodes
+composable_roles = tuple(('Role{}'.format(i), 'role{}'.format(i), 1.0 / 40)
+                         for i in range(40))
+
+def inventory_cases(outputs):
+  """
+  The node and server join cases.  The records are built in the setup
+  """
+  source_fn = lambda command: outputs[" ".join(command)]
+
+  def inventory():
+    nodes = probes['nodes'][1](source_fn)
+    servers = probes['servers'][1](source_fn)
+    return (lambda: ospsurvey.inventory.Inventory(nodes, servers),
+            len(nodes) + len(servers))
+
+  def orphans():
+    nodes = probes['nodes'][1](source_fn)
+    servers = probes['servers'][1](source_fn)
+    index = ospsurvey.inventory.Inventory(nodes, servers)
+    return (lambda: index.orphans(), len(nodes) + len(servers))
+
+  return [harness.Case('inventory', inventory),
+          harness.Case('orphans', orphans)]
+
+def cases(scale):
+  cloud = SyntheticCloud(nodes=scale, endpoints=max(scale // 20, 48))
+  outputs = {q:cloud(q.split()) for (q, _) in probes.values()}
+
+  composable = SyntheticCloud(nodes=scale, roles=composable_roles)
+  composable_outputs = {q:composable(q.split()) for (q, _) in probes.values()}
+
+  # 5% of the nodes untagged and 5% undeployed
+  orphaned = SyntheticCloud(nodes=scale, servers=scale - scale // 20,
+                            untagged=scale // 20)
+  orphaned_outputs = {q:orphaned(q.split()) for (q, _) in probes.values()}
+
+  all_cases = []
+  for (name, (query, _)) in sorted(probes.items()):
+    all_cases.extend(probe_cases(name, outputs[query]))
+  return all_cases + stream_cases(outputs) + namedtuple_cases(outputs) + \
+    role_cases(outputs) + role_cases(composable_outputs, '.roles40') + \
+    inventory_cases(orphaned_outputs)
+
+if __name__ == "__main__":
+  sys.exit(harness.run(cases, "Benchmark the undercloud probes"))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Benchmark the subscription-manager record parsing.
+
+The input is synthetic subscription-manager output with <scale> enabled
+repos and <scale> consumed subscriptions.  It is generated before timing and
+given to the probes in 64KiB chunks as the command would write it:
+
+  repos            SubscriptionManager.repos()
+  consumed         SubscriptionManager.consumed()
+  legacy.<probe>   the same output split into a list and each record cut out
+                   with lines[start:].index(""), as the probes used to.  The
+                   time grows with the square of the number of records
+
+  python benchmarks/bench_sm.py --scale 1000,10000 --save baseline.json
+"""
+import re
+import sys
+
+import harness
+
+import ospsurvey.probes.sm
+from ospsurvey.jsonstream import chunk_size
+
+def synthetic_repos(count):
+  lines = ["+----------------------------------------------------------+",
+           "    Available Repositories in /etc/yum.repos.d/redhat.repo",
+           "+----------------------------------------------------------+"]
+  for i in range(count):
+    lines.extend([
+      "Repo ID:   rhel-7-server-synthetic-{}-rpms".format(i),
+      "Repo Name: Red Hat Enterprise Linux 7 Server - Synthetic {} (RPMs)".format(i),
+      "Repo URL:  https://cdn.redhat.com/content/dist/rhel/server/7/$releasever/$basearch/synthetic/{}/os".format(i),
+      "Enabled:   1",
+      ""])
+  return "\n".join(lines) + "\n"
+
+def synthetic_consumed(count):
+  lines = ["+-------------------------------------------+",
+           "   Consumed Subscriptions",
+           "+-------------------------------------------+"]
+  for i in range(count):
+    lines.extend([
+      "Subscription Name:   Red Hat Synthetic Subscription {}".format(i),
+      "Provides:            Red Hat Enterprise Linux Server",
+      "                     Red Hat OpenStack",
+      "                     Red Hat Ceph Storage",
+      "SKU:                 SER{:04d}".format(i % 10000),
+      "Contract:            {}".format(11850000 + i),
+      "Account:             1234567",
+      "Serial:              {}".format(3193843917416383938 + i),
+      "Pool ID:             8a85f98c60c2c2b40160c3244748{:04x}".format(i % 65536),
+      "Provides Management: No",
+      "Active:              True",
+      "Quantity Used:       1",
+      "Service Level:       Standard",
+      "Status Details:      Subscription is current",
+      "Starts:              01/09/2018",
+      "Ends:                01/08/2021",
+      "Entitlement Type:    Physical",
+      ""])
+  return "\n".join(lines) + "\n"
+
+def legacy_records(output, marker):
+  """
+  Parse the records the way the probes did before iter_sm_records
+  """
+  lines = output.split('\n')
+  starts = [i for i, line in enumerate(lines) if line.startswith(marker + ':')]
+  records = {}
+  for start in starts:
+    end = lines[start:].index("")
+    title, record = legacy_parse_sm_record(lines[start:start + end])
+    records[title] = record
+  return records
+
+def legacy_parse_sm_record(lines):
+  kv_re = re.compile(r'^(([^:]+):)?\s+(.*)$')
+  record = {}
+  title = re.sub(r'^.*:\s+', '', lines[0]).strip()
+  for l in lines[1:]:
+    new_value = kv_re.match(l)
+    if new_value:
+      a,k,v = new_value.groups()
+      if k:
+        record[k] = v
+        hold_k = k
+      elif type(record[hold_k]) is list:
+        record[hold_k].append(v)
+      else:
+        record[hold_k] = [record[hold_k], v]
+  return title, record
+
+def cases(scale):
+  outputs = {'repos': (synthetic_repos(scale), "Repo ID"),
+             'consumed': (synthetic_consumed(scale), "Subscription Name")}
+
+  def probe(name):
+    def setup():
+      data = outputs[name][0].encode('utf-8')
+      stream_fn = lambda command: (data[i:i + chunk_size]
+                                   for i in range(0, len(data), chunk_size))
+      sm = ospsurvey.probes.sm.SubscriptionManager(stream_fn=stream_fn)
+      return (lambda: getattr(sm, name)(refresh=True), scale)
+    return setup
+
+  def legacy(name):
+    (output, marker) = outputs[name]
+    return lambda: (lambda: legacy_records(output, marker), scale)
+
+  return [harness.Case(name, probe(name)) for name in sorted(outputs)] + \
+    [harness.Case('legacy.' + name, legacy(name)) for name in sorted(outputs)]
+
+if __name__ == "__main__":
+  sys.exit(harness.run(cases, "Benchmark the subscription-manager parsing"))
@@ -0,0 +1,224 @@
+"""
+Time and measure benchmark cases and compare them with a saved baseline.
+
+A benchmark script defines a function that returns the cases for a scale.
+Each case is a name and a setup function.  The setup function prepares the
+input and returns the function to time and the number of records it handles.
+Each case is timed as the best of several runs and then run once more to
+record its peak memory allocation and the memory still held by its result.
+Without tracemalloc (Python 2) the peak is the largest resident size of the
+whole process so far and the retained memory is not reported.
+
+The results can be saved as a baseline.  A later run compared against the
+baseline reports every case that is slower or uses more memory than the
+baseline by more than the threshold, and exits non-zero if there are any.
+"""
+from __future__ import print_function
+
+import argparse
+from collections import namedtuple
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+# Python 3 only: without it the peak is the process high-water mark
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+default_scales = [100, 1000, 10000]
+default_repeat = 3
+default_threshold = 0.25
+
+Case = namedtuple('Case', ['name', 'setup'])
+
+Result = namedtuple('Result',
+                    ['name', 'scale', 'records', 'seconds', 'rate', 'peak',
+                     'retained', 'error'])
+
+def load_script(path, name=None):
+  """
+  Import a script from bin/ that has no .py extension as a module
+  """
+  name = name or os.path.basename(path).replace('-', '_').replace('.py', '')
+  try:
+    import importlib.machinery
+    import importlib.util
+    loader = importlib.machinery.SourceFileLoader(name, path)
+    spec = importlib.util.spec_from_loader(name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+  except ImportError:
+    import imp
+    return imp.load_source(name, path)
+
+def bin_script(name):
+  """
+  Import a script from the bin directory of this tree
+  """
+  top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  return load_script(os.path.join(top, 'bin', name))
+
+def max_rss():
+  """
+  Return the largest resident size of this process so far in bytes, or None
+  """
+  if resource is None:
+    return None
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports KiB, macOS bytes
+  return rss if sys.platform == 'darwin' else rss * 1024
+
+def measure(case, scale, repeat=default_repeat):
+  """
+  Run one case and return its Result.  A case that fails is reported with
+  the error rather than stopping the run.
+  """
+  try:
+    (fn, records) = case.setup()
+
+    gc.collect()
+    seconds = None
+    for _ in range(repeat):
+      start = time.time()
+      fn()
+      elapsed = time.time() - start
+      seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    (peak, retained) = (None, None)
+    if tracemalloc is not None:
+      gc.collect()
+      tracemalloc.start()
+      value = fn()
+      (retained, peak) = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+      del value
+    else:
+      fn()
+      peak = max_rss()
+  except Exception as e:
+    return Result(case.name, scale, None, None, None, None, None,
+                  "{}: {}".format(type(e).__name__, e))
+
+  rate = records / seconds if seconds > 0 else None
+  return Result(case.name, scale, records, seconds, rate, peak, retained, None)
+
+def result_key(result):
+  return "{}@{}".format(result.name, result.scale)
+
+def save(results, filename):
+  """
+  Save the results as a baseline JSON file
+  """
+  baseline = {
+    'python': platform.python_version(),
+    'results': {result_key(r):r._asdict() for r in results if r.error is None}
+  }
+  with open(filename, 'w') as baseline_file:
+    json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+
+def compare(results, filename, threshold=default_threshold):
+  """
+  Return a list of (result key, measure, baseline, current) for every case
+  that is slower or uses more memory than the baseline by the threshold
+  """
+  with open(filename) as baseline_file:
+    baseline = json.load(baseline_file)['results']
+
+  regressions = []
+  for r in results:
+    old = baseline.get(result_key(r))
+    if r.error is not None or old is None:
+      continue
+    for measure_name in ('seconds', 'peak', 'retained'):
+      (before, after) = (old.get(measure_name), getattr(r, measure_name))
+      if before and after and after > before * (1 + threshold):
+        regressions.append((result_key(r), measure_name, before, after))
+
+  return regressions
+
+def format_size(size):
+  if size is None:
+    return '-'
+  for unit in ('B', 'KiB', 'MiB'):
+    if size < 1024:
+      return "{:.0f}{}".format(size, unit)
+    size /= 1024.0
+  return "{:.1f}GiB".format(size)
+
+def report(results, stream=sys.stdout):
+  """
+  Print a table of the results
+  """
+  print("{:32} {:>8} {:>10} {:>14} {:>10} {:>10}".format(
+    'case', 'scale', 'seconds', 'records/sec', 'peak', 'retained'), file=stream)
+  for r in results:
+    if r.error is not None:
+      print("{:32} {:>8} failed: {}".format(r.name, r.scale, r.error), file=stream)
+      continue
+    print("{:32} {:>8} {:>10.4f} {:>14} {:>10} {:>10}".format(
+      r.name, r.scale, r.seconds,
+      "{:.0f}".format(r.rate) if r.rate else '-', format_size(r.peak),
+      format_size(r.retained)),
+      file=stream)
+
+def parse_cli(description, argv=None):
+  parser = argparse.ArgumentParser(description=description)
+  parser.add_argument('-s', '--scale', default=",".join(map(str, default_scales)),
+                      help="comma separated list of sizes to run (default: %(default)s)")
+  parser.add_argument('-r', '--repeat', type=int, default=default_repeat,
+                      help="runs of each case, the fastest is reported")
+  parser.add_argument('-k', '--select', default=None,
+                      help="run only the cases whose name contains this string")
+  parser.add_argument('--save', metavar='FILE', default=None,
+                      help="save the results as a baseline")
+  parser.add_argument('--compare', metavar='FILE', default=None,
+                      help="compare the results with a saved baseline")
+  parser.add_argument('-t', '--threshold', type=float, default=default_threshold,
+                      help="fraction slower or larger than the baseline to report (default: %(default)s)")
+  parser.add_argument('-j', '--json', action='store_true', default=False,
+                      help="print the results as JSON")
+  return parser.parse_args(argv)
+
+def run(cases_fn, description, argv=None):
+  """
+  Run the cases for each scale, report and compare them.
+  cases_fn(scale) returns the list of Cases for a scale.
+  Return the process exit code: 1 if there are regressions
+  """
+  opts = parse_cli(description, argv)
+
+  results = []
+  for scale in [int(s) for s in opts.scale.split(',')]:
+    for case in cases_fn(scale):
+      if opts.select is not None and opts.select not in case.name:
+        continue
+      results.append(measure(case, scale, opts.repeat))
+
+  if opts.json:
+    print(json.dumps([r._asdict() for r in results], indent=2))
+  else:
+    report(results)
+
+  if opts.save is not None:
+    save(results, opts.save)
+
+  if opts.compare is not None:
+    regressions = compare(results, opts.compare, opts.threshold)
+    for (key, measure_name, before, after) in regressions:
+      print("REGRESSION {} {}: {:.4g} -> {:.4g} (+{:.0%})".format(
+        key, measure_name, before, after, after / before - 1), file=sys.stderr)
+    if regressions:
+      return 1
+
+  return 0
@@ -12,6 +12,9 @@ import re
 import sys
 import yaml
 
+import ospsurvey.inventory
+import ospsurvey.scheduler
+import ospsurvey.sources
 import ospsurvey.probes.services
 import ospsurvey.probes.endpoints
 import ospsurvey.probes.servers
@@ -44,7 +47,16 @@ def get_cli_arguments():
   parser.add_argument('--no-require-env', dest="require_env", action='store_false')
 
   parser.add_argument('-P', '--profile-dir', default="./profiles")
+  parser.add_argument('-b', '--backend', choices=ospsurvey.sources.backends,
+                      default='cli',
+                      help="query the openstack CLI or the service APIs")
+  parser.add_argument('-w', '--workers', type=int,
+                      default=ospsurvey.scheduler.default_workers,
+                      help="number of probes to run at the same time")
   
+  ospsurvey.sources.add_cache_arguments(parser)
+  ospsurvey.sources.add_fixture_arguments(parser)
+
   return parser.parse_args()
 
 def check_credentials():
@@ -123,27 +135,62 @@ def read_profile_hints(template_dir=os.path.join(os.environ['HOME'], "templates"
         logging.debug(json.dumps(template_data))
 
     
-def resolve_host_roles(servers, hostname_map):
+def resolve_host_roles(inventory, matcher):
   """
   Use the stack environment to identify server hosts and roles for them
+  Return a dict of server name -> role
   """
-  # use the HostnameMap and *SchedulerHints to determine the role of each
-  # server
-  #
-  # invert the HostnameMap so the hostname is the key and the
-  # node label hint is the value:
-  node_label_map = {v:k for (k,v) in hostname_map.items()}
+  # The *SchedulerHints capabilities:node: strings match the node tags, not
+  # the server hostnames.  Find the role of the node each server is deployed
+  # on.  Servers with no node or an untagged node have no role
+  server_roles = {}
+  for server in inventory.servers:
+    node = inventory.server_node(server)
+    server_roles[server.Name] = matcher.node_role(node) if node else None
 
-  # invert the hints map as well so the node label can be used to look up
-  # the role
+  return server_roles
+
+def survey_probes(source_fn, profile):
+  """
+  Define the survey queries and checks and what each one depends on.
+  """
+  Probe = ospsurvey.scheduler.Probe
+  return [
+    # get the list of undercloud services
+    Probe('services', lambda: ospsurvey.probes.services.list_services(source_fn=source_fn)),
+    Probe('endpoints', lambda: ospsurvey.probes.endpoints.list_endpoints(source_fn=source_fn)),
+    Probe('servers', lambda: ospsurvey.probes.servers.list_servers(source_fn=source_fn)),
+    Probe('nodes', lambda: ospsurvey.probes.nodes.list_nodes(source_fn=source_fn)),
+
+    # get overcloud stack name and then the overcloud stack environment
+    Probe('stacks', lambda: ospsurvey.probes.stack.list_stacks(source_fn=source_fn)),
+    Probe('environment',
+          lambda stacks: ospsurvey.probes.stack.get_environment(
+            stacks[0].Stack_Name, source_fn=source_fn),
+          ['stacks']),
+    Probe('matcher',
+          lambda environment: ospsurvey.probes.stack.role_matcher(environment),
+          ['environment']),
+    Probe('inventory', ospsurvey.inventory.Inventory, ['nodes', 'servers']),
+
+    # Questions we can then answer:
+
+    # do all expected services exist?
+    Probe('service_check',
+          lambda services: check_undercloud_services(services, profile),
+          ['services']),
+
+    # what profile matches each server
+    Probe('server_roles', resolve_host_roles, ['inventory', 'matcher'])
+
+    # are all present services active?
+    # to all services have required endpoints?
+    # are all services responding on the accessable interfaces?
+    #   admin, internal, public
+
+    # are all nodes in use?
+  ]
 
-  # Get all of the *Hints structures
-  #  Get the role names from them
-  #  Get the capabilities:node: pattern strings
-  for server in servers:
-    
-    
-  
 
 if __name__ == "__main__":
 
@@ -221,32 +268,21 @@ if __name__ == "__main__":
   # start examining the cluster
   #
 
-  # get the list of undercloud services
-  services = ospsurvey.probes.services.list_services()
-  endpoints = ospsurvey.probes.endpoints.list_endpoints()
-  servers = ospsurvey.probes.servers.list_servers()
-  nodes = ospsurvey.probes.nodes.list_nodes()
-
-  # Questions we can now answer:
-
-  # do all expected services exist?
-  # are all present services active?
-  # to all services have required endpoints?
-  # are all services responding on the accessable interfaces?
-  #   admin, internal, public
-
-  # are all nodes in use?
-  # what profile matches each server
-  
-  check_undercloud_services(services, profile)
-
-  # get overcloud stack name
-  stacks = ospsurvey.probes.stack.list_stacks()
-  stack_name = stacks[0].Stack_Name
-  
-  # get overcloud stack environment
-  stack_env = ospsurvey.probes.stack.get_environment(stack_name)
+  # All queries share one source: the CLI or a single API session
+  source_fn = ospsurvey.sources.select_source(
+    opts.backend, opts.cache, opts.refresh, opts.record, opts.replay)
+
+  # Each query starts as soon as the ones it depends on have finished
+  results = ospsurvey.scheduler.run_graph(survey_probes(source_fn, profile),
+                                          workers=opts.workers)
+  logging.debug("timing: {}".format(
+    json.dumps(ospsurvey.scheduler.timing_report(results))))
+
+  failed = ospsurvey.scheduler.failures(results)
+  for result in failed:
+    logging.error("probe {} failed: {}".format(result.name, result.error))
+  if len(failed) > 0:
+    logging.fatal("Unable to complete the survey: {} probes failed".format(len(failed)))
+    sys.exit(1)
 
-  server_roles = resolve_host_roles(servers, stack_env.parameter_defaults['HostnameMap'])
-  
   #read_profile_hints()
@@ -50,10 +50,14 @@ setup(
 
   scripts=[
     'bin/ospsurvey',
+    'bin/ospsurvey-sudo-helper',
     'bin/server-role',
     'bin/service-checks'
   ],
   python_requires='>=2.7',
+  install_requires=[
+    'futures; python_version<"3"'
+  ],
 
   test_suite="tests"
 )
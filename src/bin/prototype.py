@@ -66,62 +66,14 @@ def get_osp_module_versions():
 #
 
 #
-# The list of environment variables used for OSP API access
-# Map the environment variable name to the parameter named used by the
-# Keystoneauth Session object
+# The OS_* variable mapping and the keystone session creation are shared with
+# the ospsurvey API source
 #
-osp_varmap = {
-  'OS_IDENTITY_API_VERSION': 'identity_api_version',
+from ospsurvey.sources.api import \
+  osp_varmap, get_osp_envvars, create_keystone_session
 
-  'OS_CLOUDNAME': 'cloudname',
-  
-  'OS_AUTH_URL': 'auth_url',
-  'OS_PASSWORD': 'password',
-
-  'OS_USERNAME': 'username',
-  'OS_USER_DOMAIN_NAME': 'user_domain_name',
-
-  'OS_TENANT_NAME': 'tenant_name',
-
-  'OS_PROJECT_NAME': 'project_name',
-  'OS_PROJECT_DOMAIN_NAME': 'project_domain_name',
-
-  'COMPUTE_API_VERSION': 'compute_api_version',
-  'NOVA_VERSION': 'nova_version',
-
-  'OS_BAREMETAL_API_VERSION': 'baremetal_api_version',
-  'IRONIC_API_VERSION': 'ironic_api_version',
-
-  'OS_IMAGE_API_VERSION': 'image_api_version'
-}
-
-def get_osp_envvars():
-  """
-  Collect and return the OSP authentication values from the environment
-  """
-  envvars = {}
-  for k,v in osp_varmap.items():
-    envvars[v] = os.environ[k] if k in os.environ else None
-
-  return envvars
-
-
-def create_keystone_session(credentials):
-  """
-  Create a keystone Session object from the provided credentials.
-  """
-  auth = keystoneauth1.identity.v3.Password(
-    auth_url=credentials['auth_url'],
-    username=credentials['username'],
-    password=credentials['password'],
-    project_name=credentials['project_name'],
-    user_domain_name=credentials['user_domain_name'],
-    project_domain_name=credentials['project_domain_name']
-  )
-
-  session = keystoneauth1.session.Session(auth=auth)
-  
-  return session
+import ospsurvey.probes.endpoints
+import ospsurvey.scheduler
 
 def collect_services(ksclient):
   """
@@ -146,12 +98,20 @@ def confirm_endpoints(ksclient):
   Check the endpoint access for the keystone client provided
   """
 
-  endpoints = (ep for ep in ksclient.endpoints.list() if ep.interface == 'admin')
+  endpoints = [ep for ep in ksclient.endpoints.list() if ep.interface == 'admin']
+  services = {s.id:s for s in ksclient.services.list()}
+
+  # query all of the URLs at once over one pool of connections
+  session = ospsurvey.probes.endpoints.endpoint_session()
+  checks = {ep.id:(lambda ep=ep: ospsurvey.probes.endpoints.check_url(ep.url, session))
+            for ep in endpoints}
+  results = ospsurvey.scheduler.run_probes(
+    checks, workers=ospsurvey.probes.endpoints.default_workers)
 
   print('Endpoints')
   for endpoint in endpoints:
     # get the service by id
-    ep_service = ksclient.services.get(endpoint.service_id)
+    ep_service = services[endpoint.service_id]
     print('Service Name: {}, Service Type: {}, URL: {}'.format(
       ep_service.name, ep_service.type, endpoint.url
     ))
@@ -168,11 +128,11 @@ def confirm_endpoints(ksclient):
     else:
       print("- HOST ERROR")
 
-    url_status = url_check(endpoint.url)
-    if url_status:
-      print("- ENDPOINT OK")
+    url_status = results[endpoint.id].value
+    if url_status['status'] == 'ok':
+      print("- ENDPOINT OK ({} in {}s)".format(url_status['code'], url_status['latency']))
     else:
-      print("- ENDPOINT ERROR")
+      print("- ENDPOINT ERROR ({})".format(url_status['status']))
       
 
 def ping_test(host, count=1):
@@ -183,36 +143,6 @@ def ping_test(host, count=1):
   dev_null = open("/dev/null")
   return subprocess.call(ping_cmd.format(count, host).split(), stdout=dev_null, stderr=dev_null) == 0
 
-def url_check(url):
-
-  try: 
-    query = urllib.urlopen(url)
-  except urllib.HTTPError as err:
-    if err.code == 300:
-      print("multiple choice redirect")
-      return True
-    elif err.code == 400:
-      print("bad request")
-      return True
-    elif err.code == 401:
-      print("unauthorized")
-      return True
-    elif err.code == 404:
-      print("not found")
-      return True
-    else:
-      raise err
-  except urllib.URLError as err:
-    print("url error")
-    return False
-    
-  response_code = query.getcode()
-
-  return response_code == 200 
-#  conn = httplib.HTTPConnection(url.netloc)
-#  conn.request("GET", url.path)
-  
-
 # --------------------------------------------------------------------------
 #
 # MAIN - connect to the OSP service and start gathering data
@@ -0,0 +1,126 @@
+"""
+A small on-disk cache shared by separate ospsurvey runs.
+
+Each entry is one file named by a hash of its key.  Entries are written to a
+temporary file and renamed into place so concurrent processes never see a
+partial entry.  The age of an entry is the age of its file.  When the cache
+grows past its size limit the oldest entries are removed.
+"""
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+default_max_bytes = 64 * 1024 * 1024
+
+def default_directory():
+  """
+  Return the per-user cache directory
+  """
+  base = os.environ.get('XDG_CACHE_HOME',
+                        os.path.join(os.path.expanduser('~'), '.cache'))
+  return os.path.join(base, 'ospsurvey')
+
+
+class DiskCache(object):
+  """
+  Store byte strings on disk by key
+  """
+
+  def __init__(self, directory=None, max_bytes=default_max_bytes):
+    self.directory = directory if directory is not None else default_directory()
+    self.max_bytes = max_bytes
+
+  def _path(self, key):
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(self.directory, digest)
+
+  def get(self, key, ttl=None):
+    """
+    Return the value stored for a key, or None if it is missing or older than
+    ttl seconds
+    """
+    path = self._path(key)
+    try:
+      if ttl is not None and time.time() - os.stat(path).st_mtime > ttl:
+        return None
+      with open(path, 'rb') as entry:
+        return entry.read()
+    except (IOError, OSError) as e:
+      if e.errno != errno.ENOENT:
+        logging.warning("unable to read cache entry {}: {}".format(path, e))
+      return None
+
+  def put(self, key, value):
+    """
+    Store a value for a key, replacing any existing value
+    """
+    if not isinstance(value, bytes):
+      value = value.encode('utf-8')
+
+    try:
+      os.makedirs(self.directory, 0o700)
+    except OSError as e:
+      # another process may have made it first
+      if e.errno != errno.EEXIST:
+        logging.warning("unable to create cache {}: {}".format(self.directory, e))
+        return
+
+    try:
+      # Write a private temp file and move it into place in one step
+      (fd, temp_path) = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+      try:
+        with os.fdopen(fd, 'wb') as entry:
+          entry.write(value)
+        os.rename(temp_path, self._path(key))
+      except:
+        os.remove(temp_path)
+        raise
+    except (IOError, OSError) as e:
+      logging.warning("unable to write cache entry for {}: {}".format(key, e))
+      return
+
+    self.evict()
+
+  def evict(self):
+    """
+    Remove the oldest entries until the cache fits in its size limit
+    """
+    entries = []
+    for name in os.listdir(self.directory):
+      if name.startswith('.tmp-'):
+        continue
+      try:
+        stat = os.stat(os.path.join(self.directory, name))
+      except OSError:
+        # removed by another process
+        continue
+      entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(e[1] for e in entries)
+    for (mtime, size, name) in sorted(entries):
+      if total <= self.max_bytes:
+        break
+      try:
+        os.remove(os.path.join(self.directory, name))
+      except OSError:
+        pass
+      total -= size
+
+  def get_json(self, key, ttl=None):
+    """
+    Return a JSON value stored for a key or None
+    """
+    value = self.get(key, ttl)
+    if value is None:
+      return None
+    try:
+      return json.loads(value.decode('utf-8'))
+    except ValueError:
+      return None
+
+  def put_json(self, key, value):
+    self.put(key, json.dumps(value))
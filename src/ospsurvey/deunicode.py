@@ -1,6 +1,35 @@
 """
 Two functions to convert Unicode strings in structures and lists to UTF-8
+
+And a JSON loads() that makes the same conversion while it parses.  The
+object_hook functions copy every nested list and dict again for each object
+that contains them.  loads() converts each object once, as it is parsed.  On
+Python 3 the strings are already text so there is nothing to convert, and a
+faster parser is used if one is installed.
 """
+import json
+
+# Python 3 strings are text: nothing is unicode to convert
+try:
+  text_type = unicode
+except NameError:
+  text_type = ()
+
+# A faster parser if there is one.  It is only used on Python 3 where the
+# strings it returns need no conversion.  orjson turns integers larger than
+# 64 bits into floats, so a document with a run of 20 digits goes to the json
+# module.  Mapping every digit to 0 makes the runs quick to find.
+_digits_to_zero = bytes(bytearray(48 if 48 <= c <= 57 else 32 for c in range(256)))
+_long_number = b'0' * 20
+
+try:
+  import orjson
+  fast_loads = orjson.loads
+  parser = 'orjson'
+except ImportError:
+  fast_loads = None
+  parser = 'json'
+
 #
 # These functions recursively convert unicode items in dicts and lists to UTF-8
 # From: https://stackoverflow.com/questions/956867/how-to-get-string-objects-instead-of-unicode-from-json/6633651#6633651
@@ -8,7 +37,7 @@ Two functions to convert Unicode strings in structures and lists to UTF-8
 def decode_list(data):
     rv = []
     for item in data:
-        if isinstance(item, unicode):
+        if isinstance(item, text_type):
             item = item.encode('utf-8')
         elif isinstance(item, list):
             item = decode_list(item)
@@ -19,10 +48,10 @@ def decode_list(data):
 
 def decode_dict(data):
     rv = {}
-    for key, value in data.iteritems():
-        if isinstance(key, unicode):
+    for key, value in data.items():
+        if isinstance(key, text_type):
             key = key.encode('utf-8')
-        if isinstance(value, unicode):
+        if isinstance(value, text_type):
             value = value.encode('utf-8')
         elif isinstance(value, list):
             value = decode_list(value)
@@ -31,3 +60,64 @@ def decode_dict(data):
         rv[key] = value
     return rv
 
+#
+# Single pass conversion.  The parser builds the innermost objects first so
+# the objects inside a list or object have already been converted.  Only the
+# lists are left to walk, and only through lists.
+#
+def _encode_list(data):
+    rv = []
+    for item in data:
+        if isinstance(item, text_type):
+            item = item.encode('utf-8')
+        elif isinstance(item, list):
+            item = _encode_list(item)
+        rv.append(item)
+    return rv
+
+def _encode_pairs(pairs):
+    rv = {}
+    for key, value in pairs:
+        if isinstance(key, text_type):
+            key = key.encode('utf-8')
+        if isinstance(value, text_type):
+            value = value.encode('utf-8')
+        elif isinstance(value, list):
+            value = _encode_list(value)
+        rv[key] = value
+    return rv
+
+# A decoder that converts each object as it is parsed
+if text_type:
+    decoder = json.JSONDecoder(object_pairs_hook=_encode_pairs)
+else:
+    decoder = json.JSONDecoder()
+
+def loads(string):
+    """
+    Parse a JSON string and return the same value as
+    json.loads(string, object_hook=decode_dict)
+    """
+    if not text_type:
+        data = string if isinstance(string, bytes) else string.encode('utf-8')
+        if fast_loads is not None and \
+           data.translate(_digits_to_zero).find(_long_number) < 0:
+            try:
+                return fast_loads(data)
+            except ValueError:
+                # Let the standard parser accept or report it
+                pass
+        return json.loads(string)
+
+    return encode_value(decoder.decode(string))
+
+def encode_value(value):
+    """
+    Convert a value returned by the decoder.  Only strings and lists outside
+    of any object are left to convert.
+    """
+    if isinstance(value, text_type):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return _encode_list(value)
+    return value
@@ -0,0 +1,88 @@
+"""
+Join the baremetal nodes to the overcloud servers deployed on them.
+
+A node records the ID of the server deployed on it as its Instance UUID.
+Inventory indexes the nodes by instance UUID and by name and the servers by
+ID and by name once so that a server can be found from its node, or a node
+from its server, without scanning either list.
+"""
+
+class Inventory(object):
+  """
+  The nodes and servers of a cloud indexed for lookups in both directions
+  """
+
+  def __init__(self, nodes, servers):
+    """
+    nodes and servers are the records from list_nodes and list_servers
+    """
+    self.nodes = nodes
+    self.servers = servers
+
+    self.nodes_by_uuid = {n.instance_uuid:n for n in nodes
+                          if n.instance_uuid is not None}
+    self.nodes_by_name = {n.name:n for n in nodes if n.name is not None}
+    self.servers_by_id = {s.ID:s for s in servers}
+    self.servers_by_name = {s.Name:s for s in servers}
+
+  def server(self, id_or_name):
+    """
+    Find a server by ID or by name, or return None
+    """
+    server = self.servers_by_id.get(id_or_name)
+    if server is None:
+      server = self.servers_by_name.get(id_or_name)
+    return server
+
+  def node(self, uuid_or_name):
+    """
+    Find a node by the ID of the server on it or by name, or return None
+    """
+    node = self.nodes_by_uuid.get(uuid_or_name)
+    if node is None:
+      node = self.nodes_by_name.get(uuid_or_name)
+    return node
+
+  def node_server(self, node):
+    """
+    Return the server deployed on a node, or None if it is not deployed
+    """
+    if node.instance_uuid is None:
+      return None
+    return self.servers_by_id.get(node.instance_uuid)
+
+  def server_node(self, server):
+    """
+    Return the node a server is deployed on, or None if it has none
+    """
+    return self.nodes_by_uuid.get(server.ID)
+
+  def untagged_nodes(self):
+    """
+    The nodes with no node: capability to match them to a role
+    """
+    return [n for n in self.nodes
+            if 'node' not in n.properties.get('capabilities', {})]
+
+  def undeployed_nodes(self):
+    """
+    The nodes that have no server deployed on them
+    """
+    return [n for n in self.nodes if self.node_server(n) is None]
+
+  def unmatched_servers(self):
+    """
+    The servers that are not deployed on any node
+    """
+    return [s for s in self.servers if s.ID not in self.nodes_by_uuid]
+
+  def orphans(self):
+    """
+    Report the names of the untagged and undeployed nodes and of the servers
+    with no node
+    """
+    return {
+      'untagged_nodes': [n.name for n in self.untagged_nodes()],
+      'undeployed_nodes': [n.name for n in self.undeployed_nodes()],
+      'unmatched_servers': [s.Name for s in self.unmatched_servers()]
+    }
@@ -0,0 +1,148 @@
+"""
+Parse a JSON array one element at a time as its text arrives.
+
+The list probes read the whole CLI output, then decode all of it, then build
+all of the records.  For a cloud with tens of thousands of servers the text,
+the decoded tree and the records are all in memory at once and nothing can be
+done with the first record until the last byte has been read.
+
+iter_array() takes the output as a sequence of chunks and yields each array
+element as soon as it is complete.  Only the unparsed text and the current
+element are held.  cli_stream() gives the chunks of a command's output as the
+command writes them, and iter_lines() splits them into lines for commands
+whose output is text records rather than JSON.
+"""
+import codecs
+import os
+import re
+import subprocess
+
+import ospsurvey.deunicode
+
+chunk_size = 65536
+
+_whitespace = re.compile(r'\s*')
+_number_start = u'-0123456789'
+_number_chars = u'-+.eE0123456789'
+
+def cli_stream(command, size=chunk_size):
+  """
+  Run a command and yield its output in chunks as it is written.
+  Raise CalledProcessError after the last chunk if the command failed.
+  The command is killed if the chunks are not all read.
+  """
+  process = subprocess.Popen(command, stdout=subprocess.PIPE)
+  finished = False
+  try:
+    fd = process.stdout.fileno()
+    while True:
+      chunk = os.read(fd, size)
+      if not chunk:
+        break
+      yield chunk
+    finished = True
+  finally:
+    if not finished and process.poll() is None:
+      # The reader stopped early: nothing will read the rest
+      try:
+        process.kill()
+      except OSError:
+        pass
+    process.stdout.close()
+    returncode = process.wait()
+
+  if returncode != 0:
+    raise subprocess.CalledProcessError(returncode, command)
+
+def source_stream(source_fn):
+  """
+  Return a stream_fn that yields the whole output of a source_fn as one chunk
+  for sources that do not produce their output incrementally
+  """
+  return lambda command: iter([source_fn(command)])
+
+def iter_lines(chunks):
+  """
+  Yield the lines of the text in an iterable of byte or text chunks without
+  their line endings.  On Python 2 byte chunks give byte string lines.
+  """
+  utf8 = codecs.getincrementaldecoder('utf-8')()
+  decode = not ospsurvey.deunicode.text_type
+
+  rest = None
+  for chunk in chunks:
+    if decode and isinstance(chunk, bytes):
+      chunk = utf8.decode(chunk)
+    lines = (chunk if rest is None else rest + chunk).split('\n')
+    rest = lines.pop()
+    for line in lines:
+      yield line.rstrip('\r')
+
+  if decode:
+    tail = utf8.decode(b'', True)
+    rest = tail if rest is None else rest + tail
+  if rest:
+    yield rest.rstrip('\r')
+
+def iter_array(chunks, decoder=None):
+  """
+  Yield the elements of a JSON array from an iterable of byte or text chunks.
+  The elements are the same values that ospsurvey.deunicode.loads would
+  return in the list.
+  """
+  if decoder is None:
+    decoder = ospsurvey.deunicode.decoder
+  utf8 = codecs.getincrementaldecoder('utf-8')()
+  chunks = iter(chunks)
+
+  buf = u''
+  pos = 0
+  eof = False
+  # start: before the '[', first: before the first element or ']',
+  # value: after a ',', separator: after an element
+  state = 'start'
+
+  while True:
+    pos = _whitespace.match(buf, pos).end()
+
+    # Read more text when the buffer is used up or an element is incomplete
+    need_more = (pos == len(buf))
+    if not need_more and state in ('first', 'value') and buf[pos] != ']':
+      try:
+        (value, end) = decoder.raw_decode(buf, pos)
+        # A number cut off by the end of the buffer may go on in the next chunk
+        need_more = not eof and buf[pos] in _number_start and \
+          (end == len(buf) or buf[end] in _number_chars)
+      except ValueError:
+        if eof:
+          raise
+        need_more = True
+
+    if need_more:
+      if eof:
+        raise ValueError("unexpected end of JSON array")
+      chunk = next(chunks, None)
+      if chunk is None:
+        eof = True
+        chunk = utf8.decode(b'', True)
+      elif isinstance(chunk, bytes):
+        chunk = utf8.decode(chunk)
+      (buf, pos) = (buf[pos:] + chunk, 0)
+      continue
+
+    char = buf[pos]
+    if state == 'start':
+      if char != '[':
+        raise ValueError("expected a JSON array at: {!r}".format(buf[pos:pos + 20]))
+      (pos, state) = (pos + 1, 'first')
+    elif char == ']' and state in ('first', 'separator'):
+      return
+    elif state == 'separator':
+      if char != ',':
+        raise ValueError("expected ',' or ']' at: {!r}".format(buf[pos:pos + 20]))
+      (pos, state) = (pos + 1, 'value')
+    elif char == ']':
+      raise ValueError("unexpected ']' after ','")
+    else:
+      (pos, state) = (end, 'separator')
+      yield ospsurvey.deunicode.encode_value(value)
@@ -1,11 +1,32 @@
 """
 Query endpoint information from OpenStack service
 """
+import os
 import subprocess
-import json
-from collections import namedtuple
+import time
 
-from ospsurvey.deunicode import decode_dict
+# Use Python3 module if available
+try:
+  from urllib.parse import urlparse
+except ImportError:
+  from urlparse import urlparse
+
+try:
+  import requests
+  import requests.adapters
+except ImportError:
+  requests = None
+
+from ospsurvey.deunicode import loads
+from ospsurvey.records import make_record, make_records
+import ospsurvey.scheduler
+
+default_interfaces = ('admin', 'internal', 'public')
+default_timeout = 5
+default_workers = 8
+
+# Endpoint fields with only a few distinct values
+shared_fields = ('Region', 'Service Name', 'Service Type', 'Interface')
 
 def list_endpoints(source_fn=subprocess.check_output, interface=None):
   """
@@ -17,17 +38,10 @@ def list_endpoints(source_fn=subprocess.check_output, interface=None):
     query_string += " --interface {}".format(interface)
   
   endpoint_string = source_fn(query_string.split())
-  endpoint_data = json.loads(endpoint_string, object_hook=decode_dict)
-
-  if len(endpoint_data) == 0:
-    return []
-
-  EpClass = namedtuple('Endpoint',
-                       [k.replace(' ', '_') for k in endpoint_data[0].keys()])
+  endpoint_data = loads(endpoint_string)
 
   # each element needs to be turned into a named tuple
-  endpoints = [EpClass._make(ep.values()) for ep in endpoint_data]
-  return endpoints
+  return make_records('Endpoint', endpoint_data, intern=shared_fields)
 
 
 def get_endpoint(id_or_name, source_fn=subprocess.check_output):
@@ -36,19 +50,88 @@ def get_endpoint(id_or_name, source_fn=subprocess.check_output):
   """
   query_string = "openstack endpoint show --format json {}".format(id_or_name)
   endpoint_string = source_fn(query_string.split())
-  endpoint_info = json.loads(endpoint_string, object_hook=decode_dict)
+  endpoint_info = loads(endpoint_string)
 
-  EpClass = namedtuple('Endpoint', endpoint_info.keys())
-  endpoint = EpClass._make(endpoint_info.values())
-  
-  return endpoint
+  return make_record('Endpoint', endpoint_info)
+
+
+def endpoint_session(pool_size=default_workers, verify=None):
+  """
+  Create a requests Session for checking endpoints.
+  Connections are kept open and reused for every endpoint on the same host and
+  port, so each one is connected and TLS negotiated only once.
+  """
+  if requests is None:
+    raise ImportError("checking endpoints needs the python requests module")
+
+  session = requests.Session()
+  adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                          pool_maxsize=pool_size,
+                                          max_retries=0)
+  session.mount('http://', adapter)
+  session.mount('https://', adapter)
+
+  # The undercloud usually has its own CA
+  session.verify = verify if verify is not None else os.environ.get('OS_CACERT', True)
 
+  return session
 
-def check_endpoint(endpoint):
+def check_url(url_string, session, timeout=default_timeout):
+  """
+  Query a URL string for any valid response.
+  Any HTTP response, even an error, shows the service is answering.
+  Return a dict with the status, the HTTP code and the latency in seconds
+  """
+  result = {'status': None, 'code': None, 'latency': None}
+
+  # can't check websockets with http probe
+  if urlparse(url_string).scheme not in ('http', 'https'):
+    result['status'] = 'skipped'
+    return result
+
+  start = time.time()
+  try:
+    response = session.get(url_string, timeout=timeout, allow_redirects=False)
+    result['status'] = 'ok'
+    result['code'] = response.status_code
+  except requests.exceptions.Timeout as e:
+    result['status'] = 'timeout'
+    result['error'] = str(e)
+  except requests.exceptions.RequestException as e:
+    result['status'] = 'error'
+    result['error'] = str(e)
+  result['latency'] = round(time.time() - start, 3)
+
+  return result
+
+def check_endpoint(endpoint, session=None, timeout=default_timeout):
   """
   Given an endpoint object, verify that the endpoint is responding to queries
   """
+  if session is None:
+    session = endpoint_session(1)
 
-  pass
-  
+  result = {
+    'service': endpoint.Service_Name,
+    'interface': endpoint.Interface,
+    'url': endpoint.URL
+  }
+  result.update(check_url(endpoint.URL, session, timeout))
+
+  return result
+
+def check_endpoints(endpoints, interfaces=default_interfaces, session=None,
+                    timeout=default_timeout, workers=default_workers):
+  """
+  Check all the endpoints on the selected interfaces concurrently
+  Return a dict of endpoint ID -> check_endpoint result
+  """
+  if session is None:
+    session = endpoint_session(workers)
+
+  checks = {e.ID:(lambda e=e: check_endpoint(e, session, timeout))
+            for e in endpoints if e.Interface in interfaces}
+  results = ospsurvey.scheduler.run_probes(checks, workers=workers)
+
+  return {i:r.value for (i, r) in results.items()}
 
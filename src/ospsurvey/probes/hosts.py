@@ -0,0 +1,152 @@
+"""
+Check that the hosts behind the service endpoints can be reached.
+
+Many endpoints share a host and port, usually a VIP.  The checks are made once
+for each distinct host and port rather than once for each endpoint, and host
+names are resolved only once per run.
+
+Two checks are available:
+  tcp  - open a TCP connection to the endpoint port.  No privileges needed.
+  icmp - send an ICMP echo request with the ping command.
+"""
+import logging
+import os
+import socket
+import subprocess
+import threading
+import time
+
+# Use Python3 module if available
+try:
+  from urllib.parse import urlparse
+except ImportError:
+  from urlparse import urlparse
+
+import ospsurvey.scheduler
+
+methods = ('tcp', 'icmp')
+default_method = 'tcp'
+default_timeout = 2
+default_workers = 8
+
+default_ports = {'http': 80, 'https': 443, 'ws': 80, 'wss': 443}
+
+# hostname -> IP address, or the exception from resolving it
+_resolved = {}
+# hostname -> the lock held while it is looked up
+_resolving = {}
+_resolved_lock = threading.Lock()
+
+def resolve(hostname):
+  """
+  Return the IP address of a host.  Each name is looked up once per run.
+  A failed lookup raises socket.gaierror every time it is requested.
+  Different names are looked up at the same time.
+  """
+  with _resolved_lock:
+    address = _resolved.get(hostname)
+    if address is None:
+      lock = _resolving.setdefault(hostname, threading.Lock())
+
+  if address is None:
+    with lock:
+      with _resolved_lock:
+        address = _resolved.get(hostname)
+
+      if address is None:
+        try:
+          address = socket.getaddrinfo(
+            hostname, None, 0, socket.SOCK_STREAM)[0][4][0]
+        except socket.gaierror as e:
+          address = e
+        with _resolved_lock:
+          _resolved[hostname] = address
+
+  if isinstance(address, Exception):
+    raise address
+  return address
+
+def clear_dns_cache():
+  with _resolved_lock:
+    _resolved.clear()
+    _resolving.clear()
+
+def url_target(url_string):
+  """
+  Return the (host, port) to check for an endpoint URL
+  """
+  url = urlparse(url_string)
+  port = url.port if url.port else default_ports.get(url.scheme)
+  return (url.hostname, port)
+
+def ping(hostname, timeout=default_timeout):
+  """
+  Return true if a host can be reached with ICMP Echo request
+  """
+  ping_cmd = ["ping", "-q", "-n", "-c", "1", "-W", str(int(max(timeout, 1))),
+              resolve(hostname)]
+  with open(os.devnull, 'w') as dev_null:
+    return subprocess.call(ping_cmd, stdout=dev_null, stderr=dev_null) == 0
+
+def tcp_connect(hostname, port, timeout=default_timeout):
+  """
+  Return true if a TCP connection to the host and port can be opened
+  """
+  try:
+    connection = socket.create_connection((resolve(hostname), port), timeout)
+  except (socket.error, socket.timeout):
+    return False
+  connection.close()
+  return True
+
+def check_host(hostname, port, method=default_method, timeout=default_timeout):
+  """
+  Check one host and return a dict with the address, result and latency
+  """
+  result = {'host': hostname, 'port': port, 'method': method,
+            'address': None, 'reachable': False, 'latency': None}
+  start = time.time()
+  try:
+    result['address'] = resolve(hostname)
+    if method == 'icmp':
+      result['reachable'] = ping(hostname, timeout)
+    else:
+      result['reachable'] = tcp_connect(hostname, port, timeout)
+  except socket.gaierror as e:
+    result['error'] = str(e)
+  result['latency'] = round(time.time() - start, 3)
+
+  return result
+
+def check_hosts(targets, method=default_method, timeout=default_timeout,
+                workers=default_workers):
+  """
+  Check a collection of (host, port) targets, each distinct one once.
+  The ICMP check ignores the port so each host is pinged once.
+  Return a dict of (host, port) -> check_host result
+  """
+  if method not in methods:
+    raise ValueError("invalid method {} - valid methods: {}".format(
+      method, ", ".join(methods)))
+
+  # the ICMP check doesn't use the port
+  key = (lambda t: (t[0], None)) if method == 'icmp' else (lambda t: t)
+  unique = set(key(t) for t in targets)
+  logging.debug("checking {} distinct hosts for {} targets".format(
+    len(unique), len(targets)))
+
+  checks = {t:(lambda t=t: check_host(t[0], t[1], method, timeout)) for t in unique}
+  results = ospsurvey.scheduler.run_probes(checks, workers=workers)
+
+  return {t:results[key(t)].value for t in targets}
+
+def check_endpoint_hosts(endpoints, method=default_method,
+                         timeout=default_timeout, workers=default_workers):
+  """
+  Check the hosts of a list of endpoint objects
+  Return a dict of endpoint ID -> check_host result
+  """
+  targets = {e.ID:url_target(e.URL) for e in endpoints}
+  results = check_hosts(list(targets.values()), method, timeout, workers)
+
+  return {i:results[t] for (i, t) in targets.items()}
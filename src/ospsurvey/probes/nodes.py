@@ -3,10 +3,17 @@ Query an openstack service and return an object or list of objects representing
 The bare metal nodes included
 """
 import subprocess
-import json
-from collections import namedtuple
 
-from ospsurvey.deunicode import decode_dict
+from ospsurvey.deunicode import loads
+from ospsurvey.jsonstream import cli_stream, iter_array
+from ospsurvey.records import intern_value, iter_records, make_record, make_records
+
+# Node fields with only a few distinct values
+shared_fields = ('Power State', 'Provisioning State', 'Maintenance', 'Driver',
+                 'Resource Class', 'Provision State', 'Properties')
+
+def node_field(key):
+  return key.replace(" ", "_").lower()
 
 def list_nodes(source_fn=subprocess.check_output):
   """
@@ -15,33 +22,39 @@ def list_nodes(source_fn=subprocess.check_output):
   """
   query_string = "openstack baremetal node list --long --format json"
   node_string = source_fn(query_string.split())
-  node_records = json.loads(node_string, object_hook=decode_dict)
-
-  if len(node_records) == 0:
-    return []
+  node_records = loads(node_string)
 
-
-  node_keys = [k.replace(" ", "_").lower() for k in node_records[0].keys()]
-  NodeClass = namedtuple("NodeClass", node_keys)
-  nodes = [NodeClass._make(s.values()) for s in node_records]
+  nodes = make_records("NodeClass", node_records, rename=node_field,
+                       intern=shared_fields)
 
   # pre-convert nested capabilities string to dict
   for n in nodes:
-    n.properties['capabilities'] = node_capabilities(n)
+    n.properties['capabilities'] = intern_value(node_capabilities(n))
 
   return nodes
 
+def iter_nodes(stream_fn=cli_stream):
+  """
+  Yield the nodes one at a time as the CLI output is read.
+  The records are the same as list_nodes returns.
+  """
+  query_string = "openstack baremetal node list --long --format json"
+  node_records = iter_array(stream_fn(query_string.split()))
+
+  for n in iter_records("NodeClass", node_records, rename=node_field,
+                        intern=shared_fields):
+    n.properties['capabilities'] = intern_value(node_capabilities(n))
+    yield n
+
 def get_node(id_or_name, source_fn=subprocess.check_output):
   """
   Get the information about a single node and return a named tuple
   """
   query_string = "openstack baremetal node show --format json {}".format(id_or_name)
   node_string = source_fn(query_string.split())
-  node_info = json.loads(node_string, object_hook=decode_dict)
-
-  NodeClass = namedtuple("NodeClass", node_info.keys())
+  node_info = loads(node_string)
 
-  node = NodeClass._make(node_info.values())
+  node = make_record("NodeClass", node_info)
 
   node.properties['capabilities'] = node_capabilities(node)
   
@@ -59,7 +72,7 @@ def node_capabilities(node):
     cap_entries = map(lambda c: c.split(':'), cap_entry_strings)
     capabilities = {c[0]:c[1] for c in cap_entries}
   else:
-    capabilties = node.properties['capabilities']
+    capabilities = node.properties['capabilities']
 
   return capabilities
                     
@@ -0,0 +1,93 @@
+"""
+Query the packages installed on a Red Hat server.
+
+The whole package set comes from a single rpm -qa.  The parsed inventory is
+cached on disk under the version of the rpm database, so it is only read
+again when a package has been installed, updated or removed.
+"""
+import json
+import os
+import subprocess
+
+from ospsurvey.deunicode import loads
+
+# The rpm database: Berkeley DB before RHEL 8, sqlite after
+rpm_databases = ('/var/lib/rpm/Packages', '/var/lib/rpm/rpmdb.sqlite')
+
+# yum keeps the rpmdb version it reports in history here:
+#   1208:938a582ff2c1559ddafe7b8cd79c3b2dc8dee22c
+yum_version_file = '/var/lib/yum/rpmdb-indexes/version'
+
+package_fields = ('name', 'epoch', 'version', 'release', 'arch', 'installtime')
+query_format = "\t".join(
+  ['%{NAME}', '%{EPOCHNUM}', '%{VERSION}', '%{RELEASE}', '%{ARCH}', '%{INSTALLTIME}']) + "\n"
+
+def rpmdb_version(databases=rpm_databases, version_file=yum_version_file):
+  """
+  Return a string that changes whenever the installed package set changes,
+  or None if there is no rpm database.
+  This is the rpmdb version yum recorded if it was written after the last
+  change to the database, otherwise the database file's mtime and size.
+  """
+  for database in databases:
+    try:
+      st = os.stat(database)
+      break
+    except OSError:
+      continue
+  else:
+    return None
+
+  try:
+    if os.stat(version_file).st_mtime >= st.st_mtime:
+      with open(version_file) as f:
+        version = f.read().strip()
+      if version:
+        return version
+  except (IOError, OSError):
+    pass
+
+  return "{}:{}:{}".format(database, st.st_mtime, st.st_size)
+
+def parse_packages(package_string):
+  """
+  Parse the rpm -qa --queryformat output into a list of package dicts
+  sorted by name
+  """
+  packages = []
+  for line in package_string.splitlines():
+    values = line.split("\t")
+    if len(values) != len(package_fields):
+      continue
+    package = dict(zip(package_fields, values))
+    package['installtime'] = int(package['installtime'])
+    packages.append(package)
+
+  packages.sort(key=lambda p: (p['name'], p['arch'], p['version'], p['release']))
+  return packages
+
+def list_packages(source_fn=subprocess.check_output, cache=None, refresh=False,
+                  databases=rpm_databases, version_file=yum_version_file):
+  """
+  Get the installed packages from one rpm query.
+  With a DiskCache the inventory is kept under the rpmdb version and only
+  queried again when that changes, or on refresh.
+  """
+  version = rpmdb_version(databases, version_file) if cache is not None else None
+  key = "rpm -qa {}".format(version)
+
+  if version is not None and not refresh:
+    cached = cache.get(key)
+    if cached is not None:
+      return loads(cached)
+
+  package_string = source_fn(['rpm', '-qa', '--queryformat', query_format])
+  if isinstance(package_string, bytes) and not isinstance(package_string, str):
+    package_string = package_string.decode('utf-8')
+  packages = parse_packages(package_string)
+
+  # Don't keep an inventory that may be older than its key
+  if version is not None and version == rpmdb_version(databases, version_file):
+    cache.put(key, json.dumps(packages))
+
+  return packages
@@ -2,13 +2,25 @@
 Query an openstack service and return an object or list of objects representing
 The services available.
 """
-from collections import namedtuple
-import json
 import logging
 import re
 import subprocess
 
-from ospsurvey.deunicode import decode_dict
+from ospsurvey.deunicode import loads
+from ospsurvey.jsonstream import cli_stream, iter_array
+from ospsurvey.records import iter_records, make_record, make_records
+
+# Server fields with only a few distinct values
+shared_fields = ('Status', 'Task State', 'Power State', 'Image Name',
+                 'Image ID', 'Flavor Name', 'Flavor ID', 'Availability Zone',
+                 'Host', 'Properties')
+
+def server_field(key):
+  """
+  The server show keys have colons, hyphens and spaces that are not allowed
+  in attribute names
+  """
+  return re.sub(r'[\- :]', '_', key)
 
 def list_servers(source_fn=subprocess.check_output):
   """
@@ -17,17 +29,19 @@ def list_servers(source_fn=subprocess.check_output):
   """
   query_string = "openstack server list --long --format json"
   server_string = source_fn(query_string.split())
-  server_records = json.loads(server_string, object_hook=decode_dict)
+  server_records = loads(server_string)
+
+  return make_records("ServerClass", server_records, intern=shared_fields)
 
-  if len(server_records) == 0:
-    return []
+def iter_servers(stream_fn=cli_stream):
+  """
+  Yield the servers one at a time as the CLI output is read.
+  The records are the same as list_servers returns.
+  """
+  query_string = "openstack server list --long --format json"
+  server_records = iter_array(stream_fn(query_string.split()))
 
-  ServerClass = namedtuple(
-    "ServerClass",
-    [s.replace(' ', '_') for s in server_records[0].keys()]
-  )
-  servers = [ServerClass._make(s.values()) for s in server_records]
-  return servers
+  return iter_records("ServerClass", server_records, intern=shared_fields)
 
 def get_server(id_or_name, source_fn=subprocess.check_output):
   """
@@ -35,22 +49,11 @@ def get_server(id_or_name, source_fn=subprocess.check_output):
   """
   query_string = "openstack server show --format json {}".format(id_or_name)
   server_string = source_fn(query_string.split())
-  server_info = json.loads(server_string, object_hook=decode_dict)
+  server_info = loads(server_string)
 
   logging.debug("server_info: {}".format(server_info))
   
   # Convert the JSON object to a proper class.
-  # BUT, the JSON keys have colons in them that are not allowed
-  # And hyphens and spaces.
   # Colons should really create sub-objects
-
-  
-  properties = [re.sub('[\- :]', '_', s) for s in server_info.keys()]
-  logging.debug("keys: {}".format(server_info.keys()))
-  logging.debug("properties: {}".format(properties))
-  ServerClass = namedtuple("ServerClass", properties)
-
-  server = ServerClass._make(server_info.values())
-  
-  return server
+  return make_record("ServerClass", server_info, rename=server_field)
 
@@ -3,10 +3,9 @@ Query an openstack service and return an object or list of objects representing
 The services available.
 """
 import subprocess
-import json
-from collections import namedtuple
 
-from ospsurvey.deunicode import decode_dict
+from ospsurvey.deunicode import loads
+from ospsurvey.records import make_record, make_records
 
 def list_services(source_fn=subprocess.check_output):
   """
@@ -15,17 +14,9 @@ def list_services(source_fn=subprocess.check_output):
   """
   query_string = "openstack service list --long --format json"
   service_string = source_fn(query_string.split())
-  service_records = json.loads(service_string, object_hook=decode_dict)
+  service_records = loads(service_string)
 
-  if len(service_records) == 0:
-    return []
-
-  ServiceClass = namedtuple(
-    "ServiceClass",
-    [s.replace(' ', '_') for s in service_records[0].keys()]
-  )
-  services = [ServiceClass._make(s.values()) for s in service_records]
-  return services
+  return make_records("ServiceClass", service_records)
 
   return service_list
 
@@ -36,9 +27,6 @@ def get_service(id_or_name, source_fn=subprocess.check_output):
   """
   query_string = "openstack service show --format json {}".format(id_or_name)
   service_string = source_fn(query_string.split())
-  service_info = json.loads(service_string, object_hook=decode_dict)
+  service_info = loads(service_string)
 
-  ServiceClass = namedtuple("ServiceClass", service_info.keys())
-  service = ServiceClass._make(service_info.values())
-  
-  return service
+  return make_record("ServiceClass", service_info)
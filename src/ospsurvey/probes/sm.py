@@ -2,11 +2,21 @@
 Classes and Functions to query the software update status of a Red Hat
 server.
 """
+import base64
+import datetime
+import glob
+import json
 import logging
 import os
 import re
 import subprocess
-import tempfile
+import zlib
+
+from ospsurvey.deunicode import loads
+from ospsurvey.jsonstream import cli_stream, iter_lines
+
+rhsm_conf = '/etc/rhsm/rhsm.conf'
+entitlement_directory = '/etc/pki/entitlement'
 
 #
 # Subscription Manager
@@ -15,7 +25,12 @@ class SubscriptionManager():
   """
   Query and report status of Subscription Manager
   """
-  def __init__(self):
+  def __init__(self, stream_fn=cli_stream, cache=None, rhsm_conf=rhsm_conf,
+               entitlement_directory=entitlement_directory):
+    self._stream_fn = stream_fn
+    self._cache = cache
+    self._rhsm_conf = rhsm_conf
+    self._entitlement_directory = entitlement_directory
     self._status = None
     self._config = None
     self._purpose = None
@@ -23,15 +38,19 @@ class SubscriptionManager():
     self._repos = None
 
   @staticmethod
-  def subscribed():
+  def subscribed(source_fn=None):
     """
     Check if the host is registered using Subscription Manager
+    The command runs through source_fn if one is given.
     """
     try:
-      subprocess.check_call(
-      "sudo subscription-manager status".split(),
-      stdout=open(os.devnull),
-      stderr=subprocess.STDOUT)
+      if source_fn is not None:
+        source_fn("sudo subscription-manager status".split())
+      else:
+        subprocess.check_call(
+        "sudo subscription-manager status".split(),
+        stdout=open(os.devnull),
+        stderr=subprocess.STDOUT)
     except subprocess.CalledProcessError as e:
       # called but unsuccessful
       return False
@@ -53,8 +72,8 @@ class SubscriptionManager():
 
       # get the actual status
       try:
-        sm_status_string = \
-          subprocess.check_output("sudo subscription-manager status".split())
+        sm_status_string = "\n".join(iter_lines(
+          self._stream_fn("sudo subscription-manager status".split())))
 
         # extract the status string
         status_match = status_re.search(sm_status_string, re.MULTILINE)
@@ -74,35 +93,27 @@ class SubscriptionManager():
   def config(self, refresh=False):
     """
     Read the subscription-manager configuration and return it as a dict
+    With a cache, the answer is kept until rhsm.conf changes.
     """
     if self._config == None or refresh == True:
-    
-      config_string = subprocess.check_output("sudo subscription-manager config".split())
-
-      # remove lines afer the one containing "default value in use"
-      default_line = '[] - Default value in use'
-
-      config_lines = config_string.split('\n')
-      # remove the default line and everything after
-      config_lines = config_lines[:config_lines.index(default_line)]
-      # remove leading white space because ConfigParser doesn't like it.
-      config_lines = [line.lstrip() for line in config_lines]
-
-      config_string = "\n".join(config_lines)
-      config_string = re.sub(r'= \[\]', '= default', config_string)
-      config_string = re.sub(r'= \[([^]]+)\]', r'= \1', config_string)
-
-      # Write and then read an anonymous temp file because ConfigParser can't
-      # read strings
-      tf = tempfile.TemporaryFile(mode='w+')
-      tf.write(unicode(config_string))
-      tf.seek(0)
-
-      sm_config = SmConfigParser()
-      sm_config.readfp(tf)
+      key = None
+      if self._cache is not None:
+        try:
+          st = os.stat(self._rhsm_conf)
+          key = "subscription-manager config {} {} {}".format(
+            self._rhsm_conf, st.st_mtime, st.st_size)
+        except OSError:
+          pass
+
+      cached = self._cache.get(key) if key is not None and not refresh else None
+      if cached is not None:
+        self._config = loads(cached)
+      else:
+        lines = iter_lines(self._stream_fn("sudo subscription-manager config".split()))
+        self._config = parse_sm_config(lines)
+        if key is not None:
+          self._cache.put(key, json.dumps(self._config))
 
-      self._config = sm_config.as_dict()
-      
     return self._config
 
 
@@ -111,124 +122,236 @@ class SubscriptionManager():
     Get a list of repositories enabled in subscription manager
     """
     if self._repos == None or refresh == True:
-      sm_repos_string = \
-        subprocess.check_output("sudo subscription-manager repos --list-enabled".split())
+      lines = iter_lines(
+        self._stream_fn("sudo subscription-manager repos --list-enabled".split()))
 
-      sm_repos_lines = sm_repos_string.split('\n')
-
-      repos = {}
-
-      # The first line of each subscription record will have this string
-      marker = "Repo ID"
-      # Get the index of each line with the marker in it
-      # Those are the beginning lines of subscription records
-      starts = [i for i, line in enumerate(sm_repos_lines) if line.startswith(marker + ':')]
-
-      # Collect all of the subscription records
-      for start in starts:
-        # Clip out just the lines for this record from the output
-        end = sm_repos_lines[start:].index("")
-        repo_lines = sm_repos_lines[start:start + end]
-
-        title, record = parse_sm_record(repo_lines)
-        repos[title] = record
-
-      self._repos = repos
+      # The first line of each repo record starts with "Repo ID:"
+      self._repos = dict(iter_sm_records(lines, "Repo ID"))
 
     return self._repos
 
 
-  def consumed(self, refresh=False):
+  def consumed(self, refresh=False, local=False):
     """
     Report the consumed subscriptions
+    With local, read them from the entitlement certificates on disk and only
+    ask the entitlement server if the certificates cannot be read.
     """
     if self._consumed == None or refresh == True:
-      # get the actual status
-      sm_consumed_string = \
-        subprocess.check_output("sudo subscription-manager list --consumed".split())
-
-      # read the header and get the title
-
-      sm_consumed_lines = sm_consumed_string.split('\n')
-
-      # 1st and 3rd lines should match "^\+-*\*$"
-      # Second line is title, with white space stripped
-
-      # lines are key/value, with multiple values signalled by white space at the
-      # beginning of the line.
-      # blank lines signal the end of a structure
-      kv_re = re.compile("^([^:]+):\s+(.*)$")
-
-      # Initialize the consumed subscriptions set
-      subscriptions = {}
-
-      # The first line of each subscription record will have this string
-      marker = "Subscription Name"
-      # Get the index of each line with the marker in it
-      # Those are the beginning lines of subscription records
-      starts = [i for i, line in enumerate(sm_consumed_lines) if line.startswith(marker + ':')]
-
-      # Collect all of the subscription records
-      for start in starts:
+      self._consumed = read_entitlements(self._entitlement_directory) \
+        if local else None
 
-        # Clip out just the lines for this record from the output
-        end = sm_consumed_lines[start:].index("")
-        sub_lines = sm_consumed_lines[start:start + end]
+    if self._consumed == None:
+      # The header is a title between two lines of "+-----+"
+      # Each record is key/value lines, with multiple values signalled by white
+      # space at the beginning of the line.  Blank lines end a record.
+      lines = iter_lines(
+        self._stream_fn("sudo subscription-manager list --consumed".split()))
 
-        title, record = parse_sm_record(sub_lines)
-        subscriptions[title] = record
-        self._consumed = subscriptions
+      # The first line of each subscription record starts with "Subscription Name:"
+      self._consumed = dict(iter_sm_records(lines, "Subscription Name"))
 
     return self._consumed  
 
 # ----------------------------------------------------------------------------
 # Module functions
 # ----------------------------------------------------------------------------
-# Extend the ConfigParser to create a dict
-# from https://stackoverflow.com/questions/3220670/read-all-the-contents-in-ini-file-into-dictionary-with-python
-import ConfigParser as configparser
-class SmConfigParser(configparser.ConfigParser):
-
-  def as_dict(self):
-    d = dict(self._sections)
-    for k in d:
-      d[k] = dict(self._defaults, **d[k])
-      d[k].pop('__name__', None)
-    return d
-
-def parse_sm_record(lines):
+# lines are key/value, with multiple values signalled by white space at the
+# beginning of the line.
+# blank lines signal the end of a structure
+sm_kv_re = re.compile(r'^(([^:]+):)?\s+(.*)$')
+sm_title_re = re.compile(r'^.*:\s+')
+
+# The config output lists each section and its options.  A value in brackets
+# is the default, [] is an empty default
+#   [server]
+#      hostname = [subscription.rhsm.redhat.com]
+#      proxy_hostname =
+#   [] - Default value in use
+sm_default_line = '[] - Default value in use'
+sm_section_re = re.compile(r'^\[([^\]]+)\]$')
+sm_option_re = re.compile(r'^([^:=\s][^:=]*?)\s*[:=]\s*(.*)$')
+sm_default_re = re.compile(r'^\[([^\]]*)\]')
+
+def parse_sm_config(lines):
   """
-  Create a dict record from a fragment of a subscription-manager output
+  Parse subscription-manager config output into a dict of section -> dict of
+  option -> value in one pass over the lines.  Default values lose their
+  brackets and an empty default is "default".
+  """
+  config = {}
+  section = None
+  for line in lines:
+    if line == sm_default_line:
+      break
+
+    line = line.strip()
+    if line == '' or line[0] in '#;':
+      continue
+
+    section_match = sm_section_re.match(line)
+    if section_match:
+      section = config.setdefault(section_match.group(1), {})
+      continue
+
+    option_match = sm_option_re.match(line)
+    if option_match and section is not None:
+      (option, value) = option_match.groups()
+      value = sm_default_re.sub(lambda m: m.group(1) or 'default', value)
+      section[option.lower()] = value
+
+  return config
+
+def iter_sm_records(lines, marker):
   """
-  # lines are key/value, with multiple values signalled by white space at the
-  # beginning of the line.
-  # blank lines signal the end of a structure
-  kv_re = re.compile('^(([^:]+):)?\s+(.*)$')
+  Yield a (title, record) pair for each record in subscription-manager output
+  in one pass over the lines.  A record starts with a "<marker>:" line, whose
+  value is the title, and ends at a blank line.
+  """
+  start = marker + ':'
+  (title, record, hold_k) = (None, None, None)
+
+  for line in lines:
+    if record is None:
+      if line.startswith(start):
+        # The title will be the key for each record
+        (title, record, hold_k) = (sm_title_re.sub('', line).strip(), {}, None)
+      continue
 
-  record = {}
-  # The subscription name will be the key for each subscription record
-  title = re.sub('^.*:\s+', '', lines[0]).strip()
+    if line == '':
+      yield title, record
+      (title, record) = (None, None)
+      continue
 
-  for l in lines[1:]:
     # check all lines for "((key):)? (value)"
-    #new_value = kv_re.match('^(([^:]+):)?\s+(.*)$', l)
-    new_value = kv_re.match(l)
+    new_value = sm_kv_re.match(line)
     if new_value:
       a,k,v = new_value.groups()
-      
+
       # If a key is present, this is a new field of the record
       if k:
         record[k] = v
         hold_k = k
 
       # If not, the field is a list of values.  Append to it
-      else:
+      elif hold_k is not None:
         if type(record[hold_k]) is list:
           record[hold_k].append(v)
         else:
           record[hold_k] = [record[hold_k], v]
 
-  return title, record
+  if record is not None:
+    yield title, record
+
+def parse_sm_record(lines):
+  """
+  Create a dict record from a fragment of a subscription-manager output
+  """
+  for (title, record) in iter_sm_records(list(lines) + [''], lines[0].split(':')[0]):
+    return title, record
+
+# An entitlement certificate is <serial>.pem, with its key in <serial>-key.pem.
+# A version 3 certificate carries the subscription after the certificate as
+# zlib compressed JSON:
+#   -----BEGIN ENTITLEMENT DATA-----
+#   eJzFVE1v2zAM/...
+#   -----END ENTITLEMENT DATA-----
+# Version 1 certificates keep it in X.509 extensions, which are not read here.
+entitlement_data_re = re.compile(
+  r'-----BEGIN ENTITLEMENT DATA-----(.*?)-----END ENTITLEMENT DATA-----', re.S)
+entitlement_time_re = re.compile(
+  r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.\d+)?(?:([+-])(\d\d):?(\d\d)|Z)?$')
+
+def entitlement_time(value):
+  """
+  Convert an entitlement date to a UTC datetime
+  Raise ValueError if it is not an ISO 8601 date and time
+  """
+  match = entitlement_time_re.match(value)
+  if match is None:
+    raise ValueError("invalid entitlement date: {}".format(value))
+
+  (timestamp, sign, hours, minutes) = match.groups()
+  when = datetime.datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S')
+  if sign:
+    offset = datetime.timedelta(hours=int(hours), minutes=int(minutes))
+    when = when - offset if sign == '+' else when + offset
+  return when
+
+def parse_entitlement(data, serial, now=None):
+  """
+  Map the JSON of an entitlement certificate to the (title, record) that
+  subscription-manager list --consumed reports for it.
+  Starts and Ends are UTC dates.  The fields the entitlement server works out
+  when asked (Status Details, Subscription Type, Entitlement Type, System
+  Type...) are not included.
+  """
+  subscription = data.get('subscription', {})
+  order = data.get('order', {})
+  service = subscription.get('service', {})
+
+  provides = [p['name'] for p in data.get('products', [])]
+  starts = entitlement_time(order['start'])
+  ends = entitlement_time(order['end'])
+  now = now or datetime.datetime.utcnow()
+
+  record = {
+    'Provides': provides[0] if len(provides) == 1 else provides,
+    'SKU': subscription.get('sku', ''),
+    'Contract': order.get('contract', ''),
+    'Account': order.get('account', ''),
+    'Serial': serial,
+    'Pool ID': data.get('pool', {}).get('id', ''),
+    'Provides Management': 'Yes' if subscription.get('management') else 'No',
+    'Active': str(starts <= now < ends),
+    'Quantity Used': str(data.get('quantity', '')),
+    'Service Type': service.get('type', ''),
+    'Service Level': service.get('level', ''),
+    'Starts': starts.strftime('%m/%d/%Y'),
+    'Ends': ends.strftime('%m/%d/%Y')
+  }
+  return subscription['name'], record
+
+def read_entitlement(path, now=None):
+  """
+  Read the subscription from an entitlement certificate file
+  Return None if the file has no entitlement data.
+  """
+  with open(path) as f:
+    match = entitlement_data_re.search(f.read())
+  if match is None:
+    return None
+
+  data = loads(zlib.decompress(base64.b64decode(match.group(1))).decode('utf-8'))
+  serial = os.path.basename(path)[:-len('.pem')]
+  return parse_entitlement(data, serial, now)
+
+def read_entitlements(directory=entitlement_directory, now=None):
+  """
+  Read the consumed subscriptions from the entitlement certificates
+  Return None when they cannot all be read, so that the caller can ask the
+  entitlement server instead.
+  """
+  paths = [p for p in sorted(glob.glob(os.path.join(directory, '*.pem')))
+           if not p.endswith('-key.pem')]
+  if not paths:
+    return None
+
+  consumed = {}
+  for path in paths:
+    try:
+      entitlement = read_entitlement(path, now)
+    except (IOError, OSError, ValueError, KeyError, TypeError, zlib.error) as e:
+      logging.warning("can't read entitlement certificate {}: {}".format(path, e))
+      return None
+    if entitlement is None:
+      logging.info("no entitlement data in {}".format(path))
+      return None
+
+    (title, record) = entitlement
+    consumed[title] = record
+
+  return consumed
 
 # ----------------------------------------------------------------------------
 # Legacy subscription: RHN
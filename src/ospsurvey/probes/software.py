@@ -7,6 +7,8 @@ import re
 import subprocess
 import tempfile
 
+import ospsurvey.probes.yum
+
 #
 # Yum repos and RPMs installed
 #
@@ -71,6 +73,14 @@ def get_repo_info(repo_name):
 
   return repo_info
 
+def get_repos(selector='enabled', source_fn=subprocess.check_output):
+  """
+  Get the information on all of the repos from a single yum repoinfo
+  Return a list of the repo information dicts in the order yum reports them
+  """
+  repo_string = source_fn("sudo yum repoinfo {}".format(selector).split())
+  return list(ospsurvey.probes.yum.parse_repoinfo(repo_string).values())
+
 # SAMPLE
 # yum history info
 # Loaded plugins: product-id, search-disabled-repos, subscription-manager
@@ -176,63 +186,18 @@ def check_updates(check_func=subprocess.check_output):
   Header: Loaded plugins...
   Columns: Advisory ID, reason/level, package name
   Footer: updateinfo list done
+  Use ospsurvey.probes.yum.Yum.updateinfo() for both lists, cached together
   """
   update_string = check_func('sudo yum updateinfo list security'.split())
-  update_lines = update_string.split('\n')
-  # The header and footer are the first and last lines
-
-  packages = {}
-  for line in update_lines:
-    # skip non-record lines
-    if len(line) == 0 \
-       or line.startswith('Loaded') \
-       or line.startswith('updateinfo') \
-       or line.startswith('This system'):
-      continue
-
-    # Split into data components
-    # All record lines are three components
-    try:
-      (advisory, reason, package) = re.split('\s+', line)
-    except ValueError:
-      continue
-    
-    if not package in packages:
-      packages[package]=list()
-      
-    packages[package].append({'advisory': advisory, 'level': re.sub('/Sec.$', '', reason)})
-
-  return packages
+  return ospsurvey.probes.yum.parse_updateinfo(update_string)[0]
 
 def check_cves(check_func=subprocess.check_output):
   """
   Query the vulnerability updates available with yum
   Header: Loaded plugins...
-  Columns: Advisory ID, reason/level, package name
+  Columns: CVE ID, reason/level, package name
   Footer: updateinfo list done
   """
   update_string = check_func('sudo yum updateinfo list cves'.split())
-  update_lines = update_string.split('\n')
-  # The header and footer are the first and last lines
-
-  packages = {}
-  for line in update_lines:
-    # skip non-record lines
-    if len(line) == 0 \
-       or line.startswith('Loaded') \
-       or line.startswith('updateinfo'):
-      continue
-
-    # Split into data components - CVES start with white space
-    try:
-      (advisory, reason, package) = re.split('\s+', line.strip())
-    except ValueError:
-      continue
-    
-    if not package in packages:
-      packages[package]=list()
-      
-    packages[package].append({'advisory': advisory, 'level': re.sub('/Sec.$', '', reason)})
-
-  return packages
+  return ospsurvey.probes.yum.parse_updateinfo(update_string)[1]
   
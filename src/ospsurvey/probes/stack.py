@@ -3,10 +3,14 @@ Query an openstack service and return an object or list of objects representing
 The services available.
 """
 import subprocess
-import json
-from collections import namedtuple
+import re
 
-from ospsurvey.deunicode import decode_dict
+from ospsurvey.deunicode import loads
+from ospsurvey.records import make_record, make_records
+
+# Characters that make a hint stem a regular expression rather than text
+_regex_chars = re.compile(r'[\\.^$*+?{}\[\]|()]')
+_trailing_digits = re.compile(r'\d+$')
 
 def list_stacks(source_fn=subprocess.check_output):
   """
@@ -15,18 +19,9 @@ def list_stacks(source_fn=subprocess.check_output):
   """
   query_string = "openstack stack list --format json"
   stack_string = source_fn(query_string.split())
-  stack_records = json.loads(stack_string, object_hook=decode_dict)
-
-  if len(stack_records) == 0:
-    return []
-
-  StackClass = namedtuple(
-    "StackClass",
-    [s.replace(' ', '_') for s in stack_records[0].keys()]
-  )
-  stacks = [StackClass._make(s.values()) for s in stack_records]
+  stack_records = loads(stack_string)
 
-  return stacks
+  return make_records("StackClass", stack_records)
 
 def get_environment(stack_name, source_fn=subprocess.check_output):
   """
@@ -34,18 +29,106 @@ def get_environment(stack_name, source_fn=subprocess.check_output):
   """
   query_string = "openstack stack environment show --format json {}".format(stack_name)
   env_string = source_fn(query_string.split())
-  env_records = json.loads(env_string, object_hook=decode_dict)
+  env_records = loads(env_string)
 
-  StackEnvClass = namedtuple(
-    "StackEnvClass",
-    [s.replace(' ', '_') for s in env_records.keys()]
-  )
-  stack_env = StackEnvClass._make(env_records.values())
-  return stack_env
+  return make_record("StackEnvClass", env_records)
+
+def role_hints(stack_env):
+  """
+  Get the node capability hint for each role from the stack environment
+  ControllerSchedulerHints: {'capabilities:node': 'controller-%index%'}
+  becomes {'Controller': 'controller-%index%'}
+  """
+  return {re.sub('SchedulerHints$', '', k):v['capabilities:node']
+          for (k,v) in stack_env.parameter_defaults.items()
+          if k.endswith("SchedulerHints")}
 
-def hint_map(stack_env=None):
+def hint_map(stack_env):
   """
   Get an inverted hint map from the stack environment
+  Return a dict of node capability regular expressions -> role
+  """
+  return {v.replace('%index%', r'\d+$'):k
+          for (k,v) in role_hints(stack_env).items()}
+
+class AmbiguousHintError(ValueError):
+  """
+  More than one role hint matches the same node tag
+  """
+
+class RoleMatcher(object):
+  """
+  Resolve node capability tags to roles with the patterns compiled once.
+
+  A hint of the form <stem>%index% is indexed by its stem: a tag is looked up
+  by splitting off its trailing digits, so the time does not grow with the
+  number of roles.  Any other hint is compiled to a regular expression and
+  checked in turn.
+  """
+
+  def __init__(self, hints):
+    """
+    hints is the role -> capabilities:node pattern map from role_hints()
+    """
+    self.stems = {}
+    self.patterns = []
+
+    for (role, hint) in sorted(hints.items()):
+      (stem, index, rest) = hint.partition('%index%')
+      if index and not rest and not _regex_chars.search(stem):
+        if stem in self.stems:
+          raise AmbiguousHintError("roles {} and {} have the same hint {}".format(
+            self.stems[stem], role, hint))
+        self.stems[stem] = role
+      else:
+        self.patterns.append(
+          (re.compile(hint.replace('%index%', r'\d+') + '$'), role))
+
+    # A stem followed by digits is also a tag for a shorter stem:
+    # compute-%index% and compute-1%index% both match compute-12
+    for stem in self.stems:
+      for shorter in self.stems:
+        if shorter != stem and stem.startswith(shorter) and \
+           stem[len(shorter):].isdigit():
+          raise AmbiguousHintError("roles {} and {} overlap: {}%index% and {}%index%".format(
+            self.stems[shorter], self.stems[stem], shorter, stem))
+
+  def role(self, tag):
+    """
+    Return the role for a node tag, or None if no hint matches it.
+    Raise AmbiguousHintError if more than one does.
+    """
+    role = None
+    digits = _trailing_digits.search(tag)
+    if digits is not None:
+      # Try each split of the trailing digits: at most one stem can match
+      for split in range(digits.start(), digits.end()):
+        role = self.stems.get(tag[:split])
+        if role is not None:
+          break
+
+    if self.patterns:
+      roles = [r for (p, r) in self.patterns if p.match(tag)]
+      if role is not None:
+        roles.append(role)
+      if len(roles) > 1:
+        raise AmbiguousHintError("node tag {} matches roles {}".format(
+          tag, ", ".join(sorted(roles))))
+      role = roles[0] if roles else None
+
+    return role
+
+  def node_role(self, node):
+    """
+    Return the role for a node from its capabilities, or None if it is not
+    tagged or no hint matches it
+    """
+    tag = node.properties.get('capabilities', {}).get('node')
+    return self.role(tag) if tag is not None else None
+
+
+def role_matcher(stack_env):
+  """
+  Build a RoleMatcher from the *SchedulerHints in the stack environment
   """
-  # Collect the hints
-  pass
+  return RoleMatcher(role_hints(stack_env))
@@ -2,73 +2,371 @@
 Classes and Functions to query the software update status of a Red Hat
 server.
 """
+from collections import OrderedDict
+import glob
+import hashlib
+import json
+import logging
+import os
 import re
+import sqlite3
 import subprocess
+import threading
+import time
+
+try:
+  import pwd
+except ImportError:
+  pwd = None
+
+try:
+  from urllib.request import pathname2url
+except ImportError:
+  from urllib import pathname2url
+
+try:
+  from configparser import Error as ConfigError, RawConfigParser
+  config_options = {'strict': False}
+except ImportError:
+  from ConfigParser import Error as ConfigError, RawConfigParser
+  config_options = {}
+
+from ospsurvey.deunicode import loads
+import ospsurvey.probes.rpm
+
+repo_selectors = ('enabled', 'disabled', 'all')
+repo_directory = '/etc/yum.repos.d'
+history_directory = '/var/lib/yum/history'
+metadata_directory = '/var/cache/yum'
+
+_revision_pattern = re.compile(r'<revision>\s*([^<]*?)\s*</revision>')
+
+# repo file path -> ((mtime, size), repos in the file)
+_repo_files = {}
+_repo_files_lock = threading.Lock()
+
+# A repoinfo line: the key and value around the first colon
+repoinfo_pattern = re.compile(r'^\s*([^:]+[^ ])\s*:\s*(.*)$')
+
+def parse_repoinfo(repo_string):
+  """
+  Parse the output of yum repoinfo for any number of repos.
+  Each repo is a block of "key : value" lines that starts with Repo-id and
+  ends at a blank line.
+  Return an OrderedDict of repo name -> dict of repo keys and values
+  """
+  repos = OrderedDict()
+  info = {}
+  for line in repo_string.splitlines() + ['']:
+    info_match = repoinfo_pattern.match(line)
+    if line.strip() == '' or \
+       (info_match is not None and info_match.group(1) == 'Repo-id'):
+      # the end of a block: only the repo blocks have a Repo-id.
+      # The first repo can follow the plugin lines with no blank line
+      if 'Repo-id' in info:
+        repos[repo_name(info['Repo-id'])] = info
+      info = {}
+
+    if info_match is not None:
+      (k, v) = info_match.groups()
+      info[k] = v
+
+  return repos
+
+def repo_name(repo_id):
+  """
+  The repo name is the first part of the repo id: rhel-7-server-rpms/7Server/x86_64
+  If the repo info is out of date, it can have a leading bang (!): remove that too
+  """
+  return re.sub('^!', '', repo_id.split('/')[0])
+
+def read_repo_file(path, refresh=False):
+  """
+  Parse one yum .repo file without running yum.
+  Return an OrderedDict of repo name -> dict of the Repo- keys that yum
+  repoinfo reports which come from the configuration.
+  The result is kept until the file's mtime or size changes, or refresh is
+  requested.  A file that is gone has no repos.
+  """
+  try:
+    st = os.stat(path)
+  except OSError as e:
+    logging.debug("unable to read repo file {}: {}".format(path, e))
+    with _repo_files_lock:
+      _repo_files.pop(path, None)
+    return OrderedDict()
+
+  stamp = (st.st_mtime, st.st_size)
+  with _repo_files_lock:
+    cached = _repo_files.get(path)
+  if cached is not None and cached[0] == stamp and not refresh:
+    return cached[1]
+
+  parser = RawConfigParser(**config_options)
+  try:
+    parser.read(path)
+  except ConfigError as e:
+    logging.warning("unable to parse repo file {}: {}".format(path, e))
+    return OrderedDict()
+
+  repos = OrderedDict()
+  for section in parser.sections():
+    options = dict(parser.items(section))
+    # yum treats a repo with no enabled option as enabled
+    enabled = options.get('enabled', '1').strip().lower() in ('1', 'true', 'yes', 'on')
+    info = {
+      'Repo-id': section,
+      'Repo-name': options.get('name', section),
+      'Repo-status': 'enabled' if enabled else 'disabled',
+      'Repo-filename': path
+    }
+    # baseurl can be a list of URLs, one per line
+    for (option, key) in (('baseurl', 'Repo-baseurl'), ('mirrorlist', 'Repo-mirrors'),
+                          ('metalink', 'Repo-metalink')):
+      if option in options:
+        info[key] = ", ".join(options[option].split())
+    repos[repo_name(section)] = info
+
+  with _repo_files_lock:
+    _repo_files[path] = (stamp, repos)
+  return repos
+
+def read_repo_files(directory=repo_directory, selector='enabled', refresh=False):
+  """
+  Read the configured repos from the .repo files in a directory, including
+  redhat.repo, in the same shape as Yum.repos().  With refresh every file is
+  parsed again
+  """
+  if selector == '':
+    selector = 'enabled'
+
+  if selector not in repo_selectors:
+    raise ValueError("invalid selector {} - valid selectors: enabled, disabled, all".format(selector))
+
+  repos = {}
+  for path in sorted(glob.glob(os.path.join(directory, '*.repo'))):
+    for (name, info) in read_repo_file(path, refresh).items():
+      if selector == 'all' or info['Repo-status'] == selector:
+        repos[name] = info
+
+  return repos
+
+def repo_metadata_version(directory=metadata_directory):
+  """
+  Return a digest of the revisions of the repo metadata yum has cached, or
+  None if there is none.  It changes whenever yum fetches new metadata.
+  A repomd.xml with no revision counts by its mtime.
+  """
+  paths = glob.glob(os.path.join(directory, '*', '*', '*', 'repomd.xml')) + \
+          glob.glob(os.path.join(directory, '*', '*', '*', 'repodata', 'repomd.xml'))
+  if len(paths) == 0:
+    return None
+
+  digest = hashlib.sha1()
+  for path in sorted(paths):
+    try:
+      with open(path) as f:
+        revision = _revision_pattern.search(f.read())
+      revision = revision.group(1) if revision else str(os.stat(path).st_mtime)
+    except (IOError, OSError):
+      return None
+    digest.update("{} {}\n".format(os.path.relpath(path, directory), revision).encode('utf-8'))
+
+  return digest.hexdigest()
+
+def parse_updateinfo(update_string):
+  """
+  Parse yum updateinfo list output: security advisories, CVEs or both.
+  Each record is: advisory or CVE ID, level/Sec., package.  The CVE records
+  start with white space.
+  Return the security and CVE maps of package name -> list of advisories
+  """
+  (updates, cves) = ({}, {})
+  for line in update_string.splitlines():
+    # skip non-record lines
+    if len(line) == 0 \
+       or line.startswith('Loaded') \
+       or line.startswith('updateinfo') \
+       or line.startswith('This system'):
+      continue
+
+    # All record lines are three components
+    fields = line.split()
+    if len(fields) != 3:
+      continue
+    (advisory, reason, package) = fields
+
+    packages = cves if advisory.startswith('CVE-') else updates
+    packages.setdefault(package, []).append(
+      {'advisory': advisory, 'level': re.sub('/Sec.$', '', reason)})
+
+  return (updates, cves)
+
+def history_database(directory=history_directory):
+  """
+  Return the path of the current yum history database, or None.
+  yum starts a new dated database on "yum history new" and reads the latest.
+  """
+  databases = sorted(glob.glob(os.path.join(directory, 'history-*.sqlite')))
+  return databases[-1] if len(databases) > 0 else None
+
+def _connect_readonly(path):
+  """
+  Open a sqlite database so that it can not be changed or created
+  """
+  try:
+    return sqlite3.connect('file:{}?mode=ro'.format(pathname2url(path)), uri=True)
+  except TypeError:
+    # Python 2 has no URI filenames
+    if not os.path.exists(path):
+      raise sqlite3.OperationalError("unable to open database file")
+    return sqlite3.connect(path)
+
+def _package(name, epoch, version, release, arch):
+  """
+  The package as yum history info prints it: name-[epoch:]version-release.arch
+  """
+  if epoch not in (None, '', '0'):
+    version = "{}:{}".format(epoch, version)
+  return "{}-{}-{}.{}".format(name, version, release, arch)
+
+def _user(uid):
+  """
+  The user as yum history info prints it: Full Name <login>
+  """
+  try:
+    user = pwd.getpwuid(int(uid))
+    return "{} <{}>".format(user.pw_gecos.split(',')[0], user.pw_name).strip()
+  except (AttributeError, KeyError, TypeError, ValueError):
+    return "<{}>".format(uid)
+
+def _return_code(code):
+  if code is None:
+    return "** Aborted **"
+  return "Success" if code == 0 else "Failure: {}".format(code)
+
+_package_query = """
+  SELECT t.tid, {action}, p.name, p.epoch, p.version, p.release, p.arch, r.yumdb_val
+  FROM {table} t JOIN pkgtups p ON p.pkgtupid = t.pkgtupid
+  LEFT JOIN pkg_yumdb r ON r.pkgtupid = t.pkgtupid AND r.yumdb_key = 'from_repo'
+  WHERE t.tid > ?
+  ORDER BY t.tid, p.name, {action} = 'Update', p.pkgtupid
+"""
+
+def read_history(database, since=None):
+  """
+  Read the yum history database without running yum.
+  Return a list of the transactions after transaction ID since, oldest first.
+  Each transaction is a dict with the same keys Yum.history() parses from
+  yum history info, including the 'transactions' and 'packages' lists.
+  """
+  since = 0 if since is None else int(since)
+  connection = _connect_readonly(database)
+  try:
+    history = OrderedDict()
+    rows = connection.execute("""
+      SELECT b.tid, b.timestamp, b.rpmdb_version, b.loginuid,
+             e.timestamp, e.rpmdb_version, e.return_code
+      FROM trans_beg b LEFT JOIN trans_end e ON e.tid = b.tid
+      WHERE b.tid > ? ORDER BY b.tid""", (since,))
+    for (tid, begin, begin_rpmdb, uid, end, end_rpmdb, code) in rows:
+      history[tid] = {
+        'Transaction ID': str(tid),
+        'Begin time': time.ctime(begin),
+        'Begin rpmdb': begin_rpmdb,
+        'End time': time.ctime(end) if end is not None else None,
+        'End rpmdb': end_rpmdb,
+        'User': _user(uid),
+        'Return-Code': _return_code(code),
+        'transactions': [],
+        'packages': []
+      }
+
+    rows = connection.execute(
+      "SELECT tid, cmdline FROM trans_cmdline WHERE tid > ?", (since,))
+    for (tid, cmdline) in rows:
+      if tid in history:
+        history[tid]['Command Line'] = cmdline
+
+    # the packages yum ran the transaction with
+    rows = connection.execute(
+      _package_query.format(table='trans_with_pkgs', action="'Installed'"), (since,))
+    for (tid, action, name, epoch, version, release, arch, repo) in rows:
+      if tid in history:
+        history[tid]['transactions'].append({
+          'action': action,
+          'package': _package(name, epoch, version, release, arch),
+          'repo': "@{}".format(repo or '')})
+
+    # the packages altered.  An Update follows the Updated package it replaces
+    rows = connection.execute(
+      _package_query.format(table='trans_data_pkgs', action='t.state'), (since,))
+    for (tid, action, name, epoch, version, release, arch, repo) in rows:
+      if tid not in history:
+        continue
+      packages = history[tid]['packages']
+      package = _package(name, epoch, version, release, arch)
+      if action == 'Update' and len(packages) > 0 and \
+         packages[-1]['action'] == 'Updated':
+        packages[-1]['new_version'] = package
+      else:
+        packages.append({'action': action, 'package': package,
+                         'repo': "@{}".format(repo or '')})
+  finally:
+    connection.close()
+
+  return list(history.values())
 
 class Yum():
 
-  def __init__(self):
-    self._repos = None
+  def __init__(self, source_fn=subprocess.check_output, directory=repo_directory,
+               history_directory=history_directory, cache=None,
+               metadata_directory=metadata_directory,
+               rpmdb_version_fn=ospsurvey.probes.rpm.rpmdb_version):
+    self._source_fn = source_fn
+    self._directory = directory
+    self._history_directory = history_directory
+    self._cache = cache
+    self._metadata_directory = metadata_directory
+    self._rpmdb_version_fn = rpmdb_version_fn
+    self._lock = threading.Lock()
+    self._updateinfo = None
+    # the lists of the last yum answer that have not been returned yet
+    self._updateinfo_unread = set()
+    self._repos = {}
     self._history = None
-    self._updates = None
-    self._cves = None
 
     
     
-  def _repo_names(self, selector='enabled'):
+  def repos(self, selector='enabled', refresh=False):
     """
-    Return a list of YUM repos
+    Get the detailed information on every repo from a single yum repoinfo
+    Return a dict of repo name -> repo information
     """
     if selector == '':
       selector = 'enabled'
-    
-    if selector not in ['enabled', 'disabled', 'all']:
-      raise ValueError("invalid selector {} - valid selectors: enabled, disabled, all".format(selector))
 
-    repo_string = subprocess.check_output('sudo yum repolist {}'.format(selector).split())
-    repo_lines = repo_string.split('\n')
-
-    # the first line should match Loaded Plugins
-    # Line 2 may match
-    #   This system is receiving updates from RHN Classic or Red Hat Satellite.
-    # Line N:
-    #   repo id            repo name                        status
-    #   no space string    human string                     num of packages?
-    # Line ...:
-    # Last Line: repolist: nnn
-    plugins_lineno = [i[0] for i in enumerate(repo_lines) if repo_lines[i[0]].startswith('Loaded')][0]
-    header_lineno = [i[0] for i in enumerate(repo_lines) if repo_lines[i[0]].startswith('repo id')][0]
-    footer_lineno = [i[0] for i in enumerate(repo_lines) if repo_lines[i[0]].startswith('repolist')][0]
-
-    # Get the lines between the header and footer, take the first word and just
-    # the first half of that.
-    repo_ids = [l.split()[0].split('/') for l in repo_lines[header_lineno+1:footer_lineno-1]]
-
-    repo_names = [r[0] for r in repo_ids]
-
-    # if the repo info is out of date, it can have a leading bang (!)
-    # remove that too
-    repo_names = [re.sub('^!', '', n) for n in repo_names]
-  
-    return repo_names
+    if selector not in repo_selectors:
+      raise ValueError("invalid selector {} - valid selectors: enabled, disabled, all".format(selector))
 
-  def repos(self, selector='enabled', refresh=False):
-    if self._repos == None or refresh == True:
-      repo_names = self._repo_names()
+    if selector not in self._repos or refresh == True:
+      repo_string = self._source_fn('sudo yum repoinfo {}'.format(selector).split())
+      self._repos[selector] = parse_repoinfo(repo_string)
 
-      repos = {}
-      for name in repo_names:
-        repos[name] = self.repo_info(name)
-      
-      self._repos = repos
+    return self._repos[selector]
 
-    return self._repos
+  def configured_repos(self, selector='enabled', refresh=False):
+    """
+    Get the repos from the repo files without running yum.
+    The files are read again only when they change or refresh is requested.
+    """
+    return read_repo_files(self._directory, selector, refresh)
 
   def history(self, count=1, refresh=False):
     """
     Get information on the most recent software update activity
     """
-    info_string = subprocess.check_output("sudo yum history info".split())
+    info_string = self._source_fn("sudo yum history info".split())
     info_lines = info_string.split("\n")
     history = {}
 
@@ -140,103 +438,98 @@ class Yum():
 
     return history
 
-  def updates(self, refresh=False):
-    #
-    # Updates required and available
-    #
+  def transactions(self, since=None, refresh=False):
     """
-    Query the package updates available with yum
-    Header: Loaded plugins...
-    Columns: Advisory ID, reason/level, package name
-    Footer: updateinfo list done
+    Get every yum transaction after transaction ID since, oldest first.
+    The history database is read directly.  If it can't be read, only the
+    most recent transaction is available, from yum history info.
     """
-    if self._updates == None or refresh == True:
-      update_string = subprocess.check_output('sudo yum updateinfo list security'.split())
-      update_lines = update_string.split('\n')
-      # The header and footer are the first and last lines
-
-      packages = {}
-      for line in update_lines:
-        # skip non-record lines
-        if len(line) == 0 \
-           or line.startswith('Loaded') \
-           or line.startswith('updateinfo') \
-           or line.startswith('This system'):
-          continue
-
-        # Split into data components
-        # All record lines are three components
-        try:
-          (advisory, reason, package) = re.split('\s+', line)
-        except ValueError:
-          continue
-    
-        if not package in packages:
-          packages[package]=list()
-      
-        packages[package].append({'advisory': advisory, 'level': re.sub('/Sec.$', '', reason)})
-
-      self._updates = packages
+    database = history_database(self._history_directory)
+    if database is not None:
+      try:
+        return read_history(database, since)
+      except sqlite3.Error as e:
+        logging.debug("unable to read yum history {}: {}".format(database, e))
 
-    return self._updates
+    history = self.history(refresh=refresh)
+    if 'Transaction ID' not in history or \
+       (since is not None and int(history['Transaction ID']) <= int(since)):
+      return []
+    return [history]
 
-  def cves(self, refresh=False):
+  def updateinfo(self, refresh=False):
     """
-    Query the vulnerability updates available with yum
-    Header: Loaded plugins...
-    Columns: Advisory ID, reason/level, package name
-    Footer: updateinfo list done
+    Get the security updates and the CVEs available with yum.
+    Return a dict with the 'updates' and 'cves' maps of package -> advisories.
+    With a cache, the answer is kept until the repo metadata or the installed
+    packages change.
+
+    The lists are two yum runs, so yum loads its metadata twice: yum shell
+    could answer both at once but only through a sudo shell, and no single
+    updateinfo command lists both the advisories and the CVEs.
     """
-    update_string = subprocess.check_output('sudo yum updateinfo list cves'.split())
-    update_lines = update_string.split('\n')
-    # The header and footer are the first and last lines
-
-    packages = {}
-    for line in update_lines:
-      # skip non-record lines
-      if len(line) == 0 \
-         or line.startswith('Loaded') \
-         or line.startswith('updateinfo'):
-        continue
+    return self._updateinfo_lists(('updates', 'cves'), refresh)
 
-      # Split into data components - CVES start with white space
-      try:
-        (advisory, reason, package) = re.split('\s+', line.strip())
-      except ValueError:
-        continue
-    
-      if not package in packages:
-        packages[package]=list()
-      
-      packages[package].append({'advisory': advisory, 'level': re.sub('/Sec.$', '', reason)})
+  def _updateinfo_lists(self, lists, refresh):
+    """
+    Return the updateinfo answer for some of its lists.  A refresh reuses the
+    last answer from yum if it has not been returned for those lists yet, so
+    updates(refresh=True) and cves(refresh=True) share one answer
+    """
+    with self._lock:
+      if refresh and self._updateinfo_unread.issuperset(lists):
+        refresh = False
+      if self._updateinfo is not None and not refresh:
+        self._updateinfo_unread.difference_update(lists)
+        return self._updateinfo
+
+      key = None
+      if self._cache is not None:
+        metadata = repo_metadata_version(self._metadata_directory)
+        packages = self._rpmdb_version_fn()
+        if metadata is not None and packages is not None:
+          key = "yum updateinfo {} {}".format(metadata, packages)
+
+      cached = self._cache.get(key) if key is not None and not refresh else None
+      if cached is not None:
+        self._updateinfo = loads(cached)
+        self._updateinfo_unread = set()
+        return self._updateinfo
+
+      (updates, _) = parse_updateinfo(
+        self._source_fn('sudo yum updateinfo list security'.split()))
+      (_, cves) = parse_updateinfo(
+        self._source_fn('sudo yum updateinfo list cves'.split()))
+
+      self._updateinfo = {'updates': updates, 'cves': cves}
+      self._updateinfo_unread = set(self._updateinfo).difference(lists)
+      if key is not None:
+        self._cache.put(key, json.dumps(self._updateinfo))
+
+    return self._updateinfo
 
-    return packages
+  def updates(self, refresh=False):
+    """
+    Query the security updates available with yum
+    Return a dict of package name -> list of advisory and level
+    """
+    return self._updateinfo_lists(('updates',), refresh)['updates']
 
+  def cves(self, refresh=False):
+    """
+    Query the vulnerability updates available with yum
+    Return a dict of package name -> list of CVE and level
+    """
+    return self._updateinfo_lists(('cves',), refresh)['cves']
 
   def repo_info(self, repo_name, refresh=False):
     """
     Get detailed information on a specified yum repository
     """
-    repo_string = subprocess.check_output("sudo yum repoinfo {}".format(repo_name).split())
-    repo_lines = repo_string.split('\n')
-
-    # Ignore the "plugins" line and everything before it
-    plugins_lineno = [i[0] for i in enumerate(repo_lines) if repo_lines[i[0]].startswith('Loaded')][0]
-
-    repo_info = {}
-    for line in repo_lines[plugins_lineno+1:]:
-      # stop when you get to a blank line
-      if line == '':
-        break
-
-      # Match the key-values around the first colon (:).  Remove white space
-      info_match = re.match('^\s*([^:]+[^ ])\s*:\s*(.*)$', line)
-      if info_match:
-        (k, v) = info_match.groups()
-      
-        repo_info[k] = v
-
-    return repo_info
+    repo_string = self._source_fn("sudo yum repoinfo {}".format(repo_name).split())
+    repos = parse_repoinfo(repo_string)
+
+    return list(repos.values())[0] if len(repos) > 0 else {}
 
 # SAMPLE
 # yum history info
@@ -0,0 +1,98 @@
+"""
+Build compact record objects from the JSON records of a query.
+
+The probes turn each JSON object into a namedtuple so that the fields can be
+used as attributes.  Creating a namedtuple class is expensive, so one class is
+made for each record type and set of fields and then reused by every query.
+
+Large lists repeat the same few values, such as the status, flavor and host
+of every server.  The values of the fields named to be interned are replaced
+by one shared copy of each distinct value so that a list of 50k servers holds
+a handful of status strings rather than 50k of them.
+"""
+from collections import namedtuple
+import threading
+
+# (type name, field names) -> record class
+_classes = {}
+_classes_lock = threading.Lock()
+
+# string -> the shared copy of the string
+_strings = {}
+
+try:
+  string_types = (str, unicode)
+except NameError:
+  string_types = (str,)
+
+def space_to_underscore(key):
+  return key.replace(' ', '_')
+
+def record_class(type_name, fields):
+  """
+  Return the record class for a type and list of fields, creating it once
+  """
+  key = (type_name, tuple(fields))
+  with _classes_lock:
+    if key not in _classes:
+      _classes[key] = namedtuple(type_name, key[1])
+    return _classes[key]
+
+def intern_value(value):
+  """
+  Return the shared copy of a string value.  The string values of a dict are
+  interned in a new dict.  Anything else is returned unchanged.
+  """
+  if isinstance(value, string_types):
+    return _strings.setdefault(value, value)
+  if isinstance(value, dict):
+    shared = _strings.setdefault
+    return {k:(shared(v, v) if isinstance(v, string_types) else v)
+            for (k, v) in value.items()}
+  return value
+
+def make_record(type_name, record, rename=space_to_underscore, intern=()):
+  """
+  Convert one JSON object to a record
+  """
+  keys = list(record.keys())
+  RecordClass = record_class(type_name, [rename(k) for k in keys])
+  return RecordClass._make(
+    intern_value(record[k]) if k in intern else record[k] for k in keys)
+
+def make_records(type_name, records, rename=space_to_underscore, intern=()):
+  """
+  Convert a list of JSON objects with the same keys to records of one class.
+  The fields are taken from the first object.
+  """
+  if len(records) == 0:
+    return []
+
+  keys = list(records[0].keys())
+  RecordClass = record_class(type_name, [rename(k) for k in keys])
+  make = RecordClass._make
+  interned = [k in intern for k in keys]
+
+  return [make([intern_value(r.get(k)) if i else r.get(k)
+                for (k, i) in zip(keys, interned)])
+          for r in records]
+
+def iter_records(type_name, records, rename=space_to_underscore, intern=()):
+  """
+  Convert an iterable of JSON objects to records as make_records does,
+  yielding each one as it arrives
+  """
+  make = None
+  for r in records:
+    if make is None:
+      keys = list(r.keys())
+      make = record_class(type_name, [rename(k) for k in keys])._make
+      interned = [k in intern for k in keys]
+    yield make([intern_value(r.get(k)) if i else r.get(k)
+                for (k, i) in zip(keys, interned)])
+
+def clear():
+  """
+  Forget the shared values, for long running processes
+  """
+  _strings.clear()
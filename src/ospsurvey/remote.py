@@ -0,0 +1,318 @@
+"""
+Run the host probes on many overcloud nodes at once.
+
+The yum and subscription-manager probes only look at the host they run on.
+survey_hosts() runs them on each overcloud server by its ctlplane address,
+on a bounded pool of worker threads.  Each host has a deadline for all of
+its queries.  A host that fails or runs out of time is reported with what
+it did answer and the errors for the rest, and the other hosts carry on.
+
+The commands reach the hosts through a transport.  A transport has two
+methods:
+
+  source(host, deadline)  return a source_fn that runs commands on the host
+                          and raises RemoteTimeout after the deadline
+  close()                 release any connections
+
+SshTransport runs the commands with ssh.  The queries to one host share a
+single multiplexed connection.  LocalTransport runs them on this host,
+whatever the host name, to survey the director itself or to test.
+"""
+from collections import OrderedDict
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+  from shlex import quote
+except ImportError:
+  from pipes import quote
+
+import ospsurvey.probes.sm
+import ospsurvey.probes.yum
+import ospsurvey.scheduler
+from ospsurvey.jsonstream import source_stream
+
+default_user = 'heat-admin'
+default_workers = 16
+# yum can take minutes to load the repo metadata on a busy node
+default_timeout = 600
+default_connect_timeout = 10
+
+# ssh exits with 255 when it can't reach the host
+ssh_error = 255
+
+# openstack server list: "ctlplane=192.168.24.8; storage=172.16.1.4"
+_ctlplane_re = re.compile(r'(?:^|;)\s*ctlplane=([^,;\s]+)')
+
+
+class RemoteError(Exception):
+  """
+  A host could not be reached
+  """
+  pass
+
+class RemoteTimeout(RemoteError):
+  """
+  A host did not answer in the time allowed
+  """
+  pass
+
+
+def ctlplane_address(server):
+  """
+  Return the ctlplane address of a server from list_servers, or None
+  The CLI gives the networks as a string, newer versions as a dict
+  """
+  networks = server.Networks
+  if isinstance(networks, dict):
+    addresses = networks.get('ctlplane') or [None]
+    return addresses[0]
+
+  match = _ctlplane_re.search(networks or '')
+  return match.group(1) if match else None
+
+def server_hosts(servers):
+  """
+  Return an OrderedDict of server name -> ctlplane address.  The address is
+  None for a server that has none
+  """
+  return OrderedDict((s.Name, ctlplane_address(s)) for s in servers)
+
+def run_command(argv, timeout):
+  """
+  Run a command and return the return code, output and error text.
+  Raise RemoteTimeout if it does not finish in time
+  """
+  with open(os.devnull) as devnull:
+    process = subprocess.Popen(argv, stdin=devnull,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+  expired = threading.Event()
+  def kill():
+    expired.set()
+    try:
+      process.kill()
+    except OSError:
+      pass
+
+  timer = threading.Timer(timeout, kill)
+  timer.start()
+  try:
+    (stdout, stderr) = process.communicate()
+  finally:
+    timer.cancel()
+
+  if expired.is_set():
+    raise RemoteTimeout("{} did not finish in {:.0f} seconds".format(argv[0], timeout))
+  return process.returncode, stdout, stderr
+
+
+class LocalTransport(object):
+  """
+  Run the commands on this host
+  """
+
+  def command(self, host, argv):
+    """
+    The argument list that runs a command on a host
+    """
+    return list(argv)
+
+  def check(self, host, returncode, stderr):
+    """
+    Raise RemoteError if a failed command means the host is not reachable
+    """
+    pass
+
+  def source(self, host, deadline):
+    """
+    Return a source_fn that runs commands on a host until the deadline
+    """
+    def source_fn(argv):
+      remaining = deadline - time.time()
+      if remaining <= 0:
+        raise RemoteTimeout("{}: out of time".format(host))
+
+      (returncode, stdout, stderr) = run_command(self.command(host, argv), remaining)
+      if returncode != 0:
+        self.check(host, returncode, stderr)
+        raise subprocess.CalledProcessError(returncode, argv, output=stderr + stdout)
+      return stdout
+
+    return source_fn
+
+  def close(self):
+    pass
+
+
+class SshTransport(LocalTransport):
+  """
+  Run the commands on each host with ssh.  The first command to a host opens
+  a master connection that the others share
+  """
+
+  def __init__(self, user=default_user, options=(),
+               connect_timeout=default_connect_timeout, persist=60):
+    self.user = user
+    self.options = list(options)
+    self.connect_timeout = connect_timeout
+    self.persist = persist
+
+    self._control_dir = None
+    self._hosts = set()
+    self._lock = threading.Lock()
+
+  def ssh_options(self):
+    with self._lock:
+      if self._control_dir is None:
+        self._control_dir = tempfile.mkdtemp(prefix='ospsurvey-ssh-')
+
+    return ['-o', 'BatchMode=yes',
+            '-o', 'ConnectTimeout={}'.format(self.connect_timeout),
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath={}'.format(os.path.join(self._control_dir, '%C')),
+            '-o', 'ControlPersist={}'.format(self.persist)] + self.options
+
+  def target(self, host):
+    return "{}@{}".format(self.user, host) if self.user else host
+
+  def command(self, host, argv):
+    with self._lock:
+      self._hosts.add(host)
+    return ['ssh'] + self.ssh_options() + [self.target(host), '--'] + \
+      [" ".join(quote(a) for a in argv)]
+
+  def check(self, host, returncode, stderr):
+    if returncode == ssh_error:
+      raise RemoteError("{}: {}".format(
+        host, stderr.decode('utf-8', 'replace').strip()))
+
+  def close(self):
+    """
+    Close the master connections and remove their sockets
+    """
+    with self._lock:
+      (hosts, control_dir) = (self._hosts, self._control_dir)
+      (self._hosts, self._control_dir) = (set(), None)
+
+    if control_dir is None:
+      return
+
+    with open(os.devnull, 'w') as devnull:
+      for host in hosts:
+        subprocess.call(['ssh', '-o', 'ControlPath={}'.format(
+          os.path.join(control_dir, '%C')), '-O', 'exit', self.target(host)],
+                        stdout=devnull, stderr=devnull)
+    shutil.rmtree(control_dir, ignore_errors=True)
+
+
+def text_source(source_fn):
+  """
+  A source_fn that decodes the output on Python 3 for the text parsers
+  """
+  if sys.version_info.major < 3:
+    return source_fn
+  return lambda command: source_fn(command).decode('utf-8')
+
+def host_probes(source_fn):
+  """
+  Return the (name, probe function) pairs to run on one host.  They run in
+  order and the subscription-manager queries are skipped if the host is not
+  subscribed
+  """
+  yum = ospsurvey.probes.yum.Yum(source_fn=text_source(source_fn))
+  sm = ospsurvey.probes.sm.SubscriptionManager(stream_fn=source_stream(source_fn))
+  subscribed = lambda: sm.status()['status'] != 'Unsubscribed'
+
+  return [
+    ('repos', yum.repos),
+    ('history', yum.history),
+    ('updates', yum.updates),
+    ('cves', yum.cves),
+    ('sm_status', sm.status),
+    ('sm_config', lambda: sm.config() if subscribed() else None),
+    ('sm_consumed', lambda: sm.consumed() if subscribed() else None),
+    ('sm_repos', lambda: sm.repos() if subscribed() else None)
+  ]
+
+def survey_host(host, address, transport, timeout=default_timeout,
+                probes_fn=host_probes):
+  """
+  Run the host probes on one host and return a dict of its results:
+    status    ok, partial (some probes failed), failed (none answered),
+              unreachable or timeout
+    data      probe name -> value for the probes that answered
+    errors    probe name -> error text for the probes that failed
+  When the host can't be reached or is out of time the rest are not run
+  """
+  start = time.time()
+  result = {'host': host, 'address': address, 'status': 'ok',
+            'data': {}, 'errors': {}, 'duration': None}
+
+  if address is None:
+    result['status'] = 'unreachable'
+    result['errors']['address'] = "no ctlplane address"
+    result['duration'] = 0.0
+    return result
+
+  probes = probes_fn(transport.source(address, start + timeout))
+  for (i, (name, fn)) in enumerate(probes):
+    try:
+      result['data'][name] = fn()
+    except RemoteError as e:
+      result['status'] = 'timeout' if isinstance(e, RemoteTimeout) else 'unreachable'
+      for (skipped, _) in probes[i:]:
+        result['errors'][skipped] = str(e)
+      break
+    except Exception as e:
+      logging.debug("{}: probe {} failed: {}".format(host, name, e))
+      result['errors'][name] = str(e) or e.__class__.__name__
+
+  if result['status'] == 'ok' and result['errors']:
+    result['status'] = 'partial' if result['data'] else 'failed'
+
+  result['duration'] = round(time.time() - start, 3)
+  return result
+
+def survey_hosts(hosts, transport, workers=default_workers,
+                 timeout=default_timeout, probes_fn=host_probes):
+  """
+  Survey a dict of host name -> address with at most workers hosts at once
+  Return a dict of host name -> survey_host result
+  """
+  surveys = {h:(lambda h=h, a=a: survey_host(h, a, transport, timeout, probes_fn))
+             for (h, a) in hosts.items()}
+  results = ospsurvey.scheduler.run_probes(surveys, workers=workers)
+
+  report = {}
+  for (host, r) in results.items():
+    report[host] = r.value
+    if r.error is not None:
+      # survey_host reports the probe failures itself, so this is a bug
+      report[host] = {'host': host, 'address': hosts[host], 'status': 'failed',
+                      'data': {}, 'errors': {'survey': str(r.error)},
+                      'duration': round(r.duration, 3)}
+
+  return report
+
+def summary(report):
+  """
+  Count the hosts in a survey_hosts report by status and list the ones that
+  did not answer every probe
+  """
+  counts = {}
+  for r in report.values():
+    counts[r['status']] = counts.get(r['status'], 0) + 1
+
+  return {
+    'hosts': len(report),
+    'status': counts,
+    'incomplete': sorted(h for (h, r) in report.items() if r['status'] != 'ok')
+  }
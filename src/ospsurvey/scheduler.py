@@ -0,0 +1,195 @@
+"""
+Run survey probes concurrently.
+
+Most probes spend their time waiting for a CLI process or an API response, so
+running independent probes at the same time brings the total survey time
+down to about that of the slowest chain of dependent probes.
+
+A Probe names a function and the other probes whose results it needs.  The
+function is called with those results as keyword arguments as soon as they
+are all available.  The result of each probe is reported individually with
+its value, the exception it raised if it failed, when it started and how long
+it took.  A probe whose inputs failed is not run.
+"""
+from collections import namedtuple
+import logging
+import time
+
+default_workers = 4
+
+ProbeResult = namedtuple('ProbeResult',
+                         ['name', 'value', 'error', 'duration', 'start', 'inputs'])
+
+class Probe(namedtuple('Probe', ['name', 'fn', 'inputs'])):
+  """
+  A named probe function and the names of the probes it takes as arguments
+  """
+  def __new__(cls, name, fn, inputs=()):
+    return super(Probe, cls).__new__(cls, name, fn, tuple(inputs))
+
+class DependencyError(Exception):
+  """
+  A probe was not run because one of its inputs failed
+  """
+  pass
+
+
+def timed_call(name, fn, inputs=(), kwargs={}, epoch=0):
+  """
+  Call a probe function and return its ProbeResult.
+  Exceptions are captured in the result rather than raised.
+  The start time is reported relative to the epoch.
+  """
+  start = time.time()
+  try:
+    value = fn(**kwargs)
+    error = None
+  except Exception as e:
+    logging.debug("probe {} failed: {}".format(name, e))
+    value = None
+    error = e
+  duration = time.time() - start
+
+  logging.debug("probe {} finished in {:.3f} seconds".format(name, duration))
+  return ProbeResult(name, value, error, duration, start - epoch, inputs)
+
+def required(probes, targets):
+  """
+  Return the names of the target probes and everything they depend on
+  """
+  needed = set()
+  pending = list(targets)
+  while pending:
+    name = pending.pop()
+    if name in needed:
+      continue
+    if name not in probes:
+      raise ValueError("unknown probe: {}".format(name))
+    needed.add(name)
+    pending.extend(probes[name].inputs)
+
+  return needed
+
+def check_graph(probes):
+  """
+  Make sure every input is defined and there are no dependency loops
+  """
+  for p in probes.values():
+    for i in p.inputs:
+      if i not in probes:
+        raise ValueError("probe {} needs undefined probe {}".format(p.name, i))
+
+  # Repeatedly remove the probes whose inputs are all resolved
+  resolved = set()
+  remaining = set(probes)
+  while remaining:
+    ready = set(n for n in remaining if resolved.issuperset(probes[n].inputs))
+    if not ready:
+      raise ValueError("dependency loop among probes: {}".format(
+        ", ".join(sorted(remaining))))
+    resolved |= ready
+    remaining -= ready
+
+def run_graph(probes, targets=None, workers=default_workers):
+  """
+  Run a list of Probes with a bounded pool of worker threads.
+  Each probe starts as soon as all of its inputs have finished.
+  If targets are given, only those probes and their inputs are run.
+  Return a dict of name -> ProbeResult
+  """
+  probes = {p.name:p for p in probes}
+  check_graph(probes)
+  if targets is not None:
+    probes = {n:probes[n] for n in required(probes, targets)}
+
+  epoch = time.time()
+  results = {}
+  waiting = dict(probes)
+  running = set()
+
+  # Python 2 needs the futures backport, so only ask for it when it is used
+  import concurrent.futures
+  with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+    while waiting or running:
+      # start everything that can start, skip anything that can't ever start
+      for (name, p) in list(waiting.items()):
+        if not all(i in results for i in p.inputs):
+          continue
+        del waiting[name]
+
+        failed = [i for i in p.inputs if results[i].error is not None]
+        if failed:
+          error = DependencyError("input {} failed".format(", ".join(failed)))
+          results[name] = ProbeResult(name, None, error, 0.0,
+                                      time.time() - epoch, p.inputs)
+          continue
+
+        kwargs = {i:results[i].value for i in p.inputs}
+        running.add(pool.submit(timed_call, name, p.fn, p.inputs, kwargs, epoch))
+
+      if not running:
+        continue
+
+      (done, _) = concurrent.futures.wait(
+        running, return_when=concurrent.futures.FIRST_COMPLETED)
+      for future in done:
+        running.remove(future)
+        result = future.result()
+        results[result.name] = result
+
+  return results
+
+def run_probes(probes, workers=default_workers):
+  """
+  Run a dict of name -> probe function with no inputs
+  Return a dict of name -> ProbeResult
+  """
+  return run_graph([Probe(name, fn) for (name, fn) in probes.items()],
+                   workers=workers)
+
+def failures(results):
+  """
+  Return the results of the probes that raised an exception
+  """
+  return [r for r in results.values() if r.error is not None]
+
+def critical_path(results):
+  """
+  Return the chain of probes that determined the total run time.
+  Start from the probe that finished last and work back through the input
+  that each one was waiting for.
+  """
+  if len(results) == 0:
+    return []
+
+  finish = lambda r: r.start + r.duration
+  path = [max(results.values(), key=finish)]
+  while path[-1].inputs:
+    path.append(max((results[i] for i in path[-1].inputs), key=finish))
+
+  return [r.name for r in reversed(path)]
+
+def timing_report(results):
+  """
+  Summarize the run time of each probe and the critical path as a dict
+  """
+  probes = {}
+  for r in results.values():
+    if isinstance(r.error, DependencyError):
+      status = 'skipped'
+    elif r.error is not None:
+      status = 'failed'
+    else:
+      status = 'ok'
+
+    probes[r.name] = {
+      'start': round(r.start, 3),
+      'duration': round(r.duration, 3),
+      'status': status
+    }
+
+  return {
+    'elapsed': round(max([r.start + r.duration for r in results.values()] or [0]), 3),
+    'critical_path': critical_path(results),
+    'probes': probes
+  }
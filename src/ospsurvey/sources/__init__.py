@@ -0,0 +1,87 @@
+"""
+Data sources for the probe functions.
+
+The probe functions in ospsurvey.probes all take a source_fn argument.  A
+source is a callable that accepts the argument list of an openstack CLI query
+and returns the JSON output, just like subprocess.check_output which is the
+default.  Other sources answer the same queries without forking the CLI.
+
+Any source can be wrapped in a disk cache so that repeated runs, such as from
+cron, query the cloud once per cache TTL.  The answers can also be recorded
+to a fixture directory and replayed later without a cloud.
+"""
+import logging
+import subprocess
+
+backends = ('cli', 'api', 'shell', 'sudo')
+
+def add_cache_arguments(parser):
+  """
+  Add the options that control the query cache to an ArgumentParser
+  """
+  parser.add_argument('--no-cache', dest='cache', action='store_false',
+                      default=True,
+                      help="do not read or write the query cache")
+  parser.add_argument('--refresh', action='store_true', default=False,
+                      help="ignore cached answers and update the query cache")
+
+def add_fixture_arguments(parser):
+  """
+  Add the options to record or replay query answers to an ArgumentParser
+  """
+  group = parser.add_mutually_exclusive_group()
+  group.add_argument('--record', metavar='DIR', default=None,
+                     help="save the answer to every query in a fixture directory")
+  group.add_argument('--replay', metavar='DIR', default=None,
+                     help="answer every query from a recorded fixture directory")
+
+def select_source(backend='cli', cache=False, refresh=False, record=None,
+                  replay=None):
+  """
+  Return the source_fn for the named backend.
+    cli   - fork the openstack CLI for each query
+    api   - query the service APIs through one keystoneauth session
+    shell - send the queries to one long lived openstack client process
+    sudo  - send the host queries to one privileged helper started with sudo
+  The CLI is always available and is used if the API libraries are not
+  If cache is set the answers are cached on disk
+  With record or replay, the answers are saved to or read from a directory.
+  Recorded queries always go to the backend.
+  """
+  if replay is not None:
+    import ospsurvey.sources.replay
+    return ospsurvey.sources.replay.ReplaySource(replay)
+
+  source_fn = _backend_source(backend)
+  if record is not None:
+    import ospsurvey.sources.replay
+    return ospsurvey.sources.replay.RecordingSource(record, source_fn)
+
+  if not cache:
+    return source_fn
+
+  import ospsurvey.sources.cache
+  return ospsurvey.sources.cache.CachedSource(source_fn, refresh=refresh)
+
+def _backend_source(backend):
+  if backend == 'cli':
+    return subprocess.check_output
+
+  if backend == 'api':
+    import ospsurvey.sources.api
+    if not ospsurvey.sources.api.available():
+      logging.warning("keystoneauth1 is not installed: using the openstack CLI")
+      return subprocess.check_output
+
+    return ospsurvey.sources.api.ApiSource.from_environment()
+
+  if backend == 'shell':
+    import ospsurvey.sources.shell
+    return ospsurvey.sources.shell.ShellSource()
+
+  if backend == 'sudo':
+    import ospsurvey.sources.sudo
+    return ospsurvey.sources.sudo.SudoSource()
+
+  raise ValueError("invalid backend {} - valid backends: {}".format(
+    backend, ", ".join(backends)))
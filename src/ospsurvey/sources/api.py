@@ -0,0 +1,459 @@
+"""
+Answer openstack CLI queries from the service APIs using a single
+authenticated keystoneauth session.
+
+Each openstack CLI call starts a new interpreter, loads the client plugins and
+requests a new keystone token.  ApiSource is a source_fn that recognizes the
+queries made by the probe functions and answers them with REST calls through
+one shared session.  The result is the same JSON, with the same column labels,
+that the CLI would have printed so the probes build the same record objects.
+Queries that it does not recognize are passed on to the CLI.
+"""
+import json
+import logging
+import os
+import subprocess
+
+try:
+  import keystoneauth1.exceptions
+  import keystoneauth1.identity
+  import keystoneauth1.session
+except ImportError:
+  keystoneauth1 = None
+
+#
+# The list of environment variables used for OSP API access
+# Map the environment variable name to the parameter named used by the
+# Keystoneauth Session object
+#
+osp_varmap = {
+  'OS_IDENTITY_API_VERSION': 'identity_api_version',
+
+  'OS_CLOUDNAME': 'cloudname',
+
+  'OS_AUTH_URL': 'auth_url',
+  'OS_PASSWORD': 'password',
+
+  'OS_USERNAME': 'username',
+  'OS_USER_DOMAIN_NAME': 'user_domain_name',
+
+  'OS_TENANT_NAME': 'tenant_name',
+
+  'OS_PROJECT_NAME': 'project_name',
+  'OS_PROJECT_DOMAIN_NAME': 'project_domain_name',
+
+  'COMPUTE_API_VERSION': 'compute_api_version',
+  'NOVA_VERSION': 'nova_version',
+
+  'OS_BAREMETAL_API_VERSION': 'baremetal_api_version',
+  'IRONIC_API_VERSION': 'ironic_api_version',
+
+  'OS_IMAGE_API_VERSION': 'image_api_version'
+}
+
+# CLI options that do not take a value
+flag_options = ('--long', '--all-projects')
+
+# nova reports the power state as a number. The CLI reports the name
+power_states = {
+  0: 'NOSTATE',
+  1: 'Running',
+  3: 'Paused',
+  4: 'Shutdown',
+  6: 'Crashed',
+  7: 'Suspended'
+}
+
+# ironic field names that don't convert to the CLI label by capitalizing
+node_labels = {
+  'uuid': 'UUID',
+  'provision_state': 'Provisioning State',
+  'raid_config': 'Current RAID configuration',
+  'target_raid_config': 'Target RAID configuration'
+}
+
+# ironic fields that the CLI does not report
+node_hidden_fields = ('links', 'ports', 'portgroups', 'states', 'volume')
+
+
+def available():
+  """
+  Report if the keystoneauth1 library is installed
+  """
+  return keystoneauth1 is not None
+
+def get_osp_envvars():
+  """
+  Collect and return the OSP authentication values from the environment
+  """
+  envvars = {}
+  for k,v in osp_varmap.items():
+    envvars[v] = os.environ[k] if k in os.environ else None
+
+  return envvars
+
+def create_keystone_session(credentials):
+  """
+  Create a keystone Session object from the provided credentials.
+  """
+  auth = keystoneauth1.identity.v3.Password(
+    auth_url=credentials['auth_url'],
+    username=credentials['username'],
+    password=credentials['password'],
+    project_name=credentials['project_name'],
+    user_domain_name=credentials['user_domain_name'],
+    project_domain_name=credentials['project_domain_name']
+  )
+
+  session = keystoneauth1.session.Session(auth=auth)
+
+  return session
+
+def session_from_environment():
+  """
+  Create a keystone Session from the OS_* environment variables
+  """
+  credentials = get_osp_envvars()
+
+  # At least in the stackrc I have seen, the v3/ suffix has been missing from
+  # the AUTH_URL.  Add it if using version 3 and it's not in the URL
+  if credentials['identity_api_version'] == "3" and \
+     not credentials['auth_url'].rstrip('/').endswith('v3'):
+    credentials['auth_url'] = credentials['auth_url'].rstrip('/') + "/v3/"
+
+  return create_keystone_session(credentials)
+
+def parse_command(command):
+  """
+  Split a CLI argument list into the positional words and a dict of options.
+  Options that can repeat (-c) are collected into a list.
+  """
+  words = []
+  options = {}
+
+  args = list(command)
+  while args:
+    arg = args.pop(0)
+    if not arg.startswith('-'):
+      words.append(arg)
+    elif arg in flag_options:
+      options[arg] = True
+    elif arg == '-c' or arg == '--column':
+      options.setdefault('--column', []).append(args.pop(0))
+    else:
+      if arg == '-f':
+        arg = '--format'
+      options[arg] = args.pop(0) if args else None
+
+  return words, options
+
+def node_label(field):
+  """
+  Convert an ironic node field name to the column label the CLI uses
+  """
+  if field in node_labels:
+    return node_labels[field]
+
+  return field.replace('_', ' ').title().replace('Uuid', 'UUID')
+
+def format_addresses(addresses):
+  """
+  Format a nova addresses dict as the CLI does: net=addr, addr; net=addr
+  """
+  return "; ".join(
+    "{}={}".format(net, ", ".join(a['addr'] for a in addrs))
+    for (net, addrs) in sorted(addresses.items()))
+
+def format_properties(properties):
+  """
+  Format a metadata dict as the CLI does: key='value', key='value'
+  """
+  return ", ".join(
+    "{}='{}'".format(k, v) for (k, v) in sorted(properties.items()))
+
+
+class ApiSource(object):
+  """
+  A source_fn that answers openstack CLI queries from the service APIs
+  """
+
+  def __init__(self, session, fallback_fn=subprocess.check_output,
+               interface='public'):
+    self.session = session
+    self.fallback_fn = fallback_fn
+    self.interface = interface
+
+    # ironic needs a microversion to report the newer node fields
+    self._baremetal_version = os.environ.get(
+      'OS_BAREMETAL_API_VERSION', os.environ.get('IRONIC_API_VERSION'))
+
+    # The queries made by the probe functions, without the leading openstack
+    self._handlers = {
+      ('service', 'list'): self._service_list,
+      ('service', 'show'): self._service_show,
+      ('endpoint', 'list'): self._endpoint_list,
+      ('endpoint', 'show'): self._endpoint_show,
+      ('server', 'list'): self._server_list,
+      ('server', 'show'): self._server_show,
+      ('baremetal', 'node', 'list'): self._node_list,
+      ('baremetal', 'node', 'show'): self._node_show,
+      ('stack', 'list'): self._stack_list,
+      ('stack', 'environment', 'show'): self._stack_environment_show
+    }
+
+  @classmethod
+  def from_environment(cls, **kwargs):
+    """
+    Create an ApiSource authenticated with the OS_* environment variables
+    """
+    return cls(session_from_environment(), **kwargs)
+
+  def __call__(self, command):
+    """
+    Run a query and return the JSON string the CLI would have produced
+    """
+    words, options = parse_command(command)
+
+    handler = None
+    if len(words) > 0 and words[0] == 'openstack' and \
+       options.get('--format') == 'json' and '--column' not in options:
+      for (key, fn) in self._handlers.items():
+        if tuple(words[1:len(key) + 1]) == key:
+          handler = fn
+          args = words[len(key) + 1:]
+          break
+
+    if handler is None:
+      logging.debug("no API query for '{}': using the CLI".format(
+        " ".join(command)))
+      return self.fallback_fn(command)
+
+    logging.debug("API query for '{}'".format(" ".join(command)))
+    return json.dumps(handler(options, *args))
+
+  #
+  # REST helpers
+  #
+  def _get(self, service_type, path, version=None, headers=None):
+    """
+    GET a path from the catalog endpoint for a service and return the JSON body
+    """
+    endpoint_filter = {
+      'service_type': service_type,
+      'interface': self.interface
+    }
+    if version:
+      endpoint_filter['version'] = version
+
+    response = self.session.get(path, endpoint_filter=endpoint_filter,
+                                headers=headers)
+    return response.json()
+
+  def _get_all(self, service_type, path, key, version=None, headers=None):
+    """
+    GET a paginated list, following the next links, and return all elements
+    """
+    body = self._get(service_type, path, version, headers)
+    records = body[key]
+
+    next_link = self._next_link(body, key)
+    while next_link:
+      body = self._get(service_type, next_link, version, headers)
+      records.extend(body[key])
+      next_link = self._next_link(body, key)
+
+    return records
+
+  @staticmethod
+  def _next_link(body, key):
+    """
+    Find the link to the next page in a nova or ironic list response
+    """
+    if body.get('next'):
+      return body['next']
+
+    for link in body.get(key + '_links', []):
+      if link.get('rel') == 'next':
+        return link['href']
+
+    return None
+
+  def _baremetal_headers(self):
+    if self._baremetal_version is None:
+      return None
+    return {'X-OpenStack-Ironic-API-Version': self._baremetal_version}
+
+  #
+  # identity
+  #
+  def _services(self):
+    return self._get('identity', '/services', version=(3, 0))['services']
+
+  def _service_list(self, options):
+    return [
+      {
+        'ID': s['id'],
+        'Name': s.get('name'),
+        'Type': s['type'],
+        'Description': s.get('description', ''),
+        'Enabled': s['enabled']
+      } for s in self._services()]
+
+  def _service_show(self, options, id_or_name):
+    matches = [s for s in self._services()
+               if id_or_name in (s['id'], s.get('name'))]
+    if len(matches) != 1:
+      raise ValueError("service {} not found".format(id_or_name))
+
+    service = dict(matches[0])
+    service.pop('links', None)
+    return service
+
+  def _endpoints(self, options):
+    path = '/endpoints'
+    if options.get('--interface'):
+      path += '?interface={}'.format(options['--interface'])
+    return self._get('identity', path, version=(3, 0))['endpoints']
+
+  def _endpoint_list(self, options):
+    services = {s['id']:s for s in self._services()}
+
+    return [
+      {
+        'ID': e['id'],
+        'Region': e.get('region_id'),
+        'Service Name': services[e['service_id']].get('name'),
+        'Service Type': services[e['service_id']]['type'],
+        'Enabled': e['enabled'],
+        'Interface': e['interface'],
+        'URL': e['url']
+      } for e in self._endpoints(options)]
+
+  def _endpoint_show(self, options, endpoint_id):
+    endpoint = self._get(
+      'identity', '/endpoints/{}'.format(endpoint_id), version=(3, 0)
+    )['endpoint']
+    service = self._get(
+      'identity', '/services/{}'.format(endpoint['service_id']), version=(3, 0)
+    )['service']
+
+    return {
+      'enabled': endpoint['enabled'],
+      'id': endpoint['id'],
+      'interface': endpoint['interface'],
+      'region': endpoint.get('region_id'),
+      'region_id': endpoint.get('region_id'),
+      'service_id': endpoint['service_id'],
+      'service_name': service.get('name'),
+      'service_type': service['type'],
+      'url': endpoint['url']
+    }
+
+  #
+  # compute
+  #
+  def _server_list(self, options):
+    query = []
+    if options.get('--all-projects'):
+      query.append('all_tenants=True')
+    if options.get('--project'):
+      query.append('tenant_id={}'.format(options['--project']))
+    path = '/servers/detail' + ('?' + '&'.join(query) if query else '')
+    servers = self._get_all('compute', path, 'servers')
+
+    # The flavor and image names are a single query each, not one per server
+    flavors = {f['id']:f['name'] for f in
+               self._get_all('compute', '/flavors/detail', 'flavors')}
+    images = {}
+    if any(s['image'] for s in servers):
+      images = {i['id']:i['name'] for i in
+                self._get_all('image', '/v2/images', 'images')}
+
+    records = []
+    for s in servers:
+      image_id = s['image']['id'] if s['image'] else ''
+      record = {
+        'ID': s['id'],
+        'Name': s['name'],
+        'Status': s['status'],
+        'Networks': format_addresses(s['addresses']),
+        'Image Name': images.get(image_id, ''),
+        'Image ID': image_id,
+        'Flavor Name': flavors.get(s['flavor'].get('id'),
+                                   s['flavor'].get('original_name', '')),
+        'Flavor ID': s['flavor'].get('id', ''),
+      }
+      if options.get('--long'):
+        record.update({
+          'Task State': s.get('OS-EXT-STS:task_state'),
+          'Power State': power_states.get(s.get('OS-EXT-STS:power_state'),
+                                          'NOSTATE'),
+          'Availability Zone': s.get('OS-EXT-AZ:availability_zone', ''),
+          'Host': s.get('OS-EXT-SRV-ATTR:host', ''),
+          'Properties': format_properties(s.get('metadata', {}))
+        })
+      records.append(record)
+
+    return records
+
+  def _server_show(self, options, id_or_name):
+    try:
+      server = self._get('compute', '/servers/{}'.format(id_or_name))['server']
+    except keystoneauth1.exceptions.NotFound:
+      matches = [s for s in self._get_all('compute', '/servers/detail',
+                                          'servers')
+                 if s['name'] == id_or_name]
+      if len(matches) != 1:
+        raise
+      server = matches[0]
+
+    flavor = server['flavor']
+    if 'id' in flavor:
+      flavor = self._get('compute', '/flavors/{}'.format(flavor['id']))['flavor']
+
+    record = {k:v for (k,v) in server.items()
+              if k not in ('links', 'metadata', 'tenant_id')}
+    record.update({
+      'addresses': format_addresses(server['addresses']),
+      'flavor': "{} ({})".format(flavor.get('name', flavor.get('original_name')),
+                                 flavor.get('id', '')),
+      'image': server['image']['id'] if server['image'] else '',
+      'project_id': server['tenant_id'],
+      'properties': format_properties(server.get('metadata', {}))
+    })
+    return record
+
+  #
+  # baremetal
+  #
+  def _node_list(self, options):
+    path = '/v1/nodes/detail' if options.get('--long') else '/v1/nodes'
+    nodes = self._get_all('baremetal', path, 'nodes',
+                          headers=self._baremetal_headers())
+
+    return [{node_label(k):v for (k,v) in n.items()
+             if k not in node_hidden_fields} for n in nodes]
+
+  def _node_show(self, options, id_or_name):
+    node = self._get('baremetal', '/v1/nodes/{}'.format(id_or_name),
+                     headers=self._baremetal_headers())
+
+    return {k:v for (k,v) in node.items() if k not in node_hidden_fields}
+
+  #
+  # orchestration
+  #
+  def _stack_list(self, options):
+    return [
+      {
+        'ID': s['id'],
+        'Stack Name': s['stack_name'],
+        'Project': s.get('project'),
+        'Stack Status': s['stack_status'],
+        'Creation Time': s['creation_time'],
+        'Updated Time': s.get('updated_time')
+      } for s in self._get('orchestration', '/stacks')['stacks']]
+
+  def _stack_environment_show(self, options, stack_name):
+    return self._get('orchestration',
+                     '/stacks/{}/environment'.format(stack_name))
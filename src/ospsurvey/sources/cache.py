@@ -0,0 +1,90 @@
+"""
+Cache the answers of another source on disk.
+
+A survey run from cron asks the same questions every time.  A CachedSource
+answers a query from the disk cache if the same query was made recently and
+only passes it on to the real source when the cached answer has expired.
+
+A cached answer is used only for the same command against the same cloud and
+user: the cache key includes the OS_* environment variables, except for the
+secrets which do not change the answer.  Failed queries are not cached.
+"""
+import json
+import logging
+import os
+import subprocess
+
+import ospsurvey.cache
+
+default_ttl = 300
+
+# Seconds to keep the answer of each command, matched by the longest prefix.
+# A TTL of 0 disables caching for that command.
+default_ttls = {
+  'openstack service list': 3600,
+  'openstack endpoint list': 3600,
+  'openstack project list': 3600,
+  'openstack stack list': 900,
+  'openstack stack environment show': 900,
+  'openstack baremetal node list': 300,
+  'openstack server list': 300,
+  'openstack server show': 300,
+  'sudo yum updateinfo': 3600
+}
+
+# These change the credentials but not the answers
+secret_variables = ('OS_PASSWORD', 'OS_TOKEN')
+
+def environment_key(environ=os.environ):
+  """
+  Return the OS_* variables that select the cloud and user, sorted
+  """
+  return sorted((k, v) for (k, v) in environ.items()
+                if k.startswith('OS_') and k not in secret_variables)
+
+
+class CachedSource(object):
+  """
+  A source_fn that remembers the answers of another source_fn
+  """
+
+  def __init__(self, source_fn=subprocess.check_output, cache=None,
+               ttls=default_ttls, default_ttl=default_ttl, refresh=False):
+    """
+    With refresh set every query goes to the source and the cache is updated
+    """
+    self.source_fn = source_fn
+    self.cache = cache if cache is not None else ospsurvey.cache.DiskCache()
+    self.ttls = ttls
+    self.default_ttl = default_ttl
+    self.refresh = refresh
+
+  def ttl(self, command):
+    """
+    Return the TTL for a command from the longest matching prefix
+    """
+    command_string = " ".join(command)
+    matches = [p for p in self.ttls
+               if command_string == p or command_string.startswith(p + ' ')]
+    if not matches:
+      return self.default_ttl
+    return self.ttls[max(matches, key=len)]
+
+  def key(self, command):
+    return json.dumps([list(command), environment_key()])
+
+  def __call__(self, command):
+    ttl = self.ttl(command)
+    if ttl <= 0:
+      return self.source_fn(command)
+
+    key = self.key(command)
+    if not self.refresh:
+      output = self.cache.get(key, ttl)
+      if output is not None:
+        logging.debug("cached: {}".format(" ".join(command)))
+        return output
+
+    output = self.source_fn(command)
+    self.cache.put(key, output)
+    return output
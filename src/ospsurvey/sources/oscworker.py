@@ -0,0 +1,74 @@
+"""
+A long lived openstack client process for ospsurvey.sources.shell.
+
+This runs the openstackclient shell in-process, authenticates once and then
+answers query frames from stdin until stdin is closed:
+
+  python -m ospsurvey.sources.oscworker
+
+The responses are written to the original stdout.  Anything else the client
+libraries print is sent to stderr so it can't corrupt the frames.
+"""
+import io
+import json
+import os
+import sys
+
+from ospsurvey.sources.shell import write_frame
+
+def create_shell():
+  """
+  Initialize the openstackclient application as the interactive mode does,
+  so the client manager and its token are reused for every command
+  """
+  from openstackclient import shell
+
+  app = shell.OpenStackShell()
+  app.options, remainder = app.parser.parse_known_args([])
+  app.configure_logging()
+  app.interactive_mode = True
+  app.initialize_app(remainder)
+  return app
+
+def run_command(app, argv):
+  """
+  Run one command and return the return code and output text
+  """
+  stdout = io.StringIO() if sys.version_info.major >= 3 else io.BytesIO()
+  stderr = io.StringIO() if sys.version_info.major >= 3 else io.BytesIO()
+  (app.stdout, app.stderr) = (stdout, stderr)
+
+  try:
+    returncode = app.run_subcommand(argv)
+  except SystemExit as e:
+    # argparse exits on invalid arguments
+    returncode = e.code if isinstance(e.code, int) else 2
+  except Exception as e:
+    message = u"{}\n".format(e)
+    stderr.write(message if sys.version_info.major >= 3 else message.encode('utf-8'))
+    returncode = 1
+
+  if returncode:
+    return returncode, stderr.getvalue() + stdout.getvalue()
+  return 0, stdout.getvalue()
+
+def main():
+  # Keep the protocol stream for ourselves and send everything else to stderr
+  protocol = os.fdopen(os.dup(1), 'wb')
+  os.dup2(2, 1)
+  requests = os.fdopen(os.dup(0), 'rb')
+
+  app = create_shell()
+
+  for line in iter(requests.readline, b''):
+    try:
+      argv = json.loads(line.decode('utf-8'))
+    except ValueError as e:
+      write_frame(protocol, 2, "invalid request: {}".format(e))
+      continue
+
+    (returncode, output) = run_command(app, argv)
+    write_frame(protocol, returncode, output)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,97 @@
+"""
+Record the answers of a source to a fixture directory and replay them.
+
+A RecordingSource passes each query to a real source and saves the output in
+a file named for the command.  A ReplaySource answers the same queries from
+those files without a cloud, so probes and whole scripts can be tested and
+timed against a recorded deployment.
+
+A failed query is recorded too: the return code is saved next to the output
+and the replay raises the same CalledProcessError.
+"""
+import errno
+import logging
+import os
+import re
+import subprocess
+
+
+class ReplayError(Exception):
+  """
+  There is no recorded answer for a query
+  """
+  pass
+
+
+def fixture_name(command):
+  """
+  Return the fixture file name for a command argument list
+  openstack server list --long -f json -> openstack_server_list_--long_-f_json
+  """
+  return re.sub(r'[^\w.=-]+', '_', " ".join(command))
+
+
+class RecordingSource(object):
+  """
+  A source_fn that saves the answer of another source_fn for each query
+  """
+
+  def __init__(self, directory, source_fn=subprocess.check_output):
+    self.directory = directory
+    self.source_fn = source_fn
+
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+
+  def _write(self, name, data):
+    if not isinstance(data, bytes):
+      data = data.encode('utf-8')
+    with open(os.path.join(self.directory, name), 'wb') as fixture:
+      fixture.write(data)
+
+  def __call__(self, command):
+    name = fixture_name(command)
+    try:
+      output = self.source_fn(command)
+    except subprocess.CalledProcessError as e:
+      self._write(name + '.out', e.output or b'')
+      self._write(name + '.rc', str(e.returncode))
+      raise
+
+    logging.debug("recording {}".format(name))
+    self._write(name + '.out', output)
+    # forget an earlier failure of the same query
+    try:
+      os.remove(os.path.join(self.directory, name + '.rc'))
+    except OSError:
+      pass
+    return output
+
+
+class ReplaySource(object):
+  """
+  A source_fn that answers queries from a fixture directory
+  """
+
+  def __init__(self, directory):
+    self.directory = directory
+
+  def _read(self, name):
+    with open(os.path.join(self.directory, name), 'rb') as fixture:
+      return fixture.read()
+
+  def __call__(self, command):
+    name = fixture_name(command)
+    try:
+      output = self._read(name + '.out')
+    except IOError as e:
+      if e.errno != errno.ENOENT:
+        raise
+      raise ReplayError("no recorded answer for '{}' in {}".format(
+        " ".join(command), self.directory))
+
+    try:
+      returncode = int(self._read(name + '.rc'))
+    except IOError:
+      return output
+    raise subprocess.CalledProcessError(returncode, command, output)
@@ -0,0 +1,250 @@
+"""
+Run openstack CLI queries through one long lived client process.
+
+Forking the openstack CLI for each query pays the interpreter startup and
+client plugin loading every time.  ShellSource is a source_fn that starts a
+single client process and sends it each query over its stdin.  The results
+come back on its stdout as frames:
+
+  request:   a JSON list of CLI arguments, without 'openstack', on one line
+  response:  a header line "<returncode> <length>" followed by <length> bytes
+             of output.  The output is the command result on success and the
+             error text on failure.
+
+A process can send the output as it is written, in frames with the return
+code "-", before the last frame with the real return code.
+ShellSource.stream() yields those chunks as they arrive.
+
+The default client process is ospsurvey.sources.oscworker, which runs the
+openstackclient shell in-process.  Anything that speaks the same protocol can
+take its place.
+"""
+import errno
+import json
+import logging
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+
+default_command = [sys.executable, '-m', 'ospsurvey.sources.oscworker']
+
+# The return code of a frame with more output to follow
+partial_frame = '-'
+
+
+class ShellError(Exception):
+  """
+  The client process failed or broke the protocol
+  """
+  pass
+
+class ShellTimeout(ShellError):
+  """
+  A query did not finish in the time allowed
+  """
+  pass
+
+
+def write_frame(stream, returncode, payload):
+  """
+  Write one response frame to a binary stream
+  """
+  if not isinstance(payload, bytes):
+    payload = payload.encode('utf-8')
+
+  stream.write("{} {}\n".format(returncode, len(payload)).encode('ascii'))
+  stream.write(payload)
+  stream.flush()
+
+def parse_header(line):
+  """
+  Split a response header line into the return code and payload length.
+  The return code of a partial frame is None
+  """
+  try:
+    (returncode, length) = line.split()
+    if returncode == partial_frame:
+      return None, int(length)
+    return int(returncode), int(length)
+  except ValueError:
+    raise ShellError("invalid response header: {!r}".format(line))
+
+
+class ShellSource(object):
+  """
+  A source_fn that sends openstack queries to a persistent client process
+  """
+
+  # The name of the process in log messages
+  process_name = 'openstack client'
+
+  def __init__(self, command=None, timeout=120, retries=1,
+               fallback_fn=subprocess.check_output, env=None):
+    self.command = command if command is not None else default_command
+    self.timeout = timeout
+    self.retries = retries
+    self.fallback_fn = fallback_fn
+    self.env = env
+
+    self._process = None
+    self._buffer = b''
+    self._lock = threading.Lock()
+
+  def __call__(self, command):
+    """
+    Run a query and return its output like subprocess.check_output
+    """
+    request = self.request(command)
+    if request is None:
+      return self.fallback_fn(command)
+
+    return b''.join(self._chunks(command, request))
+
+  def stream(self, command):
+    """
+    Run a query and yield its output in chunks as the process sends them,
+    like ospsurvey.jsonstream.cli_stream
+    """
+    request = self.request(command)
+    if request is None:
+      return iter([self.fallback_fn(command)])
+
+    return self._chunks(command, request)
+
+  def request(self, command):
+    """
+    Return the request frame for a command, or None if the process does not
+    answer it
+    """
+    if len(command) == 0 or command[0] != 'openstack':
+      return None
+
+    return (json.dumps(list(command[1:])) + "\n").encode('utf-8')
+
+  def close(self):
+    """
+    Stop the client process.  It will be restarted by the next query
+    """
+    with self._lock:
+      self._stop()
+
+  #
+  # Process management
+  #
+  def _start(self):
+    logging.debug("starting {} process: {}".format(
+      self.process_name, " ".join(self.command)))
+    self._process = subprocess.Popen(self.command,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     env=self.env)
+    self._buffer = b''
+
+  def _stop(self):
+    if self._process is None:
+      return
+
+    if self._process.poll() is None:
+      try:
+        self._process.stdin.close()
+      except (IOError, OSError):
+        pass
+      self._process.kill()
+    self._process.wait()
+    self._process.stdout.close()
+    self._process = None
+
+  def _chunks(self, command, request):
+    """
+    Yield the output of a request.  The process is restarted and the request
+    sent again if it fails before any output has been yielded.
+    Raise CalledProcessError after the last chunk if the command failed
+    """
+    with self._lock:
+      (attempt, sent, finished) = (0, False, False)
+      try:
+        while True:
+          try:
+            for (returncode, payload) in self._query(request):
+              if returncode is None or returncode == 0:
+                if payload:
+                  sent = True
+                  yield payload
+            finished = True
+            break
+          except ShellTimeout:
+            raise
+          except ShellError as e:
+            self._stop()
+            if sent or attempt >= self.retries:
+              raise
+            attempt += 1
+            logging.warning("{} process failed ({}): restarting".format(
+              self.process_name, e))
+      finally:
+        if not finished:
+          # The process state is unknown. Start fresh on the next query
+          self._stop()
+
+    if returncode != 0:
+      raise subprocess.CalledProcessError(returncode, command, output=payload)
+
+  def _query(self, request):
+    """
+    Send a request and yield the (returncode, payload) of each response frame
+    """
+    if self._process is None or self._process.poll() is not None:
+      self._start()
+
+    try:
+      self._process.stdin.write(request)
+      self._process.stdin.flush()
+    except (IOError, OSError) as e:
+      if e.errno == errno.EPIPE:
+        raise ShellError("client process exited")
+      raise
+
+    deadline = time.time() + self.timeout
+    while True:
+      (returncode, length) = parse_header(self._read_line(deadline))
+      yield returncode, self._read_exact(length, deadline)
+      if returncode is not None:
+        break
+
+  #
+  # Frame reading with a deadline
+  #
+  def _fill(self, deadline):
+    """
+    Read whatever is available from the process into the buffer
+    """
+    remaining = deadline - time.time()
+    if remaining <= 0:
+      raise ShellTimeout("no response in {} seconds".format(self.timeout))
+
+    fd = self._process.stdout.fileno()
+    (ready, _, _) = select.select([fd], [], [], remaining)
+    if not ready:
+      raise ShellTimeout("no response in {} seconds".format(self.timeout))
+
+    chunk = os.read(fd, 65536)
+    if not chunk:
+      raise ShellError("client process exited")
+    self._buffer += chunk
+
+  def _read_line(self, deadline):
+    while b'\n' not in self._buffer:
+      self._fill(deadline)
+
+    (line, self._buffer) = self._buffer.split(b'\n', 1)
+    return line.decode('ascii', 'replace')
+
+  def _read_exact(self, length, deadline):
+    while len(self._buffer) < length:
+      self._fill(deadline)
+
+    (data, self._buffer) = (self._buffer[:length], self._buffer[length:])
+    return data
@@ -0,0 +1,112 @@
+"""
+Run the privileged host queries through one helper process started once
+under sudo.
+
+The yum and subscription-manager probes run each of their commands with
+sudo, so a full survey opens a new sudo session, with its PAM stack, for
+every query.  SudoSource is a source_fn that starts a single helper
+process with sudo and sends it each command over its stdin instead.  It
+uses the same frames as ospsurvey.sources.shell:
+
+  request:   a JSON list of the command arguments, without 'sudo', on one line
+  response:  partial frames "- <length>" with the output as it is written,
+             then a header line "<returncode> <length>" followed by
+             <length> bytes of error text
+
+The helper, ospsurvey.sources.sudoworker, only runs the read-only commands
+in allowed_commands.  Any other command, with or without sudo, is passed to
+the fallback_fn.  SudoSource.stream is a stream_fn for the probes that read
+the output as it arrives.
+
+The helper is installed as the script ospsurvey-sudo-helper, which starts
+Python without PYTHONPATH or the user site directory.  sudoers can grant
+it, and nothing else, by its path:
+
+  survey ALL=(root) NOPASSWD: /usr/bin/ospsurvey-sudo-helper
+
+The helper refuses to start without root unless it is given --unprivileged.
+SudoSource(unprivileged=True) starts it that way, without sudo, to test it
+or to survey a host where the commands need no privileges.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+from ospsurvey.sources.shell import ShellSource
+
+worker_module = 'ospsurvey.sources.sudoworker'
+# The helper script installed with this package
+helper_path = os.path.join(sys.prefix, 'bin', 'ospsurvey-sudo-helper')
+
+# Any single repo name or selector.  Nothing that yum could take as an option
+_repo_argument = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.:@*-]*\Z')
+
+# The commands the helper will run, as argument lists.  A regular expression
+# matches any one argument that it matches completely
+allowed_commands = [
+  ['yum', 'repolist', _repo_argument],
+  ['yum', 'repoinfo', _repo_argument],
+  ['yum', 'history', 'info'],
+  ['yum', 'updateinfo', 'list', 'security'],
+  ['yum', 'updateinfo', 'list', 'cves'],
+  ['subscription-manager', 'status'],
+  ['subscription-manager', 'config'],
+  ['subscription-manager', 'repos', '--list-enabled'],
+  ['subscription-manager', 'list', '--consumed']
+]
+
+def allowed(argv):
+  """
+  Check if an argument list, without sudo, is one of the allowed commands
+  """
+  for pattern in allowed_commands:
+    if len(argv) != len(pattern):
+      continue
+    for (arg, expected) in zip(argv, pattern):
+      if not isinstance(arg, (str, type(u''))):
+        return False
+      if hasattr(expected, 'match'):
+        if expected.match(arg) is None:
+          break
+      elif arg != expected:
+        break
+    else:
+      return True
+
+  return False
+
+def worker_command(unprivileged=False, helper=helper_path):
+  """
+  The command that starts the helper process.  sudo runs the installed
+  script, never the interpreter itself
+  """
+  if unprivileged:
+    return [sys.executable, '-m', worker_module, '--unprivileged']
+  return ['sudo', helper]
+
+
+class SudoSource(ShellSource):
+  """
+  A source_fn that sends the allowed sudo commands to a persistent
+  privileged helper process
+  """
+
+  process_name = 'sudo helper'
+
+  def __init__(self, command=None, timeout=900, retries=1,
+               fallback_fn=subprocess.check_output, env=None,
+               unprivileged=False):
+    if command is None:
+      command = worker_command(unprivileged)
+    ShellSource.__init__(self, command, timeout, retries, fallback_fn, env)
+
+  def request(self, command):
+    """
+    Return the request frame for an allowed sudo command, or None
+    """
+    if len(command) < 2 or command[0] != 'sudo' or not allowed(command[1:]):
+      return None
+
+    return (json.dumps(list(command[1:])) + "\n").encode('utf-8')
@@ -0,0 +1,87 @@
+"""
+The privileged helper process for ospsurvey.sources.sudo.
+
+This is started once with sudo and runs each allowed command it is sent
+on stdin until stdin is closed.  The output of each command is sent back on
+stdout in partial frames as the command writes it, followed by a frame with
+its return code.  It is installed as a script that sudoers can name:
+
+  sudo /usr/bin/ospsurvey-sudo-helper
+
+A command that is not in ospsurvey.sources.sudo.allowed_commands is
+answered with return code 126 and is not run.  Without root the helper
+exits at once unless it is given --unprivileged.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from ospsurvey.jsonstream import chunk_size
+from ospsurvey.sources.shell import partial_frame, write_frame
+from ospsurvey.sources.sudo import allowed
+
+def run_command(argv, stream, size=chunk_size):
+  """
+  Run one allowed command and write its output to a binary stream as frames.
+  The last frame has the return code, and the error text if it failed.
+  Return the return code
+  """
+  if not isinstance(argv, list) or not allowed(argv):
+    write_frame(stream, 126, "command not allowed: {}".format(json.dumps(argv)))
+    return 126
+
+  # The error text is only sent at the end, so it need not be read meanwhile
+  with tempfile.TemporaryFile() as errors:
+    try:
+      with open(os.devnull) as devnull:
+        process = subprocess.Popen(argv,
+                                   stdin=devnull,
+                                   stdout=subprocess.PIPE,
+                                   stderr=errors)
+    except OSError as e:
+      write_frame(stream, 127, "{}: {}".format(argv[0], e))
+      return 127
+
+    fd = process.stdout.fileno()
+    for chunk in iter(lambda: os.read(fd, size), b''):
+      write_frame(stream, partial_frame, chunk)
+    process.stdout.close()
+    returncode = process.wait()
+
+    errors.seek(0)
+    write_frame(stream, returncode, errors.read() if returncode else b'')
+
+  return returncode
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+    description="Run the ospsurvey host queries for one sudo session")
+  parser.add_argument('--unprivileged', action='store_true', default=False,
+                      help="run without root, for testing")
+  opts = parser.parse_args(argv)
+
+  if not opts.unprivileged and os.geteuid() != 0:
+    sys.stderr.write("the sudo helper must run as root\n")
+    return 1
+
+  # Keep the protocol stream for ourselves and send everything else to stderr
+  protocol = os.fdopen(os.dup(1), 'wb')
+  os.dup2(2, 1)
+  requests = os.fdopen(os.dup(0), 'rb')
+
+  for line in iter(requests.readline, b''):
+    try:
+      command = json.loads(line.decode('utf-8'))
+    except ValueError as e:
+      write_frame(protocol, 2, "invalid request: {}".format(e))
+      continue
+
+    run_command(command, protocol)
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+Generate a consistent synthetic cloud of any size and answer queries about it.
+
+A SyntheticCloud is a source_fn that answers the openstack CLI queries the
+probes make with the JSON the CLI would print for a TripleO undercloud of the
+requested size:
+
+  services and endpoints  - one endpoint per interface for each service
+  baremetal nodes         - tagged with capabilities node:<role>-<index>
+  servers                 - one deployed on each node, matched by instance
+                            UUID, and any extra servers with no node
+  volumes                 - attached to the servers in turn
+  overcloud stack         - with a <Role>SchedulerHints parameter per role
+
+The same size and seed always produce the same cloud, so the probes and the
+role resolution can be tested and timed at scale without a deployment.  The
+answers can also be saved as fixtures for a ReplaySource.
+"""
+from collections import OrderedDict
+import json
+import logging
+import random
+import uuid
+
+from ospsurvey.sources.api import parse_command
+from ospsurvey.sources.replay import RecordingSource
+
+# role name, node tag stem, share of the nodes after the controllers
+default_roles = (
+  ('Controller', 'controller', 0),
+  ('Compute', 'compute', 0.8),
+  ('CephStorage', 'ceph', 0.15),
+  ('ObjectStorage', 'swift', 0.05)
+)
+default_controllers = 3
+
+# Real service names are used first, then numbered ones
+service_types = (
+  ('keystone', 'identity'), ('nova', 'compute'), ('glance', 'image'),
+  ('neutron', 'network'), ('cinderv3', 'volumev3'), ('swift', 'object-store'),
+  ('heat', 'orchestration'), ('ironic', 'baremetal'),
+  ('placement', 'placement'), ('aodh', 'alarming'), ('gnocchi', 'metric'),
+  ('panko', 'event'), ('barbican', 'key-manager'),
+  ('octavia', 'load-balancer'), ('manila', 'share'), ('designate', 'dns')
+)
+
+# The VIP that serves each interface
+interface_hosts = OrderedDict([
+  ('admin', '192.168.24.2'),
+  ('internal', '172.17.1.10'),
+  ('public', '10.0.0.5')
+])
+
+stack_name = 'overcloud'
+
+# The queries the probes make, for saving fixtures
+default_commands = [
+  "openstack service list --long --format json",
+  "openstack endpoint list --format json",
+  "openstack endpoint list --format json --interface admin",
+  "openstack endpoint list --format json --interface internal",
+  "openstack endpoint list --format json --interface public",
+  "openstack server list --long --format json",
+  "openstack server list --all-projects --long --format json",
+  "openstack baremetal node list --long --format json",
+  "openstack stack list --format json",
+  "openstack stack environment show --format json " + stack_name,
+  "openstack project list -f json",
+  "openstack volume list --all-projects --long --format json"
+]
+
+# The queries the probes make for each project
+project_commands = [
+  "openstack server list -c Name -c ID -c Host --project {Name} -f json",
+  "openstack server list --all-projects --project {ID} --format json"
+]
+
+def address(index, network=10):
+  """
+  Return a distinct IPv4 address in a /8 for each index
+  """
+  index += 10
+  return "{}.{}.{}.{}".format(
+    network, (index >> 16) & 255, (index >> 8) & 255, index & 255)
+
+
+class SyntheticCloud(object):
+  """
+  A source_fn that answers queries about a generated cloud
+  """
+
+  def __init__(self, nodes=100, servers=None, endpoints=None, projects=10,
+               untagged=0, volumes=0, roles=default_roles,
+               controllers=default_controllers, seed=0):
+    """
+    nodes       - number of baremetal nodes
+    servers     - number of servers, one per node by default.  Servers past
+                  the number of nodes have no node, nodes past the number of
+                  servers are not deployed
+    endpoints   - number of endpoints, three per service by default
+    untagged    - number of nodes (from the end) with no node capability
+    volumes     - number of volumes, attached to the servers in turn
+    """
+    self.random = random.Random(seed)
+    self.roles = roles
+    servers = nodes if servers is None else servers
+    endpoints = 3 * len(service_types) if endpoints is None else endpoints
+
+    self.projects = self._make_projects(projects)
+    self.services = self._make_services(-(-endpoints // len(interface_hosts)))
+    self.endpoints = self._make_endpoints(endpoints)
+    self.node_roles = self._assign_roles(nodes - untagged, controllers)
+    self.nodes = self._make_nodes(nodes, servers)
+    self.servers = self._make_servers(servers)
+    self.volumes = self._make_volumes(volumes)
+    self.stacks = self._make_stacks()
+    self.environment = self._make_environment()
+
+    self._handlers = {
+      ('project', 'list'): lambda o: self.projects,
+      ('service', 'list'): lambda o: self.services,
+      ('service', 'show'): lambda o, i: self._show(self.services, 'ID', 'Name', i),
+      ('endpoint', 'list'): self._endpoint_list,
+      ('server', 'list'): self._server_list,
+      ('server', 'show'): self._server_show,
+      ('volume', 'list'): lambda o: self.volumes,
+      ('baremetal', 'node', 'list'): self._node_list,
+      ('baremetal', 'node', 'show'): self._node_show,
+      ('stack', 'list'): lambda o: self.stacks,
+      ('stack', 'environment', 'show'): lambda o, s: self.environment
+    }
+
+  def uuid(self):
+    return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+  #
+  # Generate the cloud
+  #
+  def _make_projects(self, count):
+    names = ['admin', 'service'] + ["project{}".format(i) for i in range(count - 2)]
+    return [OrderedDict([('ID', uuid.UUID(self.uuid()).hex), ('Name', n)])
+            for n in names[:max(count, 1)]]
+
+  def _make_services(self, count):
+    services = []
+    for i in range(count):
+      if i < len(service_types):
+        (name, service_type) = service_types[i]
+      else:
+        (name, service_type) = ("service{}".format(i), "type{}".format(i))
+      services.append(OrderedDict([
+        ('ID', uuid.UUID(self.uuid()).hex),
+        ('Name', name),
+        ('Type', service_type),
+        ('Description', "{} service".format(name)),
+        ('Enabled', True)
+      ]))
+    return services
+
+  def _make_endpoints(self, count):
+    endpoints = []
+    for (port, service) in enumerate(self.services, 8000):
+      for (interface, host) in interface_hosts.items():
+        endpoints.append(OrderedDict([
+          ('ID', uuid.UUID(self.uuid()).hex),
+          ('Region', 'regionOne'),
+          ('Service Name', service['Name']),
+          ('Service Type', service['Type']),
+          ('Enabled', True),
+          ('Interface', interface),
+          ('URL', "http://{}:{}/".format(host, port))
+        ]))
+    return endpoints[:count]
+
+  def _assign_roles(self, count, controllers):
+    """
+    Return the (role, tag stem, index) of each tagged node
+    """
+    weights = [r for r in self.roles if r[2] > 0]
+    total = sum(r[2] for r in weights)
+    counters = {r[0]:0 for r in self.roles}
+
+    assigned = []
+    for i in range(count):
+      if i < controllers:
+        role = self.roles[0]
+      else:
+        pick = self.random.random() * total
+        for role in weights:
+          pick -= role[2]
+          if pick < 0:
+            break
+      assigned.append((role[0], role[1], counters[role[0]]))
+      counters[role[0]] += 1
+
+    return assigned
+
+  def _make_nodes(self, count, deployed):
+    nodes = []
+    for i in range(count):
+      capabilities = 'boot_option:local'
+      if i < len(self.node_roles):
+        (_, stem, index) = self.node_roles[i]
+        capabilities = "node:{}-{},{}".format(stem, index, capabilities)
+
+      nodes.append(OrderedDict([
+        ('UUID', self.uuid()),
+        ('Name', "node-{:05d}".format(i)),
+        ('Instance UUID', self.uuid() if i < deployed else None),
+        ('Power State', 'power on' if i < deployed else 'power off'),
+        ('Provisioning State', 'active' if i < deployed else 'available'),
+        ('Maintenance', False),
+        ('Driver', 'ipmi'),
+        ('Resource Class', 'baremetal'),
+        ('Properties', OrderedDict([
+          ('cpu_arch', 'x86_64'), ('cpus', '32'), ('memory_mb', '131072'),
+          ('local_gb', '557'), ('capabilities', capabilities)
+        ])),
+        ('Driver Info', {'ipmi_address': address(i, 172)})
+      ]))
+    return nodes
+
+  def _make_servers(self, count):
+    servers = []
+    for i in range(count):
+      if i < len(self.nodes):
+        node = self.nodes[i]
+        server_id = node['Instance UUID']
+        if i < len(self.node_roles):
+          (_, stem, index) = self.node_roles[i]
+          name = "overcloud-{}-{}".format(stem, index)
+        else:
+          name = "overcloud-untagged-{}".format(i)
+      else:
+        server_id = self.uuid()
+        name = "instance-{:05d}".format(i)
+
+      servers.append(OrderedDict([
+        ('ID', server_id),
+        ('Name', name),
+        ('Status', 'ACTIVE'),
+        ('Task State', None),
+        ('Power State', 'Running'),
+        ('Networks', "ctlplane={}".format(address(i))),
+        ('Image Name', 'overcloud-full'),
+        ('Image ID', '5e1d6e5f-6d08-4a8e-9a06-f4c2b8f0e4a1'),
+        ('Flavor Name', 'baremetal'),
+        ('Flavor ID', '1a0dd7c9-3d3c-4b7c-9c5b-0a7f7cfbe2a2'),
+        ('Availability Zone', 'nova'),
+        ('Host', 'undercloud.localdomain'),
+        ('Properties', '')
+      ]))
+    return servers
+
+  def _make_volumes(self, count):
+    volumes = []
+    for i in range(count):
+      volume_id = self.uuid()
+      attachments = []
+      if self.servers:
+        server = self.servers[i % len(self.servers)]
+        device = "/dev/vd{}".format(chr(ord('b') + (i // len(self.servers)) % 24))
+        attachments.append(OrderedDict([
+          ('id', volume_id), ('server_id', server['ID']), ('device', device)]))
+
+      volumes.append(OrderedDict([
+        ('ID', volume_id),
+        ('Name', "volume-{:05d}".format(i)),
+        ('Status', 'in-use' if attachments else 'available'),
+        ('Size', 10),
+        ('Type', 'tripleo'),
+        ('Bootable', 'false'),
+        ('Attached to', attachments),
+        ('Properties', '')
+      ]))
+    return volumes
+
+  def _make_stacks(self):
+    return [OrderedDict([
+      ('ID', self.uuid()),
+      ('Stack Name', stack_name),
+      ('Project', self.projects[0]['ID']),
+      ('Stack Status', 'CREATE_COMPLETE'),
+      ('Creation Time', '2020-01-22T07:56:42Z'),
+      ('Updated Time', None)
+    ])]
+
+  def _make_environment(self):
+    counts = {}
+    for (role, _, _) in self.node_roles:
+      counts[role] = counts.get(role, 0) + 1
+
+    parameters = OrderedDict()
+    for (role, stem, _) in self.roles:
+      parameters[role + 'Count'] = counts.get(role, 0)
+      parameters[role + 'SchedulerHints'] = {
+        'capabilities:node': "{}-%index%".format(stem)}
+
+    return OrderedDict([
+      ('parameter_defaults', parameters),
+      ('parameters', {}),
+      ('resource_registry', {}),
+      ('encrypted_parameters', [])
+    ])
+
+  #
+  # Answer queries
+  #
+  @staticmethod
+  def _show(records, *args):
+    """
+    Find a record by any of the key fields: _show(records, 'ID', 'Name', value)
+    """
+    (keys, value) = (args[:-1], args[-1])
+    for r in records:
+      if any(r[k] == value for k in keys):
+        return r
+    raise KeyError(value)
+
+  def _endpoint_list(self, options):
+    interface = options.get('--interface')
+    if interface is None:
+      return self.endpoints
+    return [e for e in self.endpoints if e['Interface'] == interface]
+
+  def _server_list(self, options):
+    # every server is in the first project
+    servers = self.servers
+    if options.get('--project') not in (None, self.projects[0]['ID'],
+                                        self.projects[0]['Name']):
+      servers = []
+
+    if options.get('--long'):
+      return servers
+    columns = ('ID', 'Name', 'Status', 'Networks', 'Image Name', 'Flavor Name')
+    return [OrderedDict((c, s[c]) for c in columns) for s in servers]
+
+  def _server_show(self, options, id_or_name):
+    server = self._show(self.servers, 'ID', 'Name', id_or_name)
+    return OrderedDict([
+      ('id', server['ID']),
+      ('name', server['Name']),
+      ('status', server['Status']),
+      ('addresses', server['Networks']),
+      ('flavor', "{} ({})".format(server['Flavor Name'], server['Flavor ID'])),
+      ('image', "{} ({})".format(server['Image Name'], server['Image ID'])),
+      ('OS-EXT-SRV-ATTR:host', server['Host']),
+      ('OS-EXT-AZ:availability_zone', server['Availability Zone']),
+      ('project_id', self.projects[0]['ID']),
+      ('properties', server['Properties']),
+      ('volumes_attached', [
+        {'id': v['ID']} for v in self.volumes
+        if any(a['server_id'] == server['ID'] for a in v['Attached to'])])
+    ])
+
+  def _node_list(self, options):
+    if options.get('--long'):
+      return self.nodes
+    columns = ('UUID', 'Name', 'Instance UUID', 'Power State',
+               'Provisioning State', 'Maintenance')
+    return [OrderedDict((c, n[c]) for c in columns) for n in self.nodes]
+
+  def _node_show(self, options, id_or_name):
+    node = self._show(self.nodes, 'UUID', 'Name', id_or_name)
+    return OrderedDict((k.replace(' ', '_').lower(), v) for (k, v) in node.items())
+
+  def __call__(self, command):
+    """
+    Return the JSON string the CLI would print for a query
+    """
+    (words, options) = parse_command(command)
+
+    for (key, fn) in self._handlers.items():
+      if tuple(words[1:len(key) + 1]) == key:
+        try:
+          value = fn(options, *words[len(key) + 1:])
+        except KeyError as e:
+          raise ValueError("no such item in the synthetic cloud: {}".format(e))
+        break
+    else:
+      raise ValueError("the synthetic cloud can't answer '{}'".format(
+        " ".join(command)))
+
+    columns = options.get('--column')
+    if columns:
+      select = lambda r: OrderedDict((c, r[c]) for c in columns if c in r)
+      value = [select(r) for r in value] if isinstance(value, list) else select(value)
+
+    return json.dumps(value)
+
+  def fixture_commands(self):
+    """
+    The probe queries, with the per-project queries for this cloud's projects
+    """
+    return default_commands + [c.format(**p) for p in self.projects
+                               for c in project_commands]
+
+  def write_fixtures(self, directory, commands=None):
+    """
+    Save the answers to the probe queries as fixtures for a ReplaySource
+    """
+    if commands is None:
+      commands = self.fixture_commands()
+    recorder = RecordingSource(directory, self)
+    for command in commands:
+      recorder(command.split())
+    logging.debug("wrote {} fixtures to {}".format(len(commands), directory))
+
+def main():
+  import argparse
+  parser = argparse.ArgumentParser(
+    description="Write the probe query fixtures for a synthetic cloud")
+  parser.add_argument('directory')
+  parser.add_argument('-n', '--nodes', type=int, default=100)
+  parser.add_argument('-s', '--servers', type=int, default=None)
+  parser.add_argument('-e', '--endpoints', type=int, default=None)
+  parser.add_argument('-u', '--untagged', type=int, default=0)
+  parser.add_argument('-v', '--volumes', type=int, default=0)
+  parser.add_argument('--seed', type=int, default=0)
+  opts = parser.parse_args()
+
+  cloud = SyntheticCloud(nodes=opts.nodes, servers=opts.servers,
+                         endpoints=opts.endpoints, untagged=opts.untagged,
+                         volumes=opts.volumes, seed=opts.seed)
+  cloud.write_fixtures(opts.directory)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,77 @@
+-- A yum history database in the yum 3.4 schema
+CREATE TABLE trans_beg (
+  tid INTEGER PRIMARY KEY, timestamp INTEGER NOT NULL,
+  rpmdb_version TEXT NOT NULL, loginuid INTEGER);
+CREATE TABLE trans_end (
+  tid INTEGER PRIMARY KEY REFERENCES trans_beg, timestamp INTEGER NOT NULL,
+  rpmdb_version TEXT NOT NULL, return_code INTEGER NOT NULL);
+CREATE TABLE trans_cmdline (
+  tid INTEGER NOT NULL REFERENCES trans_beg, cmdline TEXT NOT NULL);
+CREATE TABLE trans_with_pkgs (
+  tid INTEGER NOT NULL REFERENCES trans_beg,
+  pkgtupid INTEGER NOT NULL REFERENCES pkgtups);
+CREATE TABLE trans_data_pkgs (
+  tid INTEGER NOT NULL REFERENCES trans_beg,
+  pkgtupid INTEGER NOT NULL REFERENCES pkgtups,
+  done BOOL NOT NULL DEFAULT FALSE, state TEXT NOT NULL);
+CREATE TABLE pkgtups (
+  pkgtupid INTEGER PRIMARY KEY, name TEXT NOT NULL, arch TEXT NOT NULL,
+  epoch TEXT NOT NULL, version TEXT NOT NULL, release TEXT NOT NULL,
+  checksum TEXT);
+CREATE TABLE pkg_yumdb (
+  pkgtupid INTEGER NOT NULL REFERENCES pkgtups,
+  yumdb_key TEXT NOT NULL, yumdb_val TEXT NOT NULL);
+
+INSERT INTO pkgtups VALUES (1, 'rpm', 'x86_64', '0', '4.11.3', '40.el7', NULL);
+INSERT INTO pkgtups VALUES (2, 'subscription-manager', 'x86_64', '0', '1.24.13', '3.el7_7', NULL);
+INSERT INTO pkgtups VALUES (3, 'yum', 'noarch', '0', '3.4.3', '163.el7', NULL);
+INSERT INTO pkgtups VALUES (4, 'nano', 'x86_64', '0', '2.3.1', '10.el7', NULL);
+INSERT INTO pkgtups VALUES (5, 'openssl', 'x86_64', '1', '1.0.2k', '16.el7', NULL);
+INSERT INTO pkgtups VALUES (6, 'openssl', 'x86_64', '1', '1.0.2k', '19.el7', NULL);
+INSERT INTO pkgtups VALUES (7, 'openssl-libs', 'x86_64', '1', '1.0.2k', '16.el7', NULL);
+INSERT INTO pkgtups VALUES (8, 'openssl-libs', 'x86_64', '1', '1.0.2k', '19.el7', NULL);
+INSERT INTO pkgtups VALUES (9, 'make', 'x86_64', '1', '3.82', '24.el7', NULL);
+INSERT INTO pkgtups VALUES (10, 'tmux', 'x86_64', '0', '1.8', '4.el7', NULL);
+
+INSERT INTO pkg_yumdb VALUES (1, 'from_repo', 'rhel-7-server-rpms');
+INSERT INTO pkg_yumdb VALUES (2, 'from_repo', 'rhel-7-server-rpms');
+INSERT INTO pkg_yumdb VALUES (3, 'from_repo', 'rhel-7-server-rpms');
+INSERT INTO pkg_yumdb VALUES (4, 'from_repo', 'rhel-7-server-rpms');
+INSERT INTO pkg_yumdb VALUES (4, 'reason', 'user');
+INSERT INTO pkg_yumdb VALUES (5, 'from_repo', 'anaconda');
+INSERT INTO pkg_yumdb VALUES (6, 'from_repo', 'rhel-7-server-rpms');
+INSERT INTO pkg_yumdb VALUES (7, 'from_repo', 'anaconda');
+INSERT INTO pkg_yumdb VALUES (8, 'from_repo', 'rhel-7-server-rpms');
+INSERT INTO pkg_yumdb VALUES (9, 'from_repo', 'rhel-7-server-rpms');
+
+-- 140: update openssl, pulling in make
+INSERT INTO trans_beg VALUES (140, 1579000000, '1205:11f0e4b1d1c3e3c7a0c1a5a4b1c5ab8c72d0f3a2', 0);
+INSERT INTO trans_end VALUES (140, 1579000012, '1206:c0a86a4b2fb6d3a0e6e1b1a3f4b1b2c3d4e5f6a7', 0);
+INSERT INTO trans_cmdline VALUES (140, 'update openssl');
+INSERT INTO trans_with_pkgs VALUES (140, 1);
+INSERT INTO trans_with_pkgs VALUES (140, 3);
+INSERT INTO trans_data_pkgs VALUES (140, 6, 'TRUE', 'Update');
+INSERT INTO trans_data_pkgs VALUES (140, 5, 'TRUE', 'Updated');
+INSERT INTO trans_data_pkgs VALUES (140, 8, 'TRUE', 'Update');
+INSERT INTO trans_data_pkgs VALUES (140, 7, 'TRUE', 'Updated');
+INSERT INTO trans_data_pkgs VALUES (140, 9, 'TRUE', 'Dep-Install');
+
+-- 141: a failed erase
+INSERT INTO trans_beg VALUES (141, 1579100000, '1206:c0a86a4b2fb6d3a0e6e1b1a3f4b1b2c3d4e5f6a7', 1000);
+INSERT INTO trans_end VALUES (141, 1579100001, '1206:c0a86a4b2fb6d3a0e6e1b1a3f4b1b2c3d4e5f6a7', 1);
+INSERT INTO trans_cmdline VALUES (141, 'erase make');
+INSERT INTO trans_data_pkgs VALUES (141, 9, 'FALSE', 'Erase');
+
+-- 142: the same transaction as tests/data/yum-history-info
+INSERT INTO trans_beg VALUES (142, 1579679802, '1208:938a582ff2c1559ddafe7b8cd79c3b2dc8dee22c', 0);
+INSERT INTO trans_end VALUES (142, 1579679803, '1209:f9d7dd8d1a5b709ebaa88fca24391194bd1bff7d', 0);
+INSERT INTO trans_cmdline VALUES (142, 'install nano');
+INSERT INTO trans_with_pkgs VALUES (142, 1);
+INSERT INTO trans_with_pkgs VALUES (142, 2);
+INSERT INTO trans_with_pkgs VALUES (142, 3);
+INSERT INTO trans_data_pkgs VALUES (142, 4, 'TRUE', 'Install');
+
+-- 143: interrupted before it ended
+INSERT INTO trans_beg VALUES (143, 1579800000, '1209:f9d7dd8d1a5b709ebaa88fca24391194bd1bff7d', 0);
+INSERT INTO trans_cmdline VALUES (143, 'install tmux');
+INSERT INTO trans_data_pkgs VALUES (143, 10, 'FALSE', 'Install');
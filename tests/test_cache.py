@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Test the disk cache and the caching source
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+import ospsurvey.cache
+import ospsurvey.sources.cache
+
+
+class TestDiskCache(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.cache = ospsurvey.cache.DiskCache(os.path.join(self.directory, 'c'))
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_put_get(self):
+    self.assertIsNone(self.cache.get('a'))
+    self.cache.put('a', b'first')
+    self.cache.put('a', 'second')
+    self.assertEqual(self.cache.get('a'), b'second')
+    self.assertEqual(os.stat(self.cache._path('a')).st_mode & 0o777, 0o600)
+
+  def test_ttl(self):
+    self.cache.put('a', b'value')
+    old = time.time() - 60
+    os.utime(self.cache._path('a'), (old, old))
+
+    self.assertIsNone(self.cache.get('a', ttl=30))
+    self.assertEqual(self.cache.get('a', ttl=90), b'value')
+    self.assertEqual(self.cache.get('a'), b'value')
+
+  def test_evict(self):
+    self.cache.max_bytes = 25
+    for (age, key) in enumerate(['c', 'b', 'a']):
+      self.cache.put(key, b'0123456789')
+      then = time.time() - 100 + age
+      os.utime(self.cache._path(key), (then, then))
+    self.cache.evict()
+
+    self.assertIsNone(self.cache.get('c'))
+    self.assertIsNotNone(self.cache.get('b'))
+    self.assertIsNotNone(self.cache.get('a'))
+    self.assertEqual(
+      [n for n in os.listdir(self.cache.directory) if n.startswith('.tmp-')], [])
+
+  def test_json(self):
+    self.cache.put_json('a', {'x': [1, 2]})
+    self.assertEqual(self.cache.get_json('a'), {'x': [1, 2]})
+    self.cache.put('a', b'not json')
+    self.assertIsNone(self.cache.get_json('a'))
+
+
+class TestCachedSource(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.calls = []
+    self.source = ospsurvey.sources.cache.CachedSource(
+      self.answer, ospsurvey.cache.DiskCache(self.directory),
+      ttls={'openstack server list': 60, 'openstack server list --long': 0})
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def answer(self, command):
+    self.calls.append(command)
+    if command[1] == 'fail':
+      raise subprocess.CalledProcessError(1, command)
+    return "{} {}".format(" ".join(command), len(self.calls)).encode('utf-8')
+
+  def test_cached(self):
+    command = "openstack server list -f json".split()
+    first = self.source(command)
+    self.assertEqual(self.source(command), first)
+    self.assertEqual(len(self.calls), 1)
+
+    self.source.refresh = True
+    self.assertNotEqual(self.source(command), first)
+    self.assertEqual(len(self.calls), 2)
+
+  def test_ttls(self):
+    self.assertEqual(self.source.ttl("openstack server list -f json".split()), 60)
+    self.assertEqual(self.source.ttl("openstack server list --long".split()), 0)
+    self.assertEqual(self.source.ttl("openstack server listing".split()),
+                     ospsurvey.sources.cache.default_ttl)
+
+    command = "openstack server list --long".split()
+    self.source(command)
+    self.source(command)
+    self.assertEqual(len(self.calls), 2)
+
+  def test_environment(self):
+    """
+    A different cloud or user misses the cache, a new password does not
+    """
+    command = "openstack server list".split()
+    saved = dict(os.environ)
+    try:
+      os.environ['OS_AUTH_URL'] = 'http://one:5000'
+      os.environ['OS_PASSWORD'] = 'secret'
+      self.source(command)
+      os.environ['OS_PASSWORD'] = 'changed'
+      self.source(command)
+      self.assertEqual(len(self.calls), 1)
+
+      os.environ['OS_AUTH_URL'] = 'http://two:5000'
+      self.source(command)
+      self.assertEqual(len(self.calls), 2)
+    finally:
+      os.environ.clear()
+      os.environ.update(saved)
+
+  def test_failure(self):
+    command = "openstack fail".split()
+    for _ in range(2):
+      self.assertRaises(subprocess.CalledProcessError, self.source, command)
+    self.assertEqual(len(self.calls), 2)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,6 +1,7 @@
 """
 Show that the unicode conversion to UTF-8 works
 """
+import json
 import unittest
 
 from functools import reduce
@@ -46,3 +47,37 @@ class TestDeunicode(unittest.TestCase):
     )
 
     self.assertEquals(True, k and v)
+
+
+class TestLoads(unittest.TestCase):
+
+  document = '''
+    [{"Name": "node-0", "Maintenance": false, "Count": 3, "Ratio": 0.1,
+      "Properties": {"capabilities": "node:compute-0", "cpus": "32",
+                     "Nested": {"a": ["x", ["y", {"z": "w"}]]}},
+      "Tags": ["one", "two", null], "Empty": {}, "Caf\\u00e9": "\\u00e9t\\u00e9"},
+     "top level string", 12345678901234567890123, [["deep"]]]
+  '''
+
+  def test_same_values(self):
+    """
+    loads returns the same values and types as the decode_dict object hook
+    """
+    expected = json.loads(self.document, object_hook=ospsurvey.deunicode.decode_dict)
+    text_type = ospsurvey.deunicode.text_type
+    if text_type and isinstance(expected[1], text_type):
+      # the hook never sees a string outside an object
+      expected[1] = expected[1].encode('utf-8')
+    value = ospsurvey.deunicode.loads(self.document)
+
+    self.assertEqual(value, expected)
+    self.assertEqual(type(value[0]['Properties']['Nested']['a'][1][0]),
+                     type(expected[0]['Properties']['Nested']['a'][1][0]))
+    self.assertEqual(set(type(k) for k in value[0].keys()),
+                     set(type(k) for k in expected[0].keys()))
+
+  def test_bytes(self):
+    self.assertEqual(ospsurvey.deunicode.loads(b'{"a": ["b"]}'), {'a': ['b']})
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, ospsurvey.deunicode.loads, '{"a": ')
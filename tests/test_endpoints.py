@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Test the endpoint health checks against a local HTTP server
+"""
+from collections import namedtuple
+import threading
+import time
+import unittest
+
+try:
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+  from socketserver import ThreadingMixIn
+except ImportError:
+  from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+  from SocketServer import ThreadingMixIn
+
+import ospsurvey.probes.endpoints
+
+Endpoint = namedtuple('Endpoint', ['ID', 'Service_Name', 'Interface', 'URL'])
+
+
+class Handler(BaseHTTPRequestHandler):
+  """
+  /slow waits before answering, /missing answers 404, anything else 300
+  """
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    if self.path == '/slow':
+      time.sleep(1)
+    code = 404 if self.path == '/missing' else 300
+    body = b'{}'
+    self.send_response(code)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+
+  def get_request(self):
+    # count the client connections
+    self.connections += 1
+    return HTTPServer.get_request(self)
+
+
+class TestCheckEndpoints(unittest.TestCase):
+
+  def setUp(self):
+    self.server = Server(('127.0.0.1', 0), Handler)
+    self.server.connections = 0
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.daemon = True
+    self.thread.start()
+    self.base = "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def test_status(self):
+    """
+    Any HTTP response is a responding endpoint
+    """
+    endpoints = [
+      Endpoint('1', 'nova', 'admin', self.base + '/v2.1'),
+      Endpoint('2', 'nova', 'public', self.base + '/missing'),
+      Endpoint('3', 'zaqar-websocket', 'admin', 'ws://127.0.0.1:9000'),
+      Endpoint('4', 'heat', 'internal', 'http://127.0.0.1:1/')
+    ]
+    status = ospsurvey.probes.endpoints.check_endpoints(endpoints)
+
+    self.assertEqual(status['1']['status'], 'ok')
+    self.assertEqual(status['1']['code'], 300)
+    self.assertEqual(status['1']['service'], 'nova')
+    self.assertEqual(status['2']['code'], 404)
+    self.assertEqual(status['3']['status'], 'skipped')
+    self.assertEqual(status['4']['status'], 'error')
+    self.assertIsNotNone(status['1']['latency'])
+
+  def test_interfaces(self):
+    endpoints = [
+      Endpoint('1', 'nova', 'admin', self.base + '/'),
+      Endpoint('2', 'nova', 'public', self.base + '/')
+    ]
+    status = ospsurvey.probes.endpoints.check_endpoints(
+      endpoints, interfaces=['public'])
+    self.assertEqual(list(status.keys()), ['2'])
+
+  def test_timeout(self):
+    """
+    A slow endpoint times out without holding up the others
+    """
+    endpoints = [Endpoint('slow', 'glance', 'admin', self.base + '/slow')] + \
+      [Endpoint(str(i), 'nova', 'admin', self.base + '/') for i in range(4)]
+
+    start = time.time()
+    status = ospsurvey.probes.endpoints.check_endpoints(endpoints, timeout=0.3)
+
+    self.assertLess(time.time() - start, 1)
+    self.assertEqual(status['slow']['status'], 'timeout')
+    self.assertEqual(status['0']['status'], 'ok')
+
+  def test_connection_reuse(self):
+    """
+    Sequential checks of one host share a single connection
+    """
+    endpoints = [Endpoint(str(i), 'nova', 'admin', self.base + '/')
+                 for i in range(6)]
+    ospsurvey.probes.endpoints.check_endpoints(endpoints, workers=1)
+
+    self.assertEqual(self.server.connections, 1)
+
+  def test_no_requests(self):
+    """
+    Without the requests module the checks fail with a clear error
+    """
+    endpoints = ospsurvey.probes.endpoints
+    (saved, endpoints.requests) = (endpoints.requests, None)
+    try:
+      self.assertRaises(ImportError, endpoints.check_endpoints,
+                        [Endpoint('1', 'nova', 'admin', self.base + '/')])
+    finally:
+      endpoints.requests = saved
+
+if __name__ == "__main__":
+  unittest.main()
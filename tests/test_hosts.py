@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Test the endpoint host reachability checks
+"""
+from collections import namedtuple
+import socket
+import threading
+import time
+import unittest
+
+import ospsurvey.probes.hosts
+
+Endpoint = namedtuple('Endpoint', ['ID', 'URL'])
+
+
+class TestHosts(unittest.TestCase):
+
+  def setUp(self):
+    ospsurvey.probes.hosts.clear_dns_cache()
+
+    # A listener that counts the connections made to it
+    self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.listener.bind(('127.0.0.1', 0))
+    self.listener.listen(16)
+    self.port = self.listener.getsockname()[1]
+    self.connections = 0
+    self.thread = threading.Thread(target=self.accept)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def tearDown(self):
+    self.listener.close()
+
+  def accept(self):
+    while True:
+      try:
+        (connection, address) = self.listener.accept()
+      except (socket.error, OSError):
+        return
+      self.connections += 1
+      connection.close()
+
+  def test_url_target(self):
+    target = ospsurvey.probes.hosts.url_target
+    self.assertEqual(target('https://192.168.24.2:13000/v3'), ('192.168.24.2', 13000))
+    self.assertEqual(target('http://192.168.24.1/'), ('192.168.24.1', 80))
+    self.assertEqual(target('https://192.168.24.1/'), ('192.168.24.1', 443))
+
+  def test_distinct_hosts(self):
+    """
+    Endpoints that share a host and port are checked once
+    """
+    url = "http://127.0.0.1:{}/".format(self.port)
+    endpoints = [Endpoint(str(i), url + str(i)) for i in range(5)]
+
+    results = ospsurvey.probes.hosts.check_endpoint_hosts(endpoints)
+
+    self.assertEqual(sorted(results.keys()), ['0', '1', '2', '3', '4'])
+    self.assertTrue(all(r['reachable'] for r in results.values()))
+    self.thread.join(0.2)
+    self.assertEqual(self.connections, 1)
+
+  def test_unreachable(self):
+    self.listener.close()
+    results = ospsurvey.probes.hosts.check_hosts([('127.0.0.1', self.port)])
+    self.assertFalse(results[('127.0.0.1', self.port)]['reachable'])
+
+  def test_dns_cache(self):
+    """
+    Names are resolved once, including failures
+    """
+    resolve = ospsurvey.probes.hosts.resolve
+    self.assertEqual(resolve('127.0.0.1'), '127.0.0.1')
+    self.assertIn('127.0.0.1', ospsurvey.probes.hosts._resolved)
+
+    self.assertRaises(socket.gaierror, resolve, 'undercloud.invalid')
+    self.assertIsInstance(ospsurvey.probes.hosts._resolved['undercloud.invalid'],
+                          socket.gaierror)
+
+    result = ospsurvey.probes.hosts.check_host('undercloud.invalid', 80)
+    self.assertFalse(result['reachable'])
+    self.assertIn('error', result)
+
+  def test_parallel_lookups(self):
+    """
+    Different names are looked up at once, each name only once
+    """
+    calls = []
+    def getaddrinfo(hostname, *args):
+      calls.append(hostname)
+      time.sleep(0.2)
+      return [(None, None, None, None, ('10.0.0.1', 0))]
+
+    (saved, socket.getaddrinfo) = (socket.getaddrinfo, getaddrinfo)
+    try:
+      threads = [threading.Thread(target=ospsurvey.probes.hosts.resolve, args=(h,))
+                 for h in ['a.example', 'b.example', 'a.example', 'b.example']]
+      start = time.time()
+      for t in threads:
+        t.start()
+      for t in threads:
+        t.join()
+    finally:
+      socket.getaddrinfo = saved
+
+    self.assertLess(time.time() - start, 0.35)
+    self.assertEqual(sorted(calls), ['a.example', 'b.example'])
+    self.assertEqual(ospsurvey.probes.hosts.resolve('a.example'), '10.0.0.1')
+
+  def test_invalid_method(self):
+    self.assertRaises(ValueError, ospsurvey.probes.hosts.check_hosts,
+                      [('127.0.0.1', 80)], method='carrier-pigeon')
+
+if __name__ == "__main__":
+  unittest.main()
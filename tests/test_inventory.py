@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Test the node and server join
+"""
+import unittest
+
+import ospsurvey.probes.nodes
+import ospsurvey.probes.servers
+from ospsurvey.inventory import Inventory
+from ospsurvey.sources.synthetic import SyntheticCloud
+
+
+class TestInventory(unittest.TestCase):
+
+  def inventory(self, **kwargs):
+    cloud = SyntheticCloud(**kwargs)
+    return Inventory(ospsurvey.probes.nodes.list_nodes(source_fn=cloud),
+                     ospsurvey.probes.servers.list_servers(source_fn=cloud))
+
+  def test_lookups(self):
+    inventory = self.inventory(nodes=10)
+    node = inventory.nodes[4]
+    server = inventory.node_server(node)
+
+    self.assertEqual(server.ID, node.instance_uuid)
+    self.assertIs(inventory.server_node(server), node)
+    self.assertIs(inventory.server(server.ID), server)
+    self.assertIs(inventory.server(server.Name), server)
+    self.assertIs(inventory.node(node.name), node)
+    self.assertIs(inventory.node(node.instance_uuid), node)
+    self.assertIsNone(inventory.server('missing'))
+    self.assertIsNone(inventory.node('missing'))
+
+  def test_undeployed(self):
+    inventory = self.inventory(nodes=10, servers=8, untagged=3)
+    orphans = inventory.orphans()
+
+    self.assertEqual(orphans['untagged_nodes'], ['node-00007', 'node-00008', 'node-00009'])
+    self.assertEqual(orphans['undeployed_nodes'], ['node-00008', 'node-00009'])
+    self.assertEqual(orphans['unmatched_servers'], [])
+    self.assertIsNone(inventory.node_server(inventory.nodes[9]))
+
+  def test_unmatched_servers(self):
+    inventory = self.inventory(nodes=5, servers=7)
+    orphans = inventory.orphans()
+
+    self.assertEqual(orphans['untagged_nodes'], [])
+    self.assertEqual(orphans['undeployed_nodes'], [])
+    self.assertEqual(orphans['unmatched_servers'], ['instance-00005', 'instance-00006'])
+    self.assertIsNone(inventory.server_node(inventory.server('instance-00006')))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Test the incremental JSON array parser and the streaming list probes
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import ospsurvey.deunicode
+import ospsurvey.jsonstream
+import ospsurvey.probes.nodes
+import ospsurvey.probes.servers
+from ospsurvey.sources.synthetic import SyntheticCloud
+
+def chunked(data, size):
+  if not isinstance(data, bytes):
+    data = data.encode('utf-8')
+  return [data[i:i + size] for i in range(0, len(data), size)]
+
+# Writes the first element, waits for a file to exist, then finishes the array
+slow_writer = """
+import os, sys, time
+sys.stdout.write('[{"ID": "1"},'); sys.stdout.flush()
+deadline = time.time() + 10
+while not os.path.exists(sys.argv[1]) and time.time() < deadline:
+  time.sleep(0.01)
+sys.stdout.write(' {"ID": "2"}]'); sys.stdout.flush()
+"""
+
+
+class TestIterArray(unittest.TestCase):
+
+  document = u'''
+    [ {"Name": "caf\\u00e9", "Nested": {"a": ["x", ["\\u00e9t\\u00e9"]]}},
+      12345, -0.5e3, "text", true, null, [1, [2]], {} ]
+  '''
+
+  def test_chunk_boundaries(self):
+    """
+    Every split of the text gives the same elements as loads
+    """
+    expected = ospsurvey.deunicode.loads(self.document)
+    for size in (1, 2, 3, 7, 1000):
+      self.assertEqual(
+        list(ospsurvey.jsonstream.iter_array(chunked(self.document, size))),
+        expected)
+
+  def test_text_chunks(self):
+    self.assertEqual(
+      list(ospsurvey.jsonstream.iter_array([u'[1, ', u'2]'])), [1, 2])
+
+  def test_empty(self):
+    self.assertEqual(list(ospsurvey.jsonstream.iter_array([b' [ ] '])), [])
+    self.assertEqual(list(ospsurvey.jsonstream.iter_array([b'[', b']'])), [])
+
+  def test_invalid(self):
+    for text in (b'{"a": 1}', b'[1, 2', b'[1 2]', b'[1,]', b'[{"a": ]', b''):
+      self.assertRaises(ValueError, list,
+                        ospsurvey.jsonstream.iter_array(chunked(text, 2)))
+
+
+class TestCliStream(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.flag = os.path.join(self.directory, 'flag')
+    self.command = [sys.executable, '-c', slow_writer, self.flag]
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_first_element_early(self):
+    """
+    The first element arrives while the command is still writing
+    """
+    elements = ospsurvey.jsonstream.iter_array(
+      ospsurvey.jsonstream.cli_stream(self.command))
+
+    self.assertEqual(next(elements), {'ID': '1'})
+    open(self.flag, 'w').close()
+    self.assertEqual(list(elements), [{'ID': '2'}])
+
+  def test_early_close(self):
+    stream = ospsurvey.jsonstream.cli_stream(self.command)
+    next(stream)
+    start = time.time()
+    stream.close()
+    self.assertLess(time.time() - start, 5)
+
+  def test_failure(self):
+    command = [sys.executable, '-c', 'import sys; print("[]"); sys.exit(3)']
+    try:
+      list(ospsurvey.jsonstream.cli_stream(command))
+      self.fail("the command failure was not reported")
+    except subprocess.CalledProcessError as e:
+      self.assertEqual(e.returncode, 3)
+
+
+class TestStreamingProbes(unittest.TestCase):
+
+  def setUp(self):
+    self.cloud = SyntheticCloud(nodes=50, untagged=2)
+    self.stream_fn = lambda command: chunked(self.cloud(command), 997)
+
+  def test_servers(self):
+    self.assertEqual(
+      list(ospsurvey.probes.servers.iter_servers(self.stream_fn)),
+      ospsurvey.probes.servers.list_servers(source_fn=self.cloud))
+
+  def test_nodes(self):
+    nodes = list(ospsurvey.probes.nodes.iter_nodes(
+      ospsurvey.jsonstream.source_stream(self.cloud)))
+    self.assertEqual(nodes, ospsurvey.probes.nodes.list_nodes(source_fn=self.cloud))
+    self.assertEqual(nodes[0].properties['capabilities']['node'], 'controller-0')
+
+if __name__ == "__main__":
+  unittest.main()
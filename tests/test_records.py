@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Test the shared record classes and values
+"""
+import json
+import unittest
+
+import ospsurvey.records
+
+
+class TestRecords(unittest.TestCase):
+
+  def test_class_cache(self):
+    a = ospsurvey.records.make_record('ServiceClass', {'ID': '1', 'Name': 'nova'})
+    b = ospsurvey.records.make_record('ServiceClass', {'ID': '2', 'Name': 'heat'})
+    c = ospsurvey.records.make_record('ServiceClass', {'ID': '3', 'Type': 'dns'})
+
+    self.assertIs(type(a), type(b))
+    self.assertIsNot(type(a), type(c))
+    self.assertEqual(b.Name, 'heat')
+
+  def test_make_records(self):
+    # The values are taken by key, not by position
+    records = json.loads(
+      '[{"ID": "1", "Status": "ACTIVE", "Power State": "Running"},'
+      ' {"Status": "ACTIVE", "ID": "2", "Power State": "Running"}]')
+    servers = ospsurvey.records.make_records('ServerClass', records,
+                                             intern=('Status', 'Power State'))
+
+    self.assertEqual([s.ID for s in servers], ['1', '2'])
+    self.assertEqual(servers[1].Power_State, 'Running')
+    self.assertIs(servers[0].Status, servers[1].Status)
+    self.assertIsNot(servers[0].ID, records[1]['ID'])
+
+    self.assertEqual(ospsurvey.records.make_records('ServerClass', []), [])
+
+  def test_rename(self):
+    node = ospsurvey.records.make_record(
+      'NodeClass', {'Instance UUID': 'abc'}, rename=lambda k: k.replace(' ', '_').lower())
+    self.assertEqual(node.instance_uuid, 'abc')
+
+  def test_intern_value(self):
+    properties = json.loads('{"cpu_arch": "x86_64", "cpus": 32, "flag": true}')
+    shared = ospsurvey.records.intern_value(properties)
+
+    self.assertEqual(shared, properties)
+    self.assertIs(shared['cpu_arch'],
+                  ospsurvey.records.intern_value(json.loads('"x86_64"')))
+    # Equal values of other types are left alone
+    self.assertIs(ospsurvey.records.intern_value(1), 1)
+    self.assertIs(ospsurvey.records.intern_value(True), True)
+    self.assertIsNone(ospsurvey.records.intern_value(None))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Test the remote host survey with a fake transport
+"""
+from collections import namedtuple
+import subprocess
+import threading
+import time
+import unittest
+
+import ospsurvey.probes.servers
+import ospsurvey.probes.yum
+import ospsurvey.remote
+from ospsurvey.remote import LocalTransport, RemoteError, RemoteTimeout, SshTransport
+from ospsurvey.sources.synthetic import SyntheticCloud
+
+Server = namedtuple('Server', ['Name', 'Networks'])
+
+sm_status = b"""+-------------------------------------------+
+   System Status Details
++-------------------------------------------+
+Overall Status: Current
+
+System Purpose Status: Not Specified
+"""
+
+# command -> saved output
+answers = {
+  'sudo yum repoinfo enabled': 'tests/data/yum-repoinfo',
+  'sudo yum history info': 'tests/data/yum-history-info',
+  'sudo yum updateinfo list security': 'tests/data/yum-updateinfo',
+  'sudo yum updateinfo list cves': 'tests/data/yum-updateinfo',
+  'sudo subscription-manager config': 'tests/data/sm-config',
+  'sudo subscription-manager repos --list-enabled': 'tests/data/sm-repos',
+  'sudo subscription-manager list --consumed': 'tests/data/sm-consumed'
+}
+
+
+class FakeTransport(object):
+  """
+  Answer the host probe commands from saved output.  A host address
+    down-*    can't be reached
+    slow-*    takes longer than the deadline
+    broken-*  fails every yum command
+  """
+  def __init__(self, delay=0):
+    self.delay = delay
+    self.running = 0
+    self.most = 0
+    self.lock = threading.Lock()
+    self.closed = False
+
+  def source(self, host, deadline):
+    def source_fn(command):
+      with self.lock:
+        self.running += 1
+        self.most = max(self.most, self.running)
+      try:
+        time.sleep(self.delay)
+        if host.startswith('down-'):
+          raise RemoteError("{}: connection refused".format(host))
+        if host.startswith('slow-') or time.time() > deadline:
+          raise RemoteTimeout("{}: out of time".format(host))
+        if host.startswith('broken-') and command[1] != 'subscription-manager':
+          raise subprocess.CalledProcessError(1, command)
+
+        command = " ".join(command)
+        if command == 'sudo subscription-manager status':
+          return sm_status
+        return open(answers[command], 'rb').read()
+      finally:
+        with self.lock:
+          self.running -= 1
+
+    return source_fn
+
+  def close(self):
+    self.closed = True
+
+
+class TestAddresses(unittest.TestCase):
+
+  def test_ctlplane(self):
+    address = ospsurvey.remote.ctlplane_address
+    self.assertEqual(address(Server('a', 'ctlplane=192.168.24.8')), '192.168.24.8')
+    self.assertEqual(
+      address(Server('a', 'external=10.0.0.4; ctlplane=192.168.24.8, fd00::8')),
+      '192.168.24.8')
+    self.assertEqual(address(Server('a', {'ctlplane': ['192.168.24.9']})),
+                     '192.168.24.9')
+    self.assertIsNone(address(Server('a', 'external=10.0.0.4')))
+    self.assertIsNone(address(Server('a', 'xctlplane=10.0.0.4')))
+    self.assertIsNone(address(Server('a', '')))
+
+  def test_servers(self):
+    cloud = SyntheticCloud(nodes=5)
+    hosts = ospsurvey.remote.server_hosts(
+      ospsurvey.probes.servers.list_servers(source_fn=cloud))
+    self.assertEqual(len(hosts), 5)
+    self.assertTrue(all(a is not None for a in hosts.values()))
+
+
+class TestSurvey(unittest.TestCase):
+
+  def test_host(self):
+    result = ospsurvey.remote.survey_host('overcloud-controller-0',
+                                          '192.168.24.8', FakeTransport())
+    self.assertEqual(result['status'], 'ok')
+    self.assertEqual(result['errors'], {})
+    self.assertEqual(sorted(result['data'].keys()), [
+      'cves', 'history', 'repos', 'sm_config', 'sm_consumed', 'sm_repos',
+      'sm_status', 'updates'])
+    self.assertEqual(len(result['data']['repos']), 3)
+    self.assertEqual(len(result['data']['sm_consumed']), 2)
+    self.assertEqual(result['data']['sm_status']['status'], 'Current')
+
+  def test_partial_failure(self):
+    hosts = {'ok-0': 'ok-0', 'down-1': 'down-1', 'slow-2': 'slow-2',
+             'broken-3': 'broken-3', 'none-4': None}
+    report = ospsurvey.remote.survey_hosts(hosts, FakeTransport(), workers=2)
+
+    self.assertEqual(report['ok-0']['status'], 'ok')
+    self.assertEqual(report['down-1']['status'], 'unreachable')
+    self.assertEqual(len(report['down-1']['errors']), 8)
+    self.assertEqual(report['slow-2']['status'], 'timeout')
+    self.assertEqual(report['none-4']['status'], 'unreachable')
+
+    broken = report['broken-3']
+    self.assertEqual(broken['status'], 'partial')
+    self.assertEqual(sorted(broken['errors'].keys()),
+                     ['cves', 'history', 'repos', 'updates'])
+    self.assertEqual(len(broken['data']['sm_repos']), 3)
+
+    summary = ospsurvey.remote.summary(report)
+    self.assertEqual(summary['status'],
+                     {'ok': 1, 'partial': 1, 'timeout': 1, 'unreachable': 2})
+    self.assertEqual(summary['incomplete'], ['broken-3', 'down-1', 'none-4', 'slow-2'])
+
+  def test_bounded(self):
+    hosts = {"host-{}".format(i): "192.168.24.{}".format(i) for i in range(12)}
+    transport = FakeTransport(delay=0.01)
+    report = ospsurvey.remote.survey_hosts(hosts, transport, workers=3)
+
+    self.assertEqual(len(report), 12)
+    self.assertLessEqual(transport.most, 3)
+
+  def test_deadline(self):
+    transport = FakeTransport(delay=0.05)
+    result = ospsurvey.remote.survey_host('host-0', '192.168.24.8', transport,
+                                          timeout=0.12)
+    self.assertEqual(result['status'], 'timeout')
+    self.assertTrue(result['data'])
+
+
+class TestTransports(unittest.TestCase):
+
+  def test_local(self):
+    source = LocalTransport().source('localhost', time.time() + 5)
+    self.assertEqual(source(['echo', 'hello']), b"hello\n")
+    self.assertRaises(subprocess.CalledProcessError, source, ['sh', '-c', 'exit 3'])
+
+  def test_local_timeout(self):
+    source = LocalTransport().source('localhost', time.time() + 0.2)
+    start = time.time()
+    self.assertRaises(RemoteTimeout, source, ['sleep', '5'])
+    self.assertLess(time.time() - start, 2)
+    self.assertRaises(RemoteTimeout, source, ['true'])
+
+  def test_ssh_command(self):
+    transport = SshTransport(options=['-p', '2222'])
+    try:
+      command = ['sudo', 'yum', 'repoinfo', "it's; $(id)"]
+      argv = transport.command('192.168.24.8', command)
+      self.assertEqual(argv[0], 'ssh')
+      self.assertIn('ControlMaster=auto', argv)
+      self.assertEqual(argv[-4:-1], ['2222', 'heat-admin@192.168.24.8', '--'])
+      # the remote shell gets the arguments back as they were
+      self.assertEqual(subprocess.check_output(['sh', '-c', 'printf "%s\\n" ' + argv[-1]]),
+                       "\n".join(command).encode('utf-8') + b"\n")
+      self.assertRaises(RemoteError, transport.check, '192.168.24.8', 255, b"refused")
+    finally:
+      transport.close()
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Test recording and replaying query answers and the synthetic cloud
+"""
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import ospsurvey.sources
+import ospsurvey.sources.replay
+import ospsurvey.sources.synthetic
+
+
+class TestReplaySource(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def answer(self, command):
+    if command[1] == 'fail':
+      raise subprocess.CalledProcessError(2, command, b'it failed')
+    return json.dumps(command).encode('utf-8')
+
+  def test_round_trip(self):
+    recorder = ospsurvey.sources.replay.RecordingSource(self.directory, self.answer)
+    command = "openstack server list --long -f json".split()
+    self.assertEqual(recorder(command), self.answer(command))
+    self.assertRaises(subprocess.CalledProcessError, recorder,
+                      "openstack fail".split())
+
+    replay = ospsurvey.sources.select_source(replay=self.directory)
+    self.assertEqual(replay(command), self.answer(command))
+    try:
+      replay("openstack fail".split())
+      self.fail("the recorded failure was not replayed")
+    except subprocess.CalledProcessError as e:
+      self.assertEqual(e.returncode, 2)
+      self.assertEqual(e.output, b'it failed')
+
+  def test_missing(self):
+    replay = ospsurvey.sources.replay.ReplaySource(self.directory)
+    self.assertRaises(ospsurvey.sources.replay.ReplayError, replay,
+                      "openstack stack list".split())
+
+  def test_fixture_name(self):
+    self.assertEqual(
+      ospsurvey.sources.replay.fixture_name(
+        "openstack endpoint list --interface public -f json".split()),
+      "openstack_endpoint_list_--interface_public_-f_json")
+
+
+class TestSyntheticCloud(unittest.TestCase):
+
+  def setUp(self):
+    self.cloud = ospsurvey.sources.synthetic.SyntheticCloud(
+      nodes=200, servers=250, endpoints=100, untagged=5)
+
+  def query(self, command):
+    return json.loads(self.cloud(command.split()))
+
+  def test_sizes(self):
+    self.assertEqual(len(self.query("openstack baremetal node list --long -f json")), 200)
+    self.assertEqual(len(self.query("openstack server list --long -f json")), 250)
+    self.assertEqual(len(self.query("openstack endpoint list -f json")), 100)
+    self.assertEqual(
+      len(self.query("openstack endpoint list -f json --interface admin")), 34)
+
+  def test_consistent(self):
+    """
+    Every deployed node has a server and every tag matches one role hint
+    """
+    nodes = self.query("openstack baremetal node list --long -f json")
+    servers = {s['ID']:s for s in self.query("openstack server list --long -f json")}
+    environment = self.query("openstack stack environment show -f json overcloud")
+
+    patterns = [v['capabilities:node'].replace('%index%', r'\d+$')
+                for (k, v) in environment['parameter_defaults'].items()
+                if k.endswith('SchedulerHints')]
+
+    tags = set()
+    for node in nodes:
+      self.assertIn(node['Instance UUID'], servers)
+      capabilities = dict(
+        c.split(':') for c in node['Properties']['capabilities'].split(','))
+      if 'node' not in capabilities:
+        continue
+      tags.add(capabilities['node'])
+      self.assertEqual(
+        len([p for p in patterns if re.match(p, capabilities['node'])]), 1)
+
+    self.assertEqual(len(tags), 195)
+    self.assertEqual(
+      environment['parameter_defaults']['ControllerCount'], 3)
+
+  def test_repeatable(self):
+    other = ospsurvey.sources.synthetic.SyntheticCloud(
+      nodes=200, servers=250, endpoints=100, untagged=5)
+    command = "openstack baremetal node list --long -f json".split()
+    self.assertEqual(self.cloud(command), other(command))
+
+  def test_show_and_columns(self):
+    node = self.query("openstack baremetal node show -f json node-00003")
+    self.assertEqual(node['name'], 'node-00003')
+
+    servers = self.query("openstack server list -c ID -c Name -f json")
+    self.assertEqual(sorted(servers[0].keys()), ['ID', 'Name'])
+
+    self.assertRaises(ValueError, self.cloud, "openstack network list".split())
+
+  def test_volumes(self):
+    cloud = ospsurvey.sources.synthetic.SyntheticCloud(nodes=4, volumes=6)
+    volumes = json.loads(cloud("openstack volume list --long -f json".split()))
+    self.assertEqual(len(volumes), 6)
+
+    server = volumes[4]['Attached to'][0]['server_id']
+    show = json.loads(cloud("openstack server show -f json {}".format(server).split()))
+    self.assertEqual([v['id'] for v in show['volumes_attached']],
+                     [volumes[0]['ID'], volumes[4]['ID']])
+    self.assertEqual(self.query("openstack volume list -f json"), [])
+
+  def test_fixtures(self):
+    directory = tempfile.mkdtemp()
+    try:
+      self.cloud.write_fixtures(directory)
+      replay = ospsurvey.sources.replay.ReplaySource(directory)
+      command = "openstack server list --long --format json".split()
+      self.assertEqual(json.loads(replay(command)), json.loads(self.cloud(command)))
+      for command in ["openstack volume list --all-projects --long --format json",
+                      "openstack server list --all-projects --project {} --format json".format(
+                        self.cloud.projects[1]['ID'])]:
+        self.assertEqual(json.loads(replay(command.split())),
+                         json.loads(self.cloud(command.split())))
+    finally:
+      shutil.rmtree(directory)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Test the installed package inventory and its cache
+"""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import ospsurvey.cache
+import ospsurvey.probes.rpm
+
+class FakeRpm(object):
+  """
+  A source_fn that answers with saved rpm -qa output and counts the queries
+  """
+  def __init__(self):
+    self.output = open('tests/data/rpm-qa').read()
+    self.commands = []
+
+  def __call__(self, command):
+    self.commands.append(command)
+    return self.output
+
+
+class TestPackages(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.database = os.path.join(self.directory, 'Packages')
+    self.version_file = os.path.join(self.directory, 'version')
+    self.cache = ospsurvey.cache.DiskCache(os.path.join(self.directory, 'cache'))
+    self.source = FakeRpm()
+
+    with open(self.database, 'w') as f:
+      f.write('rpmdb')
+    os.utime(self.database, (1000, 1000))
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def list_packages(self, **kwargs):
+    return ospsurvey.probes.rpm.list_packages(
+      source_fn=self.source, databases=[self.database],
+      version_file=self.version_file, **kwargs)
+
+  def test_parse(self):
+    packages = self.list_packages()
+
+    self.assertEqual(len(packages), 6)
+    self.assertEqual([p['name'] for p in packages[:3]], ['gpg-pubkey', 'kernel', 'kernel'])
+    self.assertEqual(packages[4], {
+      'name': 'openssl-libs', 'epoch': '1', 'version': '1.0.2k',
+      'release': '19.el7', 'arch': 'x86_64', 'installtime': 1579000010})
+    self.assertEqual(self.source.commands[0][:3], ['rpm', '-qa', '--queryformat'])
+
+  def test_rpmdb_version(self):
+    version = lambda: ospsurvey.probes.rpm.rpmdb_version([self.database], self.version_file)
+
+    # no yum version: the database file stands for it
+    self.assertTrue(version().startswith(self.database))
+    with open(self.version_file, 'w') as f:
+      f.write("1209:f9d7dd8d1a5b709ebaa88fca24391194bd1bff7d\n")
+    self.assertEqual(version(), "1209:f9d7dd8d1a5b709ebaa88fca24391194bd1bff7d")
+
+    # rpm changed the database after yum wrote its version
+    os.utime(self.database, (time.time() + 10, time.time() + 10))
+    self.assertTrue(version().startswith(self.database))
+
+    self.assertIsNone(ospsurvey.probes.rpm.rpmdb_version(
+      [os.path.join(self.directory, 'missing')], self.version_file))
+
+  def test_cache(self):
+    first = self.list_packages(cache=self.cache)
+    self.assertEqual(self.list_packages(cache=self.cache), first)
+    self.assertEqual(len(self.source.commands), 1)
+
+    self.list_packages(cache=self.cache, refresh=True)
+    self.assertEqual(len(self.source.commands), 2)
+
+    # a change to the package set is a new key
+    with open(self.database, 'a') as f:
+      f.write('more')
+    self.list_packages(cache=self.cache)
+    self.assertEqual(len(self.source.commands), 3)
+    self.list_packages(cache=self.cache)
+    self.assertEqual(len(self.source.commands), 3)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Test concurrent probe execution
+"""
+import time
+import unittest
+
+import ospsurvey.scheduler
+
+
+def slow_probe(value, delay=0.2):
+  def probe():
+    time.sleep(delay)
+    return value
+  return probe
+
+def failing_probe():
+  raise RuntimeError("no such service")
+
+
+class TestRunProbes(unittest.TestCase):
+
+  def test_concurrent(self):
+    """
+    Independent probes take about as long as the slowest one
+    """
+    probes = {name:slow_probe(name) for name in
+              ('services', 'endpoints', 'servers', 'nodes', 'stacks')}
+
+    start = time.time()
+    results = ospsurvey.scheduler.run_probes(probes, workers=5)
+    elapsed = time.time() - start
+
+    self.assertLess(elapsed, 0.6)
+    self.assertEqual({k:r.value for (k,r) in results.items()},
+                     {k:k for k in probes})
+
+  def test_bounded(self):
+    """
+    No more than the requested number of probes run at once
+    """
+    probes = {str(i):slow_probe(i, 0.1) for i in range(4)}
+
+    start = time.time()
+    ospsurvey.scheduler.run_probes(probes, workers=2)
+    self.assertGreaterEqual(time.time() - start, 0.2)
+
+  def test_errors(self):
+    """
+    A failed probe is reported without losing the other results
+    """
+    results = ospsurvey.scheduler.run_probes(
+      {'good': slow_probe(1, 0), 'bad': failing_probe})
+
+    self.assertEqual(results['good'].value, 1)
+    self.assertIsNone(results['good'].error)
+    self.assertIsInstance(results['bad'].error, RuntimeError)
+    self.assertEqual([r.name for r in ospsurvey.scheduler.failures(results)],
+                     ['bad'])
+
+class TestRunGraph(unittest.TestCase):
+
+  def probes(self):
+    Probe = ospsurvey.scheduler.Probe
+    return [
+      Probe('stacks', slow_probe(['overcloud'], 0.2)),
+      Probe('environment', lambda stacks: {'stack': stacks[0]}, ['stacks']),
+      Probe('nodes', slow_probe(['node-0'], 0.1)),
+      Probe('roles', lambda environment, nodes: (environment['stack'], nodes),
+            ['environment', 'nodes'])
+    ]
+
+  def test_inputs(self):
+    """
+    Each probe is called with the values of its inputs
+    """
+    results = ospsurvey.scheduler.run_graph(self.probes())
+    self.assertEqual(results['roles'].value, ('overcloud', ['node-0']))
+
+    # independent branches run at the same time
+    self.assertLess(results['nodes'].start, results['stacks'].duration)
+    # and dependents start once their inputs finish
+    self.assertGreaterEqual(results['environment'].start,
+                            results['stacks'].start + results['stacks'].duration)
+
+  def test_targets(self):
+    """
+    Only the target probes and their inputs are run
+    """
+    results = ospsurvey.scheduler.run_graph(self.probes(),
+                                            targets=['environment'])
+    self.assertEqual(sorted(results.keys()), ['environment', 'stacks'])
+
+  def test_failed_input(self):
+    """
+    A probe whose input failed is skipped
+    """
+    Probe = ospsurvey.scheduler.Probe
+    results = ospsurvey.scheduler.run_graph([
+      Probe('stacks', failing_probe),
+      Probe('environment', lambda stacks: stacks, ['stacks'])
+    ])
+
+    self.assertIsInstance(results['environment'].error,
+                          ospsurvey.scheduler.DependencyError)
+    report = ospsurvey.scheduler.timing_report(results)
+    self.assertEqual(report['probes']['stacks']['status'], 'failed')
+    self.assertEqual(report['probes']['environment']['status'], 'skipped')
+
+  def test_invalid_graph(self):
+    Probe = ospsurvey.scheduler.Probe
+    self.assertRaises(ValueError, ospsurvey.scheduler.run_graph,
+                      [Probe('a', lambda b: b, ['b'])])
+    self.assertRaises(ValueError, ospsurvey.scheduler.run_graph,
+                      [Probe('a', lambda b: b, ['b']),
+                       Probe('b', lambda a: a, ['a'])])
+
+  def test_critical_path(self):
+    """
+    The critical path follows the slowest chain of inputs
+    """
+    results = ospsurvey.scheduler.run_graph(self.probes())
+    report = ospsurvey.scheduler.timing_report(results)
+
+    self.assertEqual(report['critical_path'], ['stacks', 'environment', 'roles'])
+    self.assertEqual(sorted(report['probes'].keys()),
+                     ['environment', 'nodes', 'roles', 'stacks'])
+    self.assertGreaterEqual(report['elapsed'], 0.2)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Test the bulk server-volumes collection against a synthetic cloud
+"""
+import argparse
+import json
+import os
+import unittest
+
+import ospsurvey.scheduler
+from ospsurvey.sources.synthetic import SyntheticCloud
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      '..', 'bin', 'server-volumes')
+
+def load_script(path, name):
+  """
+  Import a script with no .py extension as a module
+  """
+  try:
+    import importlib.machinery
+    import importlib.util
+    loader = importlib.machinery.SourceFileLoader(name, path)
+    spec = importlib.util.spec_from_loader(name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+  except ImportError:
+    import imp
+    return imp.load_source(name, path)
+
+server_volumes = load_script(script, 'server_volumes')
+
+
+class CountingCloud(SyntheticCloud):
+  """
+  A synthetic cloud that records the queries made to it
+  """
+  def __init__(self, *args, **kwargs):
+    SyntheticCloud.__init__(self, *args, **kwargs)
+    self.commands = []
+
+  def __call__(self, command):
+    self.commands.append(" ".join(command))
+    return SyntheticCloud.__call__(self, command)
+
+  def count(self, prefix):
+    return len([c for c in self.commands if c.startswith(prefix)])
+
+
+class TestBulk(unittest.TestCase):
+
+  def setUp(self):
+    self.cloud = CountingCloud(nodes=6, servers=8, volumes=10, projects=3)
+
+  def survey(self, bulk, detail_fields=None, source_fn=None):
+    opts = argparse.Namespace(bulk=bulk, detail_fields=detail_fields, workers=4)
+    results = ospsurvey.scheduler.run_graph(
+      server_volumes.survey_probes(opts, source_fn or self.cloud))
+    self.assertEqual(ospsurvey.scheduler.failures(results), [])
+    return results['servers'].value
+
+  def test_same_grouping(self):
+    """
+    The servers are grouped by project as the per-project queries group them
+    """
+    today = self.survey(False)
+    bulk = self.survey(True)
+
+    ids = lambda report: {p:sorted(s['id'] for s in servers)
+                          for (p, servers) in report.items()}
+    self.assertEqual(ids(bulk), ids(today))
+    self.assertEqual(len(bulk['admin']), 8)
+
+    volumes = lambda report: {s['id']:s['volumes_attached']
+                              for servers in report.values() for s in servers}
+    self.assertEqual(volumes(bulk), volumes(today))
+
+  def test_all_details(self):
+    """
+    With every detail field the records hold everything server show gives
+    """
+    today = {s['id']:s for s in self.survey(False)['admin']}
+    for server in self.survey(True, ['all'])['admin']:
+      show = today[server['id']]
+      self.assertEqual({k:server[k] for k in show}, show)
+
+  def test_attachments(self):
+    """
+    The attachments come from the one volume list, with no server show
+    """
+    servers = self.survey(True)['admin']
+
+    self.assertEqual(self.cloud.count("openstack volume list"), 1)
+    self.assertEqual(self.cloud.count("openstack server show"), 0)
+    self.assertEqual(sum(len(s['volumes_attached']) for s in servers), 10)
+    self.assertEqual(len(servers[0]['volumes_attached']), 2)
+
+  def test_attached_to_text(self):
+    """
+    Older clients name the server in an "Attached to" string
+    """
+    servers = {'1': {'name': 'web', 'id': '1'}, '2': {'name': 'db', 'id': '2'}}
+    volumes = [{'ID': 'v1', 'Attached to': "Attached to web on /dev/vdb "},
+               {'ID': 'v2', 'Attached to': "Attached to 2 on /dev/vdc "},
+               {'ID': 'v3', 'Attached to': ""}]
+    server_volumes.add_server_volumes(servers, lambda command: json.dumps(volumes))
+
+    self.assertEqual(servers['1']['volumes_attached'], [{'id': 'v1'}])
+    self.assertEqual(servers['2']['volumes_attached'], [{'id': 'v2'}])
+
+  def test_once_each(self):
+    """
+    A server the listing repeats is reported and queried once
+    """
+    def source_fn(command):
+      output = self.cloud(command)
+      if command == "openstack server list --all-projects --long --format json".split():
+        rows = json.loads(output)
+        output = json.dumps(rows + rows[:3])
+      return output
+
+    servers = self.survey(True, ['image'], source_fn)['admin']
+
+    self.assertEqual(len(servers), 8)
+    self.assertEqual(len(set(s['id'] for s in servers)), 8)
+    self.assertEqual(self.cloud.count("openstack server show"), 8)
+    # the listing has only the image name, so the show value is queried
+    self.assertTrue(all(s['image'].endswith(')') for s in servers))
+
+if __name__ == "__main__":
+  unittest.main()
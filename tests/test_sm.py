@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Test the subscription-manager probes against saved command output
+"""
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import ospsurvey.cache
+import ospsurvey.probes.sm
+
+def chunked_source(filename, size):
+  """
+  A stream_fn that gives the saved output of any command in chunks
+  """
+  data = open(filename, 'rb').read()
+  return lambda command: (data[i:i + size] for i in range(0, len(data), size))
+
+
+class TestSmRecords(unittest.TestCase):
+
+  def test_repos(self):
+    sm = ospsurvey.probes.sm.SubscriptionManager(
+      stream_fn=chunked_source('tests/data/sm-repos', 4096))
+    repos = sm.repos()
+
+    self.assertEqual(sorted(repos.keys()), [
+      'rhel-7-server-extras-rpms', 'rhel-7-server-openstack-13-rpms',
+      'rhel-7-server-rpms'])
+    self.assertEqual(repos['rhel-7-server-rpms'], {
+      'Repo Name': 'Red Hat Enterprise Linux 7 Server (RPMs)',
+      'Repo URL': 'https://cdn.redhat.com/content/dist/rhel/server/7/$releasever/$basearch/os',
+      'Enabled': '1'})
+
+  def test_consumed(self):
+    sm = ospsurvey.probes.sm.SubscriptionManager(
+      stream_fn=chunked_source('tests/data/sm-consumed', 4096))
+    consumed = sm.consumed()
+
+    self.assertEqual(len(consumed), 2)
+    openstack = consumed[
+      'Red Hat OpenStack Platform, Standard Support (4 Sockets, NFR, Partner Only)']
+    self.assertEqual(len(openstack['Provides']), 4)
+    self.assertEqual(openstack['Provides'][3], 'Red Hat Enterprise Linux Server')
+    self.assertEqual(openstack['Pool ID'], '8a85f98c60c2c2b40160c32447481b48')
+    # a record at the end of the output with no blank line after it
+    self.assertEqual(
+      consumed['Red Hat Enterprise Linux Server, Standard (Physical or Virtual Nodes)']['Ends'],
+      '01/08/2021')
+
+  def test_chunk_boundaries(self):
+    expected = ospsurvey.probes.sm.SubscriptionManager(
+      stream_fn=chunked_source('tests/data/sm-consumed', 4096)).consumed()
+    for size in (1, 7, 100):
+      sm = ospsurvey.probes.sm.SubscriptionManager(
+        stream_fn=chunked_source('tests/data/sm-consumed', size))
+      self.assertEqual(sm.consumed(), expected)
+
+  def test_parse_sm_record(self):
+    lines = open('tests/data/sm-repos').read().split('\n')[3:8]
+    (title, record) = ospsurvey.probes.sm.parse_sm_record(lines)
+    self.assertEqual(title, 'rhel-7-server-openstack-13-rpms')
+    self.assertEqual(record['Enabled'], '1')
+
+  def test_empty(self):
+    sm = ospsurvey.probes.sm.SubscriptionManager(stream_fn=lambda command: [])
+    self.assertEqual(sm.repos(), {})
+    self.assertEqual(sm.consumed(), {})
+
+
+class TestSmConfig(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.rhsm_conf = os.path.join(self.directory, 'rhsm.conf')
+    with open(self.rhsm_conf, 'w') as f:
+      f.write("[server]\nhostname = subscription.rhsm.redhat.com\n")
+    self.cache = ospsurvey.cache.DiskCache(os.path.join(self.directory, 'cache'))
+    self.commands = []
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def stream_fn(self, command):
+    self.commands.append(command)
+    return chunked_source('tests/data/sm-config', 100)(command)
+
+  def sm(self):
+    return ospsurvey.probes.sm.SubscriptionManager(
+      stream_fn=self.stream_fn, cache=self.cache, rhsm_conf=self.rhsm_conf)
+
+  def test_parse(self):
+    config = ospsurvey.probes.sm.SubscriptionManager(stream_fn=self.stream_fn).config()
+
+    self.assertEqual(sorted(config.keys()), ['logging', 'rhsm', 'rhsmcertd', 'server'])
+    self.assertEqual(config['server']['hostname'], 'subscription.rhsm.redhat.com')
+    self.assertEqual(config['server']['proxy_hostname'], 'proxy.example.com')
+    self.assertEqual(config['server']['proxy_password'], 'default')
+    self.assertEqual(config['rhsm']['baseurl'], 'https://satellite.example.com/pulp/repos')
+    self.assertEqual(len(config['server']), 11)
+
+  def test_cache(self):
+    config = self.sm().config()
+    self.assertEqual(self.sm().config(), config)
+    self.assertEqual(len(self.commands), 1)
+
+    # a change to rhsm.conf is a new answer
+    with open(self.rhsm_conf, 'a') as f:
+      f.write("insecure = 1\n")
+    self.sm().config()
+    self.assertEqual(len(self.commands), 2)
+
+    self.sm().config(refresh=True)
+    self.assertEqual(len(self.commands), 3)
+
+class TestEntitlements(unittest.TestCase):
+
+  directory = 'tests/data/entitlement'
+
+  def setUp(self):
+    self.commands = []
+
+  def stream_fn(self, command):
+    self.commands.append(command)
+    return chunked_source('tests/data/sm-consumed', 4096)(command)
+
+  def test_same_as_live(self):
+    """
+    The certificates give the fields of the live records that they hold
+    """
+    live = ospsurvey.probes.sm.SubscriptionManager(stream_fn=self.stream_fn).consumed()
+    local = ospsurvey.probes.sm.read_entitlements(
+      self.directory, now=datetime.datetime(2019, 6, 1))
+
+    self.assertEqual(sorted(local.keys()), sorted(live.keys()))
+    for (title, record) in local.items():
+      self.assertEqual(record, {k: live[title][k] for k in record})
+      self.assertEqual(len(record), 13)
+
+  def test_active(self):
+    local = ospsurvey.probes.sm.read_entitlements(
+      self.directory, now=datetime.datetime(2021, 1, 9, 5))
+    self.assertEqual([r['Active'] for r in local.values()], ['False', 'False'])
+
+  def test_local(self):
+    sm = ospsurvey.probes.sm.SubscriptionManager(
+      stream_fn=self.stream_fn, entitlement_directory=self.directory)
+    self.assertEqual(len(sm.consumed(local=True)), 2)
+    self.assertEqual(self.commands, [])
+
+  def test_time(self):
+    entitlement_time = ospsurvey.probes.sm.entitlement_time
+    self.assertEqual(entitlement_time('2020-01-01T05:00:00.000+0100'),
+                     datetime.datetime(2020, 1, 1, 4))
+    self.assertEqual(entitlement_time('2020-01-01T05:00:00Z'),
+                     datetime.datetime(2020, 1, 1, 5))
+    self.assertRaises(ValueError, entitlement_time, '2020-01-01')
+
+  def test_fallback(self):
+    directory = tempfile.mkdtemp()
+    try:
+      # no certificates
+      sm = ospsurvey.probes.sm.SubscriptionManager(
+        stream_fn=self.stream_fn, entitlement_directory=directory)
+      self.assertEqual(len(sm.consumed(local=True)), 2)
+      self.assertEqual(len(self.commands), 1)
+
+      # a certificate with no entitlement data
+      for name in os.listdir(self.directory):
+        shutil.copy(os.path.join(self.directory, name), directory)
+      with open(os.path.join(directory, '1234.pem'), 'w') as f:
+        f.write("-----BEGIN CERTIFICATE-----\n-----END CERTIFICATE-----\n")
+      self.assertIsNone(ospsurvey.probes.sm.read_entitlements(directory))
+      self.assertEqual(len(sm.consumed(refresh=True, local=True)), 2)
+      self.assertEqual(len(self.commands), 2)
+    finally:
+      shutil.rmtree(directory)
+
+if __name__ == "__main__":
+  unittest.main()
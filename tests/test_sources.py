@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""
+Test the sources that answer probe queries without forking the openstack CLI
+"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import ospsurvey.sources
+import ospsurvey.sources.api
+import ospsurvey.sources.oscworker
+import ospsurvey.sources.shell
+
+fake_openstack = [sys.executable,
+                  os.path.join(os.path.dirname(__file__), 'data', 'fake-openstack')]
+
+
+class FakeResponse(object):
+
+  def __init__(self, body):
+    self._body = body
+
+  def json(self):
+    return self._body
+
+
+class FakeSession(object):
+  """
+  Answer GET requests from a table of (service_type, path) -> body
+  """
+  def __init__(self, responses):
+    self.responses = responses
+    self.requests = []
+
+  def get(self, path, endpoint_filter=None, headers=None):
+    self.requests.append((endpoint_filter['service_type'], path))
+    return FakeResponse(self.responses[(endpoint_filter['service_type'], path)])
+
+
+services = [
+  {'id': 'c1cd', 'name': 'nova', 'type': 'compute',
+   'description': 'Openstack Compute Service', 'enabled': True, 'links': {}},
+  {'id': '180c', 'name': 'keystone', 'type': 'identity',
+   'description': 'OpenStack Identity Service', 'enabled': True, 'links': {}}
+]
+
+endpoints = [
+  {'id': 'e001', 'region_id': 'regionOne', 'service_id': 'c1cd',
+   'interface': 'admin', 'url': 'http://192.168.24.1:8774/v2.1',
+   'enabled': True}
+]
+
+
+class TestApiSource(unittest.TestCase):
+
+  def setUp(self):
+    self.session = FakeSession({
+      ('identity', '/services'): {'services': services},
+      ('identity', '/endpoints?interface=admin'): {'endpoints': endpoints},
+      ('baremetal', '/v1/nodes/detail'): {
+        'nodes': [{'uuid': 'n1', 'name': 'node-1', 'instance_uuid': 's1',
+                   'provision_state': 'active', 'links': []}],
+        'next': 'http://192.168.24.1:6385/v1/nodes/detail?marker=n1'},
+      ('baremetal', 'http://192.168.24.1:6385/v1/nodes/detail?marker=n1'): {
+        'nodes': [{'uuid': 'n2', 'name': 'node-2', 'instance_uuid': None,
+                   'provision_state': 'available', 'links': []}]}
+    })
+    self.fallback_calls = []
+    self.source = ospsurvey.sources.api.ApiSource(
+      self.session, fallback_fn=self.fallback)
+
+  def fallback(self, command):
+    self.fallback_calls.append(command)
+    return "[]"
+
+  def test_service_list(self):
+    """
+    The API answer has the same labels as openstack service list --long
+    """
+    s = json.loads(
+      self.source("openstack service list --long --format json".split()))
+
+    self.assertEqual(len(s), 2)
+    self.assertEqual(
+      sorted(s[0].keys()), ['Description', 'Enabled', 'ID', 'Name', 'Type'])
+    self.assertEqual(self.fallback_calls, [])
+
+  def test_service_show(self):
+    s = json.loads(
+      self.source("openstack service show --format json nova".split()))
+    self.assertEqual(s['id'], 'c1cd')
+    self.assertNotIn('links', s)
+
+  def test_endpoint_list(self):
+    """
+    Endpoint records are joined to their service name and type
+    """
+    e = json.loads(self.source(
+      "openstack endpoint list --format json --interface admin".split()))
+
+    self.assertEqual(len(e), 1)
+    self.assertEqual(e[0]['Service Name'], 'nova')
+    self.assertEqual(e[0]['Service Type'], 'compute')
+    self.assertEqual(e[0]['Interface'], 'admin')
+
+  def test_node_list_pages(self):
+    """
+    All pages are collected and the fields are given CLI labels
+    """
+    n = json.loads(self.source(
+      "openstack baremetal node list --long --format json".split()))
+
+    self.assertEqual([r['UUID'] for r in n], ['n1', 'n2'])
+    self.assertEqual(n[0]['Instance UUID'], 's1')
+    self.assertEqual(n[0]['Provisioning State'], 'active')
+    self.assertNotIn('Links', n[0])
+
+  def test_fallback(self):
+    """
+    Queries without an API equivalent are passed on to the CLI
+    """
+    command = "openstack project list -f json".split()
+    self.source(command)
+    self.assertEqual(self.fallback_calls, [command])
+
+    command = "openstack server list -c Name -f json".split()
+    self.source(command)
+    self.assertEqual(self.fallback_calls[-1], command)
+
+
+class TestShellSource(unittest.TestCase):
+
+  def setUp(self):
+    self.source = ospsurvey.sources.shell.ShellSource(
+      command=fake_openstack, timeout=5)
+
+  def tearDown(self):
+    self.source.close()
+
+  def test_one_process(self):
+    """
+    Every query goes to the same client process
+    """
+    pids = [self.source("openstack pid".split()) for i in range(3)]
+    self.assertEqual(len(set(pids)), 1)
+
+  def test_query(self):
+    s = json.loads(
+      self.source("openstack service list --long --format json".split()))
+    self.assertEqual(len(s), 13)
+
+  def test_error(self):
+    """
+    A failed command raises the same error as check_output
+    """
+    self.assertRaises(subprocess.CalledProcessError,
+                      self.source, "openstack fail".split())
+    # and the process is still usable
+    self.assertEqual(self.source("openstack sleep 0".split()), b"[]")
+
+  def test_timeout(self):
+    self.source.timeout = 0.5
+    self.assertRaises(ospsurvey.sources.shell.ShellTimeout,
+                      self.source, "openstack sleep 5".split())
+
+    # the next query starts a new process
+    self.source.timeout = 5
+    self.assertEqual(self.source("openstack sleep 0".split()), b"[]")
+
+  def test_restart(self):
+    """
+    The process is restarted if it dies between queries
+    """
+    pid = self.source("openstack pid".split())
+    self.source._process.kill()
+    self.source._process.wait()
+    self.assertNotEqual(self.source("openstack pid".split()), pid)
+
+  def test_crash(self):
+    """
+    A query that kills the process fails after the retries are used up
+    """
+    self.assertRaises(ospsurvey.sources.shell.ShellError,
+                      self.source, "openstack crash".split())
+
+  def test_fallback(self):
+    calls = []
+    self.source.fallback_fn = lambda c: calls.append(c)
+    self.source("sudo yum repolist".split())
+    self.assertEqual(calls, [["sudo", "yum", "repolist"]])
+
+
+class FailingApp(object):
+  """
+  An openstackclient shell whose commands all raise
+  """
+  def run_subcommand(self, argv):
+    raise RuntimeError("no such command: {}".format(" ".join(argv)))
+
+
+class TestShellWorker(unittest.TestCase):
+
+  def test_exception(self):
+    """
+    A command that raises is answered with the error text
+    """
+    (returncode, output) = ospsurvey.sources.oscworker.run_command(
+      FailingApp(), ["bogus"])
+    self.assertEqual(returncode, 1)
+    self.assertIn("no such command: bogus", output)
+
+
+class TestSelectSource(unittest.TestCase):
+
+  def test_cli(self):
+    self.assertIs(ospsurvey.sources.select_source('cli'),
+                  subprocess.check_output)
+
+  def test_invalid(self):
+    self.assertRaises(ValueError, ospsurvey.sources.select_source, 'bogus')
+
+if __name__ == "__main__":
+  unittest.main()
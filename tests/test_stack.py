@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Test the node tag to role resolution from the stack scheduler hints
+"""
+from collections import namedtuple
+import re
+import unittest
+
+import ospsurvey.probes.nodes
+import ospsurvey.probes.stack
+from ospsurvey.probes.stack import AmbiguousHintError, RoleMatcher
+from ospsurvey.sources.synthetic import SyntheticCloud
+
+Node = namedtuple('Node', ['name', 'properties'])
+
+
+class TestRoleMatcher(unittest.TestCase):
+
+  hints = {'Controller': 'controller-%index%',
+           'Compute': 'compute-%index%',
+           'Storage1': 'storage1%index%'}
+
+  def test_role(self):
+    matcher = RoleMatcher(self.hints)
+
+    self.assertEqual(matcher.role('controller-0'), 'Controller')
+    self.assertEqual(matcher.role('compute-123'), 'Compute')
+    # The stem may itself end in digits
+    self.assertEqual(matcher.role('storage107'), 'Storage1')
+
+    for tag in ('controller-', 'controller-0a', 'xcompute-1', 'storage2', ''):
+      self.assertIsNone(matcher.role(tag))
+
+  def test_same_as_patterns(self):
+    """
+    The matcher agrees with the old hint regular expressions
+    """
+    cloud = SyntheticCloud(nodes=60, untagged=3)
+    environment = ospsurvey.probes.stack.get_environment('overcloud', source_fn=cloud)
+    nodes = ospsurvey.probes.nodes.list_nodes(source_fn=cloud)
+    matcher = ospsurvey.probes.stack.role_matcher(environment)
+
+    patterns = ospsurvey.probes.stack.hint_map(environment)
+    for node in nodes:
+      tag = node.properties['capabilities'].get('node')
+      expected = [r for (p, r) in patterns.items() if tag and re.match(p, tag)]
+      self.assertEqual(matcher.node_role(node), (expected or [None])[0])
+
+  def test_untagged(self):
+    matcher = RoleMatcher(self.hints)
+    node = Node('n', {'capabilities': {'boot_option': 'local'}})
+    self.assertIsNone(matcher.node_role(node))
+
+  def test_regex_hints(self):
+    matcher = RoleMatcher({'Edge': 'edge-(a|b)-%index%', 'Fixed': 'fixed-0'})
+
+    self.assertEqual(matcher.role('edge-b-4'), 'Edge')
+    self.assertEqual(matcher.role('fixed-0'), 'Fixed')
+    self.assertIsNone(matcher.role('fixed-01'))
+
+  def test_ambiguous(self):
+    self.assertRaises(AmbiguousHintError, RoleMatcher,
+                      {'A': 'compute-%index%', 'B': 'compute-%index%'})
+    self.assertRaises(AmbiguousHintError, RoleMatcher,
+                      {'A': 'compute-%index%', 'B': 'compute-1%index%'})
+
+    # A regex hint that overlaps an indexed one is found when a tag matches both
+    matcher = RoleMatcher({'A': 'compute-%index%', 'B': 'comp.*'})
+    self.assertEqual(matcher.role('compact'), 'B')
+    self.assertRaises(AmbiguousHintError, matcher.role, 'compute-1')
+
+if __name__ == "__main__":
+  unittest.main()
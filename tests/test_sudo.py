@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Test the privileged helper without root, with stand-in host commands
+"""
+import io
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import ospsurvey.probes.sm
+import ospsurvey.probes.yum
+import ospsurvey.sources.sudo
+import ospsurvey.sources.sudoworker
+from ospsurvey.jsonstream import source_stream
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+top_dir = os.path.join(os.path.dirname(data_dir), '..')
+src_dir = os.path.join(top_dir, 'src')
+
+# Each stand-in answers from the saved output in tests/data
+fake_commands = {
+  'yum': """#!/bin/sh
+case "$1" in
+  repoinfo) cat {data}/yum-repoinfo ;;
+  repolist) seq 1 100000 ;;
+  history) echo "boom" >&2; exit 1 ;;
+esac
+""",
+  'subscription-manager': """#!/bin/sh
+case "$1" in
+  status) printf '+----------------+\\n   System Status Details\\n+----------------+\\nOverall Status: Current\\n\\nSystem Purpose Status: Not Specified\\n' ;;
+  repos) cat {data}/sm-repos ;;
+  list) cat {data}/sm-consumed ;;
+esac
+"""
+}
+
+
+class TestAllowed(unittest.TestCase):
+
+  def test_allowed(self):
+    allowed = ospsurvey.sources.sudo.allowed
+    self.assertTrue(allowed("yum repoinfo enabled".split()))
+    self.assertTrue(allowed("yum repoinfo rhel-7-server-rpms".split()))
+    self.assertTrue(allowed("yum updateinfo list cves".split()))
+    self.assertTrue(allowed("subscription-manager list --consumed".split()))
+    self.assertTrue(allowed([u'yum', u'history', u'info']))
+
+    self.assertFalse(allowed("yum install vim".split()))
+    self.assertFalse(allowed("yum repoinfo --setopt=x".split()))
+    self.assertFalse(allowed(["yum", "repoinfo", "a\n"]))
+    self.assertFalse(allowed("yum repoinfo a b".split()))
+    self.assertFalse(allowed("subscription-manager unregister".split()))
+    self.assertFalse(allowed(["sh", "-c", "id"]))
+    self.assertFalse(allowed(["sh", "-c", "yum shell"]))
+    self.assertFalse(allowed(["yum", "history", 1]))
+    self.assertFalse(allowed([]))
+
+  def test_worker_refuses(self):
+    stream = io.BytesIO()
+    returncode = ospsurvey.sources.sudoworker.run_command(
+      "yum install vim".split(), stream)
+    self.assertEqual(returncode, 126)
+    self.assertTrue(stream.getvalue().startswith(b"126 "))
+    self.assertEqual(
+      ospsurvey.sources.sudoworker.run_command({'yum': 'history'}, io.BytesIO()), 126)
+
+  def test_worker_command(self):
+    """
+    sudo runs the installed helper script, not the interpreter
+    """
+    self.assertEqual(ospsurvey.sources.sudo.worker_command(),
+                     ['sudo', ospsurvey.sources.sudo.helper_path])
+    self.assertEqual(ospsurvey.sources.sudo.worker_command(helper='/usr/libexec/helper'),
+                     ['sudo', '/usr/libexec/helper'])
+
+
+class TestSudoSource(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    for (name, script) in fake_commands.items():
+      path = os.path.join(self.directory, name)
+      with open(path, 'w') as f:
+        f.write(script.format(data=data_dir))
+      os.chmod(path, stat.S_IRWXU)
+
+    env = dict(os.environ)
+    env['PATH'] = self.directory + os.pathsep + env.get('PATH', '')
+    env['PYTHONPATH'] = os.path.abspath(src_dir)
+    self.fallback_calls = []
+    self.source = ospsurvey.sources.sudo.SudoSource(
+      unprivileged=True, timeout=10, env=env, fallback_fn=self.fallback)
+
+  def tearDown(self):
+    self.source.close()
+    shutil.rmtree(self.directory)
+
+  def fallback(self, command):
+    self.fallback_calls.append(command)
+    return b""
+
+  def test_probes(self):
+    """
+    The sm and yum probes run their commands through one helper process
+    """
+    yum = ospsurvey.probes.yum.Yum(
+      source_fn=lambda command: self.source(command).decode('utf-8'))
+    self.assertEqual(len(yum.repos()), 3)
+    pid = self.source._process.pid
+
+    sm = ospsurvey.probes.sm.SubscriptionManager(stream_fn=source_stream(self.source))
+    self.assertEqual(sm.status()['status'], 'Current')
+    self.assertEqual(len(sm.repos()), 3)
+    self.assertEqual(len(sm.consumed()), 2)
+    self.assertTrue(ospsurvey.probes.sm.SubscriptionManager.subscribed(self.source))
+
+    self.assertEqual(self.source._process.pid, pid)
+    self.assertEqual(self.fallback_calls, [])
+
+  def test_error(self):
+    """
+    A failed command raises the same error as check_output
+    """
+    with self.assertRaises(subprocess.CalledProcessError) as context:
+      self.source("sudo yum history info".split())
+    self.assertEqual(context.exception.returncode, 1)
+    self.assertEqual(context.exception.output, b"boom\n")
+
+  def test_stream(self):
+    """
+    The output comes back in chunks as the command writes it
+    """
+    chunks = list(self.source.stream("sudo yum repolist all".split()))
+    self.assertGreater(len(chunks), 1)
+    self.assertEqual(b"".join(chunks), subprocess.check_output(['seq', '1', '100000']))
+
+    # a reader that stops early leaves nothing behind for the next query
+    stream = self.source.stream("sudo yum repolist all".split())
+    next(stream)
+    stream.close()
+    self.assertEqual(len(self.source("sudo yum repoinfo enabled".split())),
+                     os.path.getsize(os.path.join(data_dir, 'yum-repoinfo')))
+
+    self.assertRaises(subprocess.CalledProcessError, list,
+                      self.source.stream("sudo yum history info".split()))
+    self.assertEqual(list(self.source.stream("sudo yum install vim".split())), [b""])
+
+  def test_fallback(self):
+    """
+    Commands that are not allowed never reach the helper
+    """
+    self.source("sudo yum install vim".split())
+    self.source("yum repoinfo enabled".split())
+    self.assertEqual(self.fallback_calls,
+                     [["sudo", "yum", "install", "vim"],
+                      ["yum", "repoinfo", "enabled"]])
+    self.assertIsNone(self.source._process)
+
+  @unittest.skipIf(os.geteuid() == 0, "running as root")
+  def test_needs_root(self):
+    returncode = subprocess.call(
+      [sys.executable, '-m', 'ospsurvey.sources.sudoworker'],
+      env=self.source.env, stderr=open(os.devnull, 'w'))
+    self.assertEqual(returncode, 1)
+
+  @unittest.skipIf(os.geteuid() == 0, "running as root")
+  def test_helper_script(self):
+    returncode = subprocess.call(
+      [sys.executable, os.path.join(top_dir, 'bin', 'ospsurvey-sudo-helper')],
+      env=self.source.env, stderr=open(os.devnull, 'w'))
+    self.assertEqual(returncode, 1)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+"""
+Test the yum probes against saved command output
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import ospsurvey.cache
+import ospsurvey.probes.software
+import ospsurvey.probes.yum
+
+class FakeYum(object):
+  """
+  A source_fn that answers every command with the same saved output and
+  records the commands
+  """
+  def __init__(self, filename):
+    self.output = open(filename).read()
+    self.commands = []
+
+  def __call__(self, command):
+    self.commands.append(" ".join(command))
+    return self.output
+
+
+class TestRepoInfo(unittest.TestCase):
+
+  def setUp(self):
+    self.source = FakeYum('tests/data/yum-repoinfo')
+
+  def test_parse(self):
+    repos = ospsurvey.probes.yum.parse_repoinfo(self.source.output)
+
+    self.assertEqual(list(repos.keys()), [
+      'rhel-7-server-extras-rpms', 'rhel-7-server-openstack-13-rpms',
+      'rhel-7-server-rpms'])
+    extras = repos['rhel-7-server-extras-rpms']
+    self.assertEqual(len(extras), 11)
+    self.assertEqual(extras['Repo-id'], 'rhel-7-server-extras-rpms/x86_64')
+    self.assertEqual(extras['Repo-revision'], '1579182014')
+    self.assertEqual(extras['Filter'], 'read-only:present')
+    self.assertEqual(extras['Repo-expire'],
+                     '86,400 second(s) (last: Wed Jan 22 07:56:33 2020)')
+
+  def test_repos_one_command(self):
+    """
+    All of the repos come from one yum run, whatever their number
+    """
+    yum = ospsurvey.probes.yum.Yum(source_fn=self.source)
+    repos = yum.repos()
+
+    self.assertEqual(len(repos), 3)
+    self.assertEqual(self.source.commands, ['sudo yum repoinfo enabled'])
+
+    # the answer is kept until a refresh
+    yum.repos()
+    yum.repos(refresh=True)
+    self.assertEqual(len(self.source.commands), 2)
+
+    self.assertRaises(ValueError, yum.repos, 'some')
+
+  def test_repo_info(self):
+    yum = ospsurvey.probes.yum.Yum(source_fn=self.source)
+    self.assertEqual(yum.repo_info('rhel-7-server-extras-rpms')['Repo-pkgs'], '1,252')
+
+  def test_get_repos(self):
+    repos = ospsurvey.probes.software.get_repos(source_fn=self.source)
+    self.assertEqual([r['Repo-pkgs'] for r in repos], ['1,252', '2,765', '27,128'])
+    self.assertEqual(self.source.commands, ['sudo yum repoinfo enabled'])
+
+
+class TestRepoFiles(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    for name in ('redhat.repo', 'local.repo', 'README'):
+      shutil.copy(os.path.join('tests/data/yum.repos.d', name), self.directory)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_selectors(self):
+    read = lambda selector: sorted(
+      ospsurvey.probes.yum.read_repo_files(self.directory, selector).keys())
+
+    self.assertEqual(read('enabled'), [
+      'local-mirror', 'rhel-7-server-openstack-13-rpms', 'rhel-7-server-rpms'])
+    self.assertEqual(read('disabled'), ['epel', 'rhel-7-server-debug-rpms'])
+    self.assertEqual(len(read('all')), 5)
+    self.assertRaises(ValueError, read, 'some')
+
+  def test_same_shape(self):
+    """
+    The repo files give the configured subset of the repoinfo keys
+    """
+    repos = ospsurvey.probes.yum.Yum(directory=self.directory).configured_repos()
+    repoinfo = ospsurvey.probes.yum.parse_repoinfo(
+      open('tests/data/yum-repoinfo').read())
+
+    rhel = repos['rhel-7-server-rpms']
+    self.assertTrue(set(rhel.keys()) <= set(repoinfo['rhel-7-server-rpms'].keys()))
+    self.assertEqual(rhel['Repo-name'], repoinfo['rhel-7-server-rpms']['Repo-name'])
+    self.assertEqual(rhel['Repo-status'], 'enabled')
+    self.assertEqual(rhel['Repo-filename'], os.path.join(self.directory, 'redhat.repo'))
+    self.assertEqual(repos['local-mirror']['Repo-baseurl'],
+                     'http://mirror1.example.com/rhel7/, http://mirror2.example.com/rhel7/')
+
+  def test_mtime_cache(self):
+    path = os.path.join(self.directory, 'local.repo')
+    first = ospsurvey.probes.yum.read_repo_file(path)
+    self.assertIs(ospsurvey.probes.yum.read_repo_file(path), first)
+
+    with open(path, 'a') as f:
+      f.write("\n[added]\nname=Added\nbaseurl=http://example.com/\n")
+    os.utime(path, (0, 0))
+    self.assertIn('added', ospsurvey.probes.yum.read_repo_file(path))
+
+  def test_refresh(self):
+    path = os.path.join(self.directory, 'local.repo')
+    first = ospsurvey.probes.yum.read_repo_file(path)
+    self.assertIsNot(ospsurvey.probes.yum.read_repo_file(path, refresh=True), first)
+
+  def test_vanished_file(self):
+    path = os.path.join(self.directory, 'gone.repo')
+    self.assertEqual(len(ospsurvey.probes.yum.read_repo_file(path)), 0)
+
+  def test_invalid_file(self):
+    path = os.path.join(self.directory, 'broken.repo')
+    with open(path, 'w') as f:
+      f.write("name=no section\n")
+    self.assertEqual(len(ospsurvey.probes.yum.read_repo_file(path)), 0)
+
+
+class TestHistory(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.database = os.path.join(self.directory, 'history-2020-01-14.sqlite')
+    connection = sqlite3.connect(self.database)
+    connection.executescript(open('tests/data/yum-history.sql').read())
+    connection.commit()
+    connection.close()
+    self.source = FakeYum('tests/data/yum-history-info')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_read_history(self):
+    history = ospsurvey.probes.yum.read_history(self.database)
+
+    self.assertEqual([h['Transaction ID'] for h in history], ['140', '141', '142', '143'])
+    update = history[0]
+    self.assertEqual(update['Begin time'], time.ctime(1579000000))
+    self.assertEqual(update['Command Line'], 'update openssl')
+    self.assertEqual(update['packages'], [
+      {'action': 'Dep-Install', 'package': 'make-1:3.82-24.el7.x86_64',
+       'repo': '@rhel-7-server-rpms'},
+      {'action': 'Updated', 'package': 'openssl-1:1.0.2k-16.el7.x86_64',
+       'repo': '@anaconda', 'new_version': 'openssl-1:1.0.2k-19.el7.x86_64'},
+      {'action': 'Updated', 'package': 'openssl-libs-1:1.0.2k-16.el7.x86_64',
+       'repo': '@anaconda', 'new_version': 'openssl-libs-1:1.0.2k-19.el7.x86_64'}])
+
+    self.assertEqual(history[1]['Return-Code'], 'Failure: 1')
+    self.assertEqual(history[3]['Return-Code'], '** Aborted **')
+    self.assertIsNone(history[3]['End time'])
+    self.assertEqual(history[3]['packages'][0]['repo'], '@')
+
+  def test_same_as_text(self):
+    """
+    The database gives the same transaction as yum history info
+    """
+    text = ospsurvey.probes.yum.Yum(source_fn=self.source).history()
+    database = ospsurvey.probes.yum.read_history(self.database, since=141)[0]
+
+    for key in ('Transaction ID', 'Begin rpmdb', 'End rpmdb', 'Return-Code',
+                'Command Line', 'transactions', 'packages'):
+      self.assertEqual(database[key], text[key])
+
+  def test_since(self):
+    yum = ospsurvey.probes.yum.Yum(source_fn=self.source,
+                                   history_directory=self.directory)
+
+    self.assertEqual([h['Transaction ID'] for h in yum.transactions(since=141)],
+                     ['142', '143'])
+    self.assertEqual(yum.transactions(since=143), [])
+    self.assertEqual(self.source.commands, [])
+
+  def test_fallback(self):
+    """
+    Without a readable database, the last transaction comes from yum
+    """
+    os.remove(self.database)
+    with open(os.path.join(self.directory, 'history-2020-02-01.sqlite'), 'w') as f:
+      f.write("not a database")
+
+    for directory in (self.directory, os.path.join(self.directory, 'missing')):
+      yum = ospsurvey.probes.yum.Yum(source_fn=self.source, history_directory=directory)
+      history = yum.transactions()
+      self.assertEqual([h['Transaction ID'] for h in history], ['142'])
+      self.assertEqual(history[0]['packages'][0]['package'], 'nano-2.3.1-10.el7.x86_64')
+      self.assertEqual(yum.transactions(since=142), [])
+
+    self.assertEqual(self.source.commands, ['sudo yum history info'] * 4)
+
+
+class TestUpdateInfo(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.metadata = os.path.join(self.directory, 'yum')
+    os.makedirs(os.path.join(self.metadata, 'x86_64', '7Server', 'rhel-7-server-rpms'))
+    self.set_revision('1579635312')
+    self.rpmdb = '1209:f9d7dd8d1a5b709ebaa88fca24391194bd1bff7d'
+    self.cache = ospsurvey.cache.DiskCache(os.path.join(self.directory, 'cache'))
+    self.source = FakeYum('tests/data/yum-updateinfo')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def set_revision(self, revision):
+    path = os.path.join(self.metadata, 'x86_64', '7Server', 'rhel-7-server-rpms',
+                        'repomd.xml')
+    with open(path, 'w') as f:
+      f.write('<repomd><revision>{}</revision></repomd>'.format(revision))
+
+  def yum(self, source_fn=None):
+    return ospsurvey.probes.yum.Yum(
+      source_fn=source_fn or self.source, cache=self.cache,
+      metadata_directory=self.metadata, rpmdb_version_fn=lambda: self.rpmdb)
+
+  def test_parse(self):
+    (updates, cves) = ospsurvey.probes.yum.parse_updateinfo(self.source.output)
+
+    self.assertEqual(len(updates), 4)
+    self.assertEqual(updates['kernel-3.10.0-1062.12.1.el7.x86_64'],
+                     [{'advisory': 'RHSA-2020:0374', 'level': 'Important'}])
+    self.assertEqual([c['advisory'] for c in cves['kernel-3.10.0-1062.12.1.el7.x86_64']],
+                     ['CVE-2019-14816', 'CVE-2019-14895'])
+    self.assertEqual(len(cves), 3)
+
+  def test_one_session(self):
+    yum = ospsurvey.probes.yum.Yum(source_fn=self.source)
+    yum.updates()
+    yum.cves()
+    self.assertEqual(self.source.commands, ['sudo yum updateinfo list security',
+                                            'sudo yum updateinfo list cves'])
+
+    # cves used to ignore refresh
+    yum.cves(refresh=True)
+    self.assertEqual(len(self.source.commands), 4)
+
+  def test_refresh(self):
+    """
+    A refresh of each list shares one yum answer, and every refresh of the
+    same list asks again
+    """
+    yum = ospsurvey.probes.yum.Yum(source_fn=self.source)
+    yum.updates(refresh=True)
+    yum.cves(refresh=True)
+    self.assertEqual(len(self.source.commands), 2)
+
+    yum.cves(refresh=True)
+    yum.updates(refresh=True)
+    self.assertEqual(len(self.source.commands), 4)
+    yum.updates(refresh=True)
+    self.assertEqual(len(self.source.commands), 6)
+
+    yum.updateinfo(refresh=True)
+    yum.updateinfo(refresh=True)
+    self.assertEqual(len(self.source.commands), 10)
+
+  def test_cache(self):
+    first = self.yum().updateinfo()
+    self.assertEqual(self.yum().updateinfo(), first)
+    self.assertEqual(len(self.source.commands), 2)
+
+    # new repo metadata or a package change is a new answer
+    self.set_revision('1579721712')
+    self.yum().cves()
+    self.assertEqual(len(self.source.commands), 4)
+    self.rpmdb = '1210:0123456789abcdef0123456789abcdef01234567'
+    self.yum().cves()
+    self.assertEqual(len(self.source.commands), 6)
+    self.yum().updates()
+    self.assertEqual(len(self.source.commands), 6)
+
+    self.yum().updates(refresh=True)
+    self.assertEqual(len(self.source.commands), 8)
+
+  def test_no_metadata(self):
+    """
+    Without cached metadata there is nothing to key the answer on
+    """
+    shutil.rmtree(self.metadata)
+    self.yum().updates()
+    self.yum().updates()
+    self.assertEqual(len(self.source.commands), 4)
+
+  def test_software_functions(self):
+    self.assertEqual(ospsurvey.probes.software.check_updates(self.source),
+                     self.yum().updates())
+    self.assertEqual(ospsurvey.probes.software.check_cves(self.source),
+                     self.yum().cves())
+
+if __name__ == "__main__":
+  unittest.main()